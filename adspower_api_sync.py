@@ -2,21 +2,47 @@
 AdsPower Local API Client - Sync Version
 Tương tác với AdsPower thông qua Local API (Synchronous)
 """
-import requests
+from __future__ import annotations
+
 import json
+import random
 import time
-from typing import Dict, List, Optional, Any
-from loguru import logger
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Any
 from config import config
+from log_utils import hot_log, logger, truncate
+from metrics import APIMetrics
+from browser_reaper import reaper
+from resilience import BreakerRegistry, RetryPolicy, NETWORK, classify_error
+
+if TYPE_CHECKING:
+    import requests
 
 
 class AdsPowerAPISync:
     """Client đồng bộ để tương tác với AdsPower Local API"""
     
-    def __init__(self, api_url: str = None, api_key: str = None):
+    # Endpoint gắn với một profile: breaker theo profile thay vì theo endpoint
+    _PROFILE_ENDPOINTS = ("/api/v2/browser-profile/start",)
+    
+    def __init__(self, api_url: str = None, api_key: str = None, metrics: APIMetrics = None,
+                 retry_policy: RetryPolicy = None, breakers: BreakerRegistry = None):
+        """
+        Args:
+            api_url: URL Local API (mặc định config.adspower_api_url)
+            api_key: API key (tùy chọn)
+            metrics: APIMetrics dùng chung (tùy chọn)
+            retry_policy: Chính sách retry cho lỗi tạm thời (throttling, mất kết nối)
+            breakers: Circuit breaker theo profile/endpoint, dùng chung với BrowserControllerSync
+        """
         self.api_url = api_url or config.adspower_api_url
         self.api_key = api_key or config.adspower_api_key
+        import requests  # Nạp khi tạo client, không phải khi import module
         self.session = requests.Session()
+        self.metrics = metrics or APIMetrics()
+        self.log_sample_rate = config.api_log_sample_rate
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or BreakerRegistry()
         
         # Thêm headers mặc định
         self.session.headers.update({
@@ -28,9 +54,52 @@ class AdsPowerAPISync:
             self.session.headers.update({'Authorization': f'Bearer {self.api_key}'})
     
     def _make_request(self, method: str, endpoint: str, data: Dict = None) -> Dict:
-        """Thực hiện HTTP request đến AdsPower API"""
+        """
+        Thực hiện HTTP request đến AdsPower API
+        
+        Lỗi tạm thời ("Too many request per second", mất kết nối) được retry với backoff;
+        lỗi mạng chỉ được retry với GET. Request khởi động browser đi qua breaker của profile; các request khác qua breaker
+        của endpoint (chỉ mở khi Local API không kết nối được).
+        
+        Raises:
+            CircuitOpenError: Breaker của profile/endpoint đang mở
+        """
+        profile_id = (data or {}).get("profile_id") if endpoint in self._PROFILE_ENDPOINTS else None
+        if profile_id:
+            breaker = self.breakers.get(f"profile:{profile_id}")
+            trip_on = None
+        else:
+            breaker = self.breakers.get(f"endpoint:{endpoint}")
+            trip_on = (NETWORK,)
+        retry_on = None
+        if method.upper() != 'GET':
+            # Không idempotent (tạo/xóa profile, start browser): timeout có thể xảy ra sau khi Local API
+            # đã thực hiện, retry sẽ tạo profile trùng hoặc start browser hai lần. Throttling thì an toàn
+            # vì request bị từ chối trước khi thực hiện
+            retry_on = self.retry_policy.retry_on - {NETWORK}
+        return self.retry_policy.run(
+            lambda: self._send_request(method, endpoint, data),
+            breaker=breaker,
+            classify_result=self._result_error,
+            name=f"{method.upper()} {endpoint}",
+            trip_on=trip_on,
+            retry_on=retry_on,
+        )
+    
+    @staticmethod
+    def _result_error(result: Any) -> Optional[str]:
+        """Loại lỗi của response có code != 0 (None nếu thành công)"""
+        if isinstance(result, dict) and result.get('code', 0) != 0:
+            return classify_error(result)
+        return None
+    
+    def _send_request(self, method: str, endpoint: str, data: Dict = None) -> Dict:
+        """Gửi một HTTP request (một lần thử) và ghi metrics"""
+        import requests
         url = f"{self.api_url}{endpoint}"
-        logger.info(f"Requesting {url} with data: {data}")
+        response = None
+        error_code = None
+        start = time.perf_counter()
         try:
             if method.upper() == 'GET':
                 response = self.session.get(url, params=data)
@@ -42,13 +111,46 @@ class AdsPowerAPISync:
                 response = self.session.delete(url, json=data)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
-            logger.info(f"Response: {response.text}")
             response.raise_for_status()
-            return response.json()
+            result = response.json()
+            if isinstance(result, dict) and result.get('code', 0) != 0:
+                error_code = f"code_{result.get('code')}"
+            return result
             
+        except requests.exceptions.HTTPError as e:
+            error_code = f"http_{e.response.status_code if e.response is not None else 'unknown'}"
+            logger.error("API request failed: {}", e)
+            raise
         except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {e}")
+            error_code = type(e).__name__
+            logger.error("API request failed: {}", e)
             raise
+        finally:
+            self._record_request(method.upper(), endpoint, data, response, error_code,
+                                 time.perf_counter() - start)
+    
+    def _record_request(self, method: str, endpoint: str, data: Optional[Dict],
+                        response: Optional[requests.Response], error_code: Optional[str],
+                        elapsed: float) -> None:
+        """Ghi metrics cho request và log body theo mẫu (sampled) ở mức DEBUG"""
+        request_bytes = 0
+        response_bytes = 0
+        if response is not None:
+            # Body đã được requests serialize sẵn, không cần json.dumps lại
+            body = response.request.body
+            request_bytes = len(body) if body else len(response.request.url or "")
+            response_bytes = len(response.content or b"")
+        self.metrics.observe_request(method, endpoint, elapsed, error_code, request_bytes, response_bytes)
+        
+        hot_log.log("{} {} -> {} in {:.1f} ms ({} B)", method, endpoint,
+                    error_code or "ok", elapsed * 1000, response_bytes)
+        if self.log_sample_rate and random.random() < self.log_sample_rate:
+            logger.debug("Request data: {} | Response: {}", truncate(data),
+                         truncate(response.text if response is not None else ""))
+    
+    def get_metrics(self) -> Dict:
+        """Lấy số liệu request: độ trễ theo endpoint, mã lỗi, kích thước payload và trạng thái breaker"""
+        return {**self.metrics.snapshot(), "breakers": self.breakers.snapshot()}
     
     def get_profile_list(self, page: int = 1, page_size: int = 100) -> Dict:
         """Lấy danh sách profiles"""
@@ -120,13 +222,53 @@ class AdsPowerAPISync:
         if final_launch_args:
             data["launch_args"] = final_launch_args
             
-        return self._make_request('POST', endpoint, data)
+        result = self._make_request('POST', endpoint, data)
+        if result.get('code') == 0:
+            # Dừng khi process thoát nếu chưa được stop_browser (xem browser_reaper)
+            reaper.track(self, profile_id)
+        return result
     
     def stop_browser(self, profile_id: str) -> Dict:
         """Dừng trình duyệt của profile (API v2)"""
         endpoint = "/api/v2/browser-profile/stop"
         data = {"profile_id": profile_id}
-        return self._make_request('POST', endpoint, data)
+        result = self._make_request('POST', endpoint, data)
+        if result.get('code') == 0:
+            reaper.untrack(profile_id)
+        return result
+    
+    def stop_multiple_browsers(self, profile_ids: List[str], max_workers: int = None) -> Dict[str, Dict]:
+        """
+        Dừng nhiều browser đồng thời (giới hạn số request song song)
+        
+        Request bị Local API giới hạn tốc độ được retry với backoff (xem resilience).
+        
+        Args:
+            profile_ids: Danh sách ID của các profile cần dừng
+            max_workers: Số request stop song song tối đa (mặc định config.stop_concurrency)
+        
+        Returns:
+            Dict: Kết quả dừng cho từng profile
+        """
+        profile_ids = list(dict.fromkeys(profile_ids))
+        if not profile_ids:
+            return {}
+        
+        def stop(profile_id: str) -> Dict:
+            try:
+                return self.stop_browser(profile_id)
+            except Exception as e:
+                logger.error("Failed to stop browser for profile {}: {}", profile_id, e)
+                return {"error": str(e)}
+        
+        workers = max(1, min(max_workers or config.stop_concurrency, len(profile_ids)))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stop-browser") as executor:
+            results = dict(zip(profile_ids, executor.map(stop, profile_ids)))
+        
+        stopped = sum(1 for result in results.values() if result.get('code') == 0)
+        logger.info("Stopped {}/{} browsers in {:.1f}s", stopped, len(profile_ids), time.perf_counter() - start)
+        return results
     
     def get_browser_status(self, profile_id: str) -> Dict:
         """Kiểm tra trạng thái trình duyệt (API v2)"""
@@ -345,7 +487,7 @@ class AdsPowerAPISync:
             else:
                 raise Exception(f"Browser not active for profile {profile_id}")
         except Exception as e:
-            logger.error(f"Failed to get webdriver URL: {e}")
+            logger.error("Failed to get webdriver URL: {}", e)
             raise
     
     def get_selenium_url(self, profile_id: str) -> str:
@@ -357,7 +499,7 @@ class AdsPowerAPISync:
             else:
                 raise Exception(f"Browser not active for profile {profile_id}")
         except Exception as e:
-            logger.error(f"Failed to get selenium URL: {e}")
+            logger.error("Failed to get selenium URL: {}", e)
             raise
     
     def get_webdriver_path(self, profile_id: str) -> str:
@@ -369,7 +511,7 @@ class AdsPowerAPISync:
             else:
                 raise Exception(f"Browser not active for profile {profile_id}")
         except Exception as e:
-            logger.error(f"Failed to get webdriver path: {e}")
+            logger.error("Failed to get webdriver path: {}", e)
             raise
     
     def wait_for_browser_ready(self, profile_id: str, timeout: int = 30) -> bool:
@@ -427,13 +569,13 @@ class AdsPowerAPISync:
                     **kwargs
                 )
                 results[profile_id] = result
-                logger.info(f"Started browser for profile {profile_id} at position ({window_x}, {window_y})")
+                logger.info("Started browser for profile {} at position ({}, {})", profile_id, window_x, window_y)
                 
                 # Chờ một chút trước khi khởi động browser tiếp theo
                 time.sleep(2)
                 
             except Exception as e:
-                logger.error(f"Failed to start browser for profile {profile_id}: {e}")
+                logger.error("Failed to start browser for profile {}: {}", profile_id, e)
                 results[profile_id] = {"error": str(e)}
         
         return results
@@ -0,0 +1,593 @@
+"""
+AdsPower Local API Stub Server
+Giả lập Local API (v1/v2) để test và benchmark offline, không cần AdsPower desktop
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from log_utils import logger
+
+
+class StubSettings:
+    """Cấu hình hành vi của stub server"""
+
+    def __init__(self, latency_ms: float = 0.0, latency_jitter_ms: float = 0.0,
+                 rate_limit: float = 0.0, failure_rate: float = 0.0,
+                 failure_mode: str = "code", failure_endpoints: List[str] = None,
+                 launch_browser: bool = True, chromium_path: str = None,
+                 headless: bool = True, launch_timeout: float = 30.0):
+        """
+        Args:
+            latency_ms: Độ trễ cố định cho mỗi request (ms)
+            latency_jitter_ms: Độ trễ ngẫu nhiên cộng thêm, từ 0 đến giá trị này (ms)
+            rate_limit: Số request tối đa mỗi giây (0 = không giới hạn), vượt quá trả về
+                lỗi "Too many request per second" giống AdsPower
+            failure_rate: Tỷ lệ request bị lỗi ngẫu nhiên (0.0 - 1.0)
+            failure_mode: "code" (HTTP 200, code=-1) hoặc "http" (HTTP 500)
+            failure_endpoints: Chỉ inject lỗi cho các endpoint này (None = tất cả)
+            launch_browser: Khởi động Chromium headless thật cho /browser-profile/start
+            chromium_path: Đường dẫn Chromium (mặc định tự tìm, hoặc dùng Chromium của Playwright)
+            headless: Chạy Chromium ở chế độ headless
+            launch_timeout: Thời gian chờ Chromium mở cổng DevTools (giây)
+        """
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.failure_endpoints = set(failure_endpoints) if failure_endpoints else None
+        self.launch_browser = launch_browser
+        self.chromium_path = chromium_path
+        self.headless = headless
+        self.launch_timeout = launch_timeout
+
+
+class _RateLimiter:
+    """Token bucket đơn giản, dùng chung cho mọi endpoint như Local API thật"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+_DEVTOOLS_RE = re.compile(r"DevTools listening on (ws://\S+)")
+
+
+def find_chromium(chromium_path: str = None) -> str:
+    """Tìm executable Chromium: tham số, biến môi trường CHROMIUM_PATH, PATH hoặc Playwright"""
+    candidates = [chromium_path, os.environ.get("CHROMIUM_PATH")]
+    candidates += [shutil.which(name) for name in ("chromium", "chromium-browser", "google-chrome", "chrome")]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        path = p.chromium.executable_path
+    if not os.path.exists(path):
+        raise FileNotFoundError("Chromium not found. Run 'playwright install chromium' or set CHROMIUM_PATH")
+    return path
+
+
+class ChromiumProcess:
+    """Một tiến trình Chromium thật với cổng DevTools, thay cho browser của profile"""
+
+    def __init__(self, executable: str, headless: bool = True, window_args: List[str] = None):
+        self.executable = executable
+        self.headless = headless
+        self.window_args = window_args or []
+        self.process: Optional[subprocess.Popen] = None
+        self.user_data_dir: Optional[str] = None
+        self.ws_endpoint: Optional[str] = None
+
+    @property
+    def debug_port(self) -> str:
+        return str(urlparse(self.ws_endpoint).port) if self.ws_endpoint else ""
+
+    def start(self, timeout: float = 30.0) -> str:
+        """Khởi động Chromium và trả về WebSocket endpoint của DevTools"""
+        self.user_data_dir = tempfile.mkdtemp(prefix="adspower-stub-")
+        args = [
+            self.executable,
+            "--remote-debugging-port=0",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--disable-background-networking",
+            "--disable-dev-shm-usage",
+            "--no-sandbox",
+            *self.window_args,
+        ]
+        if self.headless:
+            args.append("--headless=new")
+        args.append("about:blank")
+
+        self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                        text=True, errors="replace")
+        ready = threading.Event()
+        # Đọc stderr trên thread riêng: tìm DevTools endpoint và giữ cho pipe không bị đầy
+        threading.Thread(target=self._read_stderr, args=(ready,), daemon=True).start()
+        if ready.wait(timeout) and self.ws_endpoint:
+            return self.ws_endpoint
+
+        self.stop()
+        raise RuntimeError("Chromium did not expose a DevTools endpoint")
+
+    def _read_stderr(self, ready: threading.Event) -> None:
+        try:
+            for line in self.process.stderr:
+                if not ready.is_set():
+                    match = _DEVTOOLS_RE.search(line)
+                    if match:
+                        self.ws_endpoint = match.group(1)
+                        ready.set()
+        except Exception:
+            pass
+        finally:
+            ready.set()
+
+    def stop(self) -> None:
+        """Dừng Chromium và xóa user data dir tạm"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
+
+
+class StubState:
+    """Dữ liệu giả lập: profiles, browser đang chạy, cookies và storage"""
+
+    def __init__(self, settings: StubSettings):
+        self.settings = settings
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        self.browsers: Dict[str, Dict[str, Any]] = {}
+        self.cookies: Dict[str, List[Dict]] = {}
+        self.storage: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.request_count = 0
+        self._lock = threading.RLock()
+        self._launch_locks: Dict[str, threading.Lock] = {}
+        self._serial = 0
+        self._chromium_path: Optional[str] = None
+
+    def launch_lock(self, profile_id: str) -> threading.Lock:
+        """Lock theo profile: các request start cùng profile chạy lần lượt"""
+        with self._lock:
+            return self._launch_locks.setdefault(profile_id, threading.Lock())
+
+    def add_profile(self, name: str = None, **fields) -> str:
+        """Tạo profile và trả về profile_id"""
+        with self._lock:
+            self._serial += 1
+            profile_id = fields.pop("profile_id", None) or uuid.uuid4().hex[:8]
+            self.profiles[profile_id] = {
+                "user_id": profile_id,
+                "profile_id": profile_id,
+                "serial_number": str(self._serial),
+                "name": name or f"Stub Profile {self._serial}",
+                "group_id": "0",
+                "remark": "",
+                "created_time": str(int(time.time())),
+                **fields,
+            }
+            return profile_id
+
+    def chromium_path(self) -> str:
+        with self._lock:
+            if self._chromium_path is None:
+                self._chromium_path = find_chromium(self.settings.chromium_path)
+            return self._chromium_path
+
+    def stop_all(self) -> None:
+        """Dừng tất cả Chromium đang chạy"""
+        with self._lock:
+            browsers = list(self.browsers.values())
+            self.browsers.clear()
+        for browser in browsers:
+            process = browser.get("process")
+            if process:
+                process.stop()
+
+
+def _ok(data: Any = None) -> Dict:
+    return {"code": 0, "msg": "success", "data": data if data is not None else {}}
+
+
+def _error(msg: str, code: int = -1) -> Dict:
+    return {"code": code, "msg": msg}
+
+
+def _profile_id(params: Dict) -> Optional[str]:
+    return params.get("profile_id") or params.get("user_id")
+
+
+class _Routes:
+    """Xử lý từng endpoint của Local API"""
+
+    def __init__(self, state: StubState):
+        self.state = state
+        self.table: Dict[Tuple[str, str], Callable[[Dict], Dict]] = {
+            ("GET", "/status"): lambda params: _ok(),
+            ("GET", "/api/v1/user/list"): self.user_list,
+            ("GET", "/api/v1/user/detail"): self.user_detail,
+            ("POST", "/api/v1/user/create"): self.user_create,
+            ("POST", "/api/v1/user/update"): self.user_update,
+            ("POST", "/api/v1/user/delete"): self.user_delete,
+            ("POST", "/api/v2/browser-profile/create"): self.profile_create_v2,
+            ("POST", "/api/v2/browser-profile/start"): self.browser_start,
+            ("GET", "/api/v1/browser/start"): self.browser_start,
+            ("POST", "/api/v2/browser-profile/stop"): self.browser_stop,
+            ("GET", "/api/v1/browser/stop"): self.browser_stop,
+            ("GET", "/api/v2/browser-profile/active"): self.browser_active,
+            ("GET", "/api/v1/browser/active"): self.browser_active,
+            ("GET", "/api/v1/browser/list"): self.browser_list,
+            ("GET", "/api/v1/proxy/list"): lambda params: _ok({"list": []}),
+            ("POST", "/api/v1/proxy/test"): lambda params: _ok({"status": "success"}),
+            ("GET", "/api/v1/user/fingerprint"): self.fingerprint_get,
+            ("POST", "/api/v1/user/fingerprint/update"): self.fingerprint_update,
+            ("GET", "/api/v1/user/extensions"): lambda params: _ok({"list": []}),
+            ("POST", "/api/v1/user/extension/install"): lambda params: _ok(),
+            ("POST", "/api/v1/user/extension/uninstall"): lambda params: _ok(),
+            ("GET", "/api/v1/user/cookies"): self.cookies_get,
+            ("POST", "/api/v1/user/cookies/update"): self.cookies_update,
+            ("POST", "/api/v1/user/cookies/clear"): self.cookies_clear,
+        }
+        for kind in ("local_storage", "session_storage"):
+            self.table[("GET", f"/api/v1/user/{kind}")] = self._storage_get(kind)
+            self.table[("POST", f"/api/v1/user/{kind}/update")] = self._storage_update(kind)
+            self.table[("POST", f"/api/v1/user/{kind}/clear")] = self._storage_clear(kind)
+
+    # Profiles
+    def user_list(self, params: Dict) -> Dict:
+        page = int(params.get("page", 1))
+        page_size = int(params.get("page_size", 100))
+        profiles = list(self.state.profiles.values())
+        start = (page - 1) * page_size
+        return _ok({"list": profiles[start:start + page_size], "page": page, "page_size": page_size})
+
+    def user_detail(self, params: Dict) -> Dict:
+        profile = self.state.profiles.get(_profile_id(params))
+        return _ok(profile) if profile else _error("Profile does not exist")
+
+    def user_create(self, params: Dict) -> Dict:
+        profile_id = self.state.add_profile(**params)
+        return _ok({"id": profile_id})
+
+    def profile_create_v2(self, params: Dict) -> Dict:
+        if not params.get("fingerprint_config"):
+            return _error("fingerprint_config is required")
+        profile_id = self.state.add_profile(**params)
+        return _ok({"profile_id": profile_id, "profile_no": self.state.profiles[profile_id]["serial_number"]})
+
+    def user_update(self, params: Dict) -> Dict:
+        profile_id = _profile_id(params)
+        if profile_id not in self.state.profiles:
+            return _error("Profile does not exist")
+        self.state.profiles[profile_id].update({k: v for k, v in params.items() if k != "user_id"})
+        return _ok()
+
+    def user_delete(self, params: Dict) -> Dict:
+        ids = params.get("user_ids") or [params.get("user_id")]
+        for profile_id in ids:
+            self.state.profiles.pop(profile_id, None)
+        return _ok()
+
+    def fingerprint_get(self, params: Dict) -> Dict:
+        profile = self.state.profiles.get(_profile_id(params))
+        if not profile:
+            return _error("Profile does not exist")
+        return _ok(profile.get("fingerprint_config", {}))
+
+    def fingerprint_update(self, params: Dict) -> Dict:
+        profile = self.state.profiles.get(_profile_id(params))
+        if not profile:
+            return _error("Profile does not exist")
+        profile.setdefault("fingerprint_config", {}).update(
+            {k: v for k, v in params.items() if k != "user_id"})
+        return _ok()
+
+    # Browsers
+    def browser_start(self, params: Dict) -> Dict:
+        profile_id = _profile_id(params)
+        if profile_id not in self.state.profiles:
+            return _error("Profile does not exist")
+        # Start đồng thời cùng profile: request sau chờ và trả về browser của request trước
+        with self.state.launch_lock(profile_id):
+            with self.state._lock:
+                existing = self.state.browsers.get(profile_id)
+            if existing:
+                return _ok(existing["data"])
+            return self._launch(profile_id, params)
+
+    def _launch(self, profile_id: str, params: Dict) -> Dict:
+
+        settings = self.state.settings
+        process = None
+        if settings.launch_browser:
+            launch_args = params.get("launch_args") or []
+            if isinstance(launch_args, str):
+                launch_args = json.loads(launch_args)
+            headless = settings.headless or str(params.get("headless", "0")) == "1"
+            try:
+                process = ChromiumProcess(self.state.chromium_path(), headless=headless, window_args=launch_args)
+                ws_endpoint = process.start(timeout=settings.launch_timeout)
+            except Exception as e:
+                logger.error("Stub failed to launch Chromium for {}: {}", profile_id, e)
+                return _error(f"Failed to start browser: {e}")
+            port = process.debug_port
+        else:
+            port = random.randint(40000, 60000)
+            ws_endpoint = f"ws://127.0.0.1:{port}/devtools/browser/{uuid.uuid4()}"
+
+        data = {
+            "ws": {"selenium": f"127.0.0.1:{port}", "puppeteer": ws_endpoint},
+            "debug_port": str(port),
+            "webdriver": "/usr/bin/chromedriver",
+        }
+        with self.state._lock:
+            self.state.browsers[profile_id] = {"data": data, "process": process}
+        logger.info("Stub started browser for {} at {}", profile_id, ws_endpoint)
+        return _ok(data)
+
+    def browser_stop(self, params: Dict) -> Dict:
+        profile_id = _profile_id(params)
+        with self.state._lock:
+            browser = self.state.browsers.pop(profile_id, None)
+        if not browser:
+            return _error("Browser is not running")
+        if browser["process"]:
+            browser["process"].stop()
+        return _ok()
+
+    def browser_active(self, params: Dict) -> Dict:
+        browser = self.state.browsers.get(_profile_id(params))
+        if browser and browser["process"] and browser["process"].process.poll() is not None:
+            # Chromium đã chết (crash hoặc bị kill từ bên ngoài)
+            self.state.browsers.pop(_profile_id(params), None)
+            browser = None
+        if not browser:
+            return _ok({"status": "Inactive"})
+        return _ok({"status": "Active", **browser["data"]})
+
+    def browser_list(self, params: Dict) -> Dict:
+        return _ok({"list": [{"user_id": profile_id, **browser["data"]}
+                             for profile_id, browser in self.state.browsers.items()]})
+
+    # Cookies & storage
+    def cookies_get(self, params: Dict) -> Dict:
+        cookies = self.state.cookies.get(_profile_id(params), [])
+        domain = params.get("domain")
+        if domain:
+            cookies = [c for c in cookies if domain in c.get("domain", "")]
+        return _ok({"cookies": cookies})
+
+    def cookies_update(self, params: Dict) -> Dict:
+        self.state.cookies[_profile_id(params)] = list(params.get("cookies") or [])
+        return _ok()
+
+    def cookies_clear(self, params: Dict) -> Dict:
+        profile_id = _profile_id(params)
+        domain = params.get("domain")
+        if domain:
+            self.state.cookies[profile_id] = [c for c in self.state.cookies.get(profile_id, [])
+                                              if domain not in c.get("domain", "")]
+        else:
+            self.state.cookies.pop(profile_id, None)
+        return _ok()
+
+    def _storage_get(self, kind: str) -> Callable[[Dict], Dict]:
+        def handler(params: Dict) -> Dict:
+            return _ok({"storage": self.state.storage.get((kind, _profile_id(params)), {})})
+        return handler
+
+    def _storage_update(self, kind: str) -> Callable[[Dict], Dict]:
+        def handler(params: Dict) -> Dict:
+            self.state.storage.setdefault((kind, _profile_id(params)), {}).update(params.get("storage") or {})
+            return _ok()
+        return handler
+
+    def _storage_clear(self, kind: str) -> Callable[[Dict], Dict]:
+        def handler(params: Dict) -> Dict:
+            self.state.storage.pop((kind, _profile_id(params)), None)
+            return _ok()
+        return handler
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """HTTP handler, dùng chung routes/state của server"""
+
+    server_version = "AdsPowerStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        logger.debug("Stub {} - {}", self.address_string(), format % args)
+
+    def _dispatch(self, method: str) -> None:
+        stub: "AdsPowerStubServer" = self.server.stub
+        settings = stub.settings
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if isinstance(body, dict):
+                    params.update(body)
+            except ValueError:
+                return self._send(400, _error("Invalid JSON body"))
+
+        with stub.state._lock:
+            stub.state.request_count += 1
+
+        if settings.latency_ms or settings.latency_jitter_ms:
+            time.sleep((settings.latency_ms + random.uniform(0, settings.latency_jitter_ms)) / 1000.0)
+
+        if not stub.rate_limiter.allow():
+            return self._send(200, _error("Too many request per second, please check"))
+
+        if settings.failure_rate and random.random() < settings.failure_rate:
+            if settings.failure_endpoints is None or parsed.path in settings.failure_endpoints:
+                if settings.failure_mode == "http":
+                    return self._send(500, _error("Injected failure"))
+                return self._send(200, _error("Injected failure"))
+
+        handler = stub.routes.table.get((method, parsed.path))
+        if handler is None:
+            return self._send(404, _error(f"Unknown endpoint {method} {parsed.path}"))
+        try:
+            self._send(200, handler(params))
+        except Exception as e:
+            logger.error("Stub handler error for {}: {}", parsed.path, e)
+            self._send(500, _error(str(e)))
+
+    def _send(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class AdsPowerStubServer:
+    """
+    Stub server cho AdsPower Local API
+
+    Ví dụ:
+        with AdsPowerStubServer(profiles=5) as stub:
+            api = AdsPowerAPISync(api_url=stub.url)
+            result = api.start_browser(stub.profile_ids[0])
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 settings: StubSettings = None, profiles: int = 0):
+        self.settings = settings or StubSettings()
+        self.state = StubState(self.settings)
+        self.routes = _Routes(self.state)
+        self.rate_limiter = _RateLimiter(self.settings.rate_limit)
+        for _ in range(profiles):
+            self.state.add_profile()
+
+        self._httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def profile_ids(self) -> List[str]:
+        return list(self.state.profiles)
+
+    def start(self) -> "AdsPowerStubServer":
+        """Chạy server trong background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("AdsPower stub server listening on {}", self.url)
+        return self
+
+    def serve_forever(self) -> None:
+        """Chạy server trên thread hiện tại (dùng cho CLI)"""
+        logger.info("AdsPower stub server listening on {}", self.url)
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Dừng server và mọi Chromium đã khởi động"""
+        if self._thread:
+            self._httpd.shutdown()
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._httpd.server_close()
+        self.state.stop_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AdsPower Local API stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50325)
+    parser.add_argument("--profiles", type=int, default=10, help="Số profile tạo sẵn")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Request/giây, 0 = không giới hạn")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-mode", choices=["code", "http"], default="code")
+    parser.add_argument("--no-browser", action="store_true", help="Không khởi động Chromium thật")
+    parser.add_argument("--chromium-path", default=None)
+    parser.add_argument("--headful", action="store_true", help="Chạy Chromium có giao diện")
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        rate_limit=args.rate_limit,
+        failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode,
+        launch_browser=not args.no_browser,
+        chromium_path=args.chromium_path,
+        headless=not args.headful,
+    )
+    stub = AdsPowerStubServer(args.host, args.port, settings=settings, profiles=args.profiles)
+    for profile_id in stub.profile_ids:
+        logger.info("Stub profile: {}", profile_id)
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stub server stopped")
+
+
+if __name__ == "__main__":
+    main()
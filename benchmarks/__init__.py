@@ -0,0 +1,5 @@
+"""
+Benchmarks cho AdsPower Automation
+
+Chạy từ thư mục gốc của project, ví dụ: ``python -m benchmarks.bench_logging``
+"""
@@ -0,0 +1,133 @@
+"""
+Benchmark DataExtractor: 4 hàm riêng lẻ (cách cũ) so với extract_all một lượt
+
+Sinh một trang HTML nhiều MB, đo thời gian trích xuất links/emails/phones/prices và
+bộ nhớ đỉnh (tracemalloc) khi đọc cả file so với đọc stream theo chunk.
+
+    python -m benchmarks.bench_extractor --size-mb 8
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+from utils import DataExtractor, StreamingExtractor
+
+
+def legacy_extract(text: str) -> Dict[str, List[str]]:
+    """Cách trích xuất cũ: import/compile pattern mỗi lần gọi, dedupe bằng set"""
+    def extract_links(page_content):
+        import re
+        return list(set(re.findall(r'href=["\']([^"\']+)["\']', page_content)))
+
+    def extract_emails(text):
+        import re
+        return list(set(re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)))
+
+    def extract_phone_numbers(text):
+        import re
+        phones = re.findall(r'(\+?1?[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})', text)
+        return [''.join(phone) for phone in phones]
+
+    def extract_prices(text):
+        import re
+        return re.findall(r'\$[\d,]+\.?\d*|\d+\.?\d*\s*(?:USD|EUR|GBP|VND)', text)
+
+    return {
+        "links": extract_links(text),
+        "emails": extract_emails(text),
+        "phones": extract_phone_numbers(text),
+        "prices": extract_prices(text),
+    }
+
+
+def generate_page(size_mb: float, seed: int = 42) -> str:
+    """Sinh HTML giống trang kết quả tìm kiếm (nhiều link, giá, liên hệ)"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts, size, i = ["<html><body>"], 0, 0
+    while size < target:
+        i += 1
+        block = (
+            f'<div class="domain-card"><h3><a href="https://www.example.com/domain/{i % 5000}">'
+            f'site{i}.com</a></h3><span class="price">${rng.randint(1, 99)}.99</span>'
+            f'<p>{"Lorem ipsum dolor sit amet. " * rng.randint(1, 6)}</p>'
+            f'<p>Contact sales{i % 300}@example{i % 9}.com or +1 (555) {rng.randint(100, 999)}-{rng.randint(1000, 9999)}</p>'
+            f'<p>Renews at {rng.randint(10, 40)}.99 USD</p></div>\n'
+        )
+        parts.append(block)
+        size += len(block)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _measure(func: Callable[[], Dict[str, List[str]]]) -> Dict:
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    # Đo bộ nhớ ở lần chạy riêng vì tracemalloc làm chậm đáng kể
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(elapsed, 4),
+        "peak_mb": round(peak / (1024 * 1024), 2),
+        "counts": {kind: len(values) for kind, values in result.items()},
+    }
+
+
+def run(size_mb: float = 8.0, chunk_kb: int = 256) -> Dict:
+    html = generate_page(size_mb)
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8") as f:
+        f.write(html)
+        path = f.name
+
+    def legacy_from_file():
+        with open(path, "r", encoding="utf-8") as f:
+            return legacy_extract(f.read())
+
+    def streaming_from_file():
+        extractor = StreamingExtractor(chunk_size=chunk_kb * 1024)
+        with open(path, "r", encoding="utf-8") as f:
+            while True:
+                chunk = f.read(chunk_kb * 1024)
+                if not chunk:
+                    break
+                extractor.feed(chunk)
+        return extractor.finish()
+
+    try:
+        report = {
+            "size_mb": round(len(html) / (1024 * 1024), 2),
+            "chunk_kb": chunk_kb,
+            # Trên string đã có trong bộ nhớ
+            "legacy_in_memory": _measure(lambda: legacy_extract(html)),
+            "extract_all_in_memory": _measure(lambda: DataExtractor.extract_all(html)),
+            # Đọc từ file: cả file so với từng chunk
+            "legacy_from_file": _measure(legacy_from_file),
+            "streaming_from_file": _measure(streaming_from_file),
+        }
+    finally:
+        os.remove(path)
+
+    for mode in ("in_memory", "from_file"):
+        legacy = report[f"legacy_{mode}"]
+        new = report[f"extract_all_{mode}" if mode == "in_memory" else "streaming_from_file"]
+        report[f"speedup_{mode}"] = round(legacy["seconds"] / new["seconds"], 2) if new["seconds"] else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DataExtractor")
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--chunk-kb", type=int, default=256)
+    args = parser.parse_args()
+    print(json.dumps(run(args.size_mb, args.chunk_kb), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark thời gian import/khởi động của các module (dựa trên ``python -X importtime``)
+
+Mỗi module được import trong một process mới, lặp lại nhiều lần và lấy median. Report
+gồm thời gian import tích lũy, wall time của cả process, các dependency nặng nhất và
+những dependency nặng (playwright, pydantic, loguru, requests, selenium) bị nạp sớm.
+
+    python -m benchmarks.bench_import --output import_report.json
+    python -m benchmarks.bench_import --max-ms 60 --baseline import_report.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_MODULES = (
+    "config",
+    "adspower_api_sync",
+    "browser_controller_sync",
+    "godaddy_auto",
+    "profile_warmup",
+    "utils",
+)
+HEAVY_DEPENDENCIES = ("playwright", "pydantic", "pydantic_settings", "loguru", "requests", "selenium")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    Parse output của ``-X importtime``
+
+    Returns:
+        Danh sách {"module", "depth", "self_us", "cumulative_us"} theo thứ tự in ra
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            stripped = name.lstrip()
+            entries.append({
+                "module": stripped.strip(),
+                "depth": (len(name) - len(stripped) - 1) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            })
+        except ValueError:
+            continue
+    return entries
+
+
+def module_subtree(entries: List[Dict], module: str) -> List[Dict]:
+    """Các entry do import module kéo theo (importtime in con trước cha), gồm cả module"""
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index]["module"] == module and entries[index]["depth"] == 0:
+            start = index
+            while start > 0 and entries[start - 1]["depth"] > 0:
+                start -= 1
+            return entries[start:index + 1]
+    return []
+
+
+def _import_once(module: str) -> Dict:
+    """Import module trong process mới, trả về wall time và các entry importtime"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+        raise RuntimeError(f"import {module} failed: {error}")
+    return {"wall_s": wall, "entries": parse_importtime(proc.stderr)}
+
+
+def _interpreter_wall(repeat: int) -> float:
+    """Wall time của ``python -c pass`` (chi phí khởi động interpreter)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def measure_module(module: str, repeat: int = 5, top: int = 8) -> Dict:
+    """Đo một module: median thời gian import tích lũy, wall time và dependency nặng nhất"""
+    runs = [_import_once(module) for _ in range(repeat)]
+    subtrees = [module_subtree(run["entries"], module) for run in runs]
+    cumulative = [subtree[-1]["cumulative_us"] if subtree else 0 for subtree in subtrees]
+
+    # Dependency nặng nhất lấy từ lần chạy có median gần nhất
+    median_us = statistics.median(cumulative)
+    sample = subtrees[min(range(repeat), key=lambda i: abs(cumulative[i] - median_us))]
+    loaded = {e["module"] for e in sample}
+    heaviest = sorted(sample[:-1], key=lambda e: e["cumulative_us"], reverse=True)
+
+    return {
+        "module": module,
+        "import_ms": round(median_us / 1000, 2),
+        "wall_ms": round(statistics.median(run["wall_s"] for run in runs) * 1000, 2),
+        "modules_loaded": len(loaded),
+        "heavy_loaded": sorted(dep for dep in HEAVY_DEPENDENCIES if dep in loaded),
+        "top_dependencies": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000, 2)}
+            for e in heaviest[:top]
+        ],
+    }
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """So sánh import_ms với baseline, trả về danh sách regression"""
+    previous = {entry["module"]: entry for entry in baseline.get("modules", [])}
+    failures = []
+    for entry in report["modules"]:
+        base = previous.get(entry["module"])
+        if not base or not base.get("import_ms"):
+            continue
+        ratio = entry["import_ms"] / base["import_ms"]
+        if ratio > 1 + max_regression:
+            failures.append(f"{entry['module']}: import_ms {entry['import_ms']} vs baseline "
+                            f"{base['import_ms']} ({ratio:.0%})")
+    return failures
+
+
+def check_limits(report: Dict, max_ms: Optional[float], forbid_heavy: bool) -> List[str]:
+    """Kiểm tra ngưỡng tuyệt đối và dependency nặng bị nạp khi import"""
+    failures = []
+    for entry in report["modules"]:
+        if max_ms is not None and entry["import_ms"] > max_ms:
+            failures.append(f"{entry['module']}: import_ms {entry['import_ms']} > {max_ms}")
+        if forbid_heavy and entry["heavy_loaded"]:
+            failures.append(f"{entry['module']}: eagerly imports {', '.join(entry['heavy_loaded'])}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import/startup time benchmark")
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="Các module, phân cách bằng dấu phẩy")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần import mỗi module (lấy median)")
+    parser.add_argument("--top", type=int, default=8, help="Số dependency nặng nhất trong report")
+    parser.add_argument("--max-ms", type=float, help="Ngưỡng import_ms tối đa cho mỗi module")
+    parser.add_argument("--allow-heavy", action="store_true",
+                        help="Không coi việc nạp sớm playwright/pydantic/loguru/requests là lỗi")
+    parser.add_argument("--output", help="Ghi report JSON ra file")
+    parser.add_argument("--baseline", help="Report JSON trước đó để so sánh")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Mức tăng tối đa cho phép (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    modules = [module.strip() for module in args.modules.split(",") if module.strip()]
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "interpreter_wall_ms": round(_interpreter_wall(args.repeat) * 1000, 2),
+        "modules": [measure_module(module, args.repeat, args.top) for module in modules],
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+    failures = check_limits(report, args.max_ms, not args.allow_heavy)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures += compare(report, json.load(f), args.max_regression)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Micro-benchmark: log f-string (eager) so với log lazy qua hot_log/truncate
+
+Đo CPU time cho 10k lần log một payload lớn khi level của hot path bị lọc
+(sink ở INFO, hot path ở DEBUG) và khi level được bật.
+
+    python -m benchmarks.bench_logging --calls 10000 --payload-kb 64
+"""
+import argparse
+import json
+import time
+from loguru import logger
+from log_utils import HotPathLogger, truncate
+
+
+def _bench(func, calls: int) -> float:
+    """CPU time (giây) cho ``calls`` lần gọi"""
+    start = time.process_time()
+    for _ in range(calls):
+        func()
+    return time.process_time() - start
+
+
+def run(calls: int = 10000, payload_kb: int = 64) -> dict:
+    payload = "x" * (payload_kb * 1024)
+    data = {"user_id": "k14ryirf", "cookies": [{"name": "c", "value": payload}]}
+    hot = HotPathLogger(level="DEBUG")
+
+    def eager():
+        logger.debug(f"Requesting /api/v1/user/cookies/update with data: {data}")
+        logger.debug(f"Response: {payload}")
+
+    def lazy():
+        hot.log("Requesting {} with data: {}", "/api/v1/user/cookies/update", truncate(data))
+        hot.log("Response: {}", truncate(payload))
+
+    report = {"calls": calls, "payload_kb": payload_kb}
+    for sink_level in ("INFO", "DEBUG"):
+        logger.remove()
+        logger.add(lambda message: None, level=sink_level)
+        eager_cpu = _bench(eager, calls)
+        lazy_cpu = _bench(lazy, calls)
+        report[f"sink_{sink_level.lower()}"] = {
+            "eager_cpu_s": round(eager_cpu, 4),
+            "lazy_cpu_s": round(lazy_cpu, 4),
+            "saved_cpu_s": round(eager_cpu - lazy_cpu, 4),
+            "speedup": round(eager_cpu / lazy_cpu, 1) if lazy_cpu else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark log eager vs lazy")
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--payload-kb", type=int, default=64)
+    args = parser.parse_args()
+    print(json.dumps(run(args.calls, args.payload_kb), indent=2))
+
+
+if __name__ == "__main__":
+    main()
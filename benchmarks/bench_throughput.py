@@ -0,0 +1,284 @@
+"""
+Benchmark throughput end-to-end: stub Local API + fixture site + Chromium headless
+
+Đo số profile khởi động mỗi phút, số lượt tra domain mỗi phút, phân phối độ trễ
+từng bước và RSS đỉnh ở các mức concurrency. Kết quả là một report JSON.
+
+    python -m benchmarks.bench_throughput --levels 1,4,16,64 --lookups 10 --output report.json
+    python -m benchmarks.bench_throughput --baseline report.json --max-regression 0.2
+    python -m benchmarks.bench_throughput --levels 64 --processes 8  # ProcessRunner
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from adspower_api_sync import AdsPowerAPISync
+from adspower_stub_server import AdsPowerStubServer, StubSettings
+from browser_controller_sync import BrowserControllerSync
+from config import config
+from godaddy_auto import GoDaddyAutomation
+from godaddy_fixture_site import FixtureSettings, GoDaddyFixtureSite
+from metrics import CallMetrics, StepTimer
+from process_runner import ProcessRunner
+
+
+class RssSampler:
+    """Lấy mẫu RSS của process hiện tại và các process con (Chromium, Playwright driver)"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def _sample(self) -> int:
+        if self._process is None:
+            # Không có psutil: chỉ có RSS đỉnh của chính process Python (KB trên Linux)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        total = 0
+        for proc in [self._process, *self._process.children(recursive=True)]:
+            try:
+                total += proc.memory_info().rss
+            except Exception:
+                continue
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.peak_bytes = max(self.peak_bytes, self._sample())
+
+
+def _worker(index: int, profile_id: str, api: AdsPowerAPISync, base_url: str,
+            domains: List[str], call_metrics: CallMetrics, step_metrics: CallMetrics,
+            results: Dict, start_event: threading.Event, tabs: int = 1) -> None:
+    """Một worker: khởi động profile, kết nối CDP rồi tra danh sách domain"""
+    start_event.wait()
+    outcome = {"launched": False, "lookups": 0, "errors": 0}
+    try:
+        with BrowserControllerSync(api, call_metrics=call_metrics) as browser:
+            launch_start = time.perf_counter()
+            started = api.start_browser(profile_id, headless=True)
+            if started.get("code") != 0:
+                raise RuntimeError(started.get("msg"))
+            browser.connect_to_browser(profile_id, started["data"]["ws"]["puppeteer"])
+            step_metrics.observe("launch", "", time.perf_counter() - launch_start)
+            outcome["launched"] = True
+
+            godaddy = GoDaddyAutomation(browser, base_url=base_url)
+            timer = StepTimer("benchmark", worker=index)
+            with timer:
+                godaddy.navigate_to_godaddy()
+                if tabs > 1:
+                    searched = godaddy.search_domains_parallel(domains, tabs=tabs)
+                else:
+                    searched = (godaddy.search_domain(domain) for domain in domains)
+                for result in searched:
+                    if result["status"] == "success" and result["results"]:
+                        outcome["lookups"] += 1
+                    else:
+                        outcome["errors"] += 1
+            for record in timer.records:
+                step_metrics.observe(record.name, "", record.wall_time, ok=record.status == "ok")
+    except Exception as e:
+        logger.error("Benchmark worker {} failed: {}", index, e)
+        outcome["errors"] += 1
+    results[index] = outcome
+
+
+_sessions: "weakref.WeakKeyDictionary[BrowserControllerSync, GoDaddyAutomation]" = weakref.WeakKeyDictionary()
+
+
+def lookup_job(browser: BrowserControllerSync, job: Tuple[str, str]) -> bool:
+    """Worker cho ProcessRunner: tra một domain, mở fixture site ở job đầu tiên của profile"""
+    base_url, domain = job
+    godaddy = _sessions.get(browser)
+    if godaddy is None:
+        godaddy = _sessions[browser] = GoDaddyAutomation(browser, base_url=base_url)
+        godaddy.navigate_to_godaddy()
+    result = godaddy.search_domain(domain)
+    return result["status"] == "success" and bool(result["results"])
+
+
+def run_level_processes(concurrency: int, lookups: int, stub: AdsPowerStubServer, site: GoDaddyFixtureSite,
+                        processes: int) -> Dict:
+    """Như run_level nhưng chia profile cho ``processes`` worker process (ProcessRunner)"""
+    runner = ProcessRunner(stub.profile_ids[:concurrency], "benchmarks.bench_throughput:lookup_job",
+                           processes=processes, api_url=stub.url, start_options={"headless": True},
+                           log_level="WARNING")
+    jobs = [(site.base_url, f"bench-{concurrency}-{n}.com") for n in range(concurrency * lookups)]
+    with RssSampler() as rss:
+        results = runner.run(jobs, on_error=lambda job, error: False)
+    stats = runner.stats()
+    _, call_metrics = runner.merged_metrics()
+    completed = sum(1 for ok in results if ok)
+    # Thời gian gồm cả tạo process và khởi động profile
+    # Cùng các khóa với run_level; số liệu từng bước nằm trong worker process nên không đo được
+    return {
+        "concurrency": concurrency,
+        "tabs": 1,
+        "processes": stats["processes"],
+        "elapsed_s": stats["elapsed_s"],
+        "profiles_launched": sum(1 for health in runner.profile_stats.values() if health is not None),
+        "profiles_launched_per_min": None,
+        "lookups": completed,
+        "lookups_per_min": round(completed * 60 / runner.elapsed, 2) if runner.elapsed else 0.0,
+        "errors": len(results) - completed,
+        "requeued": stats["requeued_total"],
+        "peak_rss_mb": round(rss.peak_bytes / (1024 * 1024), 1),
+        "steps": {},
+        "top_calls": call_metrics.top(10, by="total"),
+    }
+
+
+def run_level(concurrency: int, lookups: int, stub: AdsPowerStubServer, site: GoDaddyFixtureSite,
+              tabs: int = 1) -> Dict:
+    """Chạy một mức concurrency và trả về số liệu"""
+    api = AdsPowerAPISync(api_url=stub.url)
+    call_metrics = CallMetrics(namespace="browser")
+    step_metrics = CallMetrics(namespace="step")
+    results: Dict[int, Dict] = {}
+    start_event = threading.Event()
+    threads = []
+    for index in range(concurrency):
+        domains = [f"bench-{concurrency}-{index}-{n}.com" for n in range(lookups)]
+        thread = threading.Thread(
+            target=_worker,
+            args=(index, stub.profile_ids[index], api, site.base_url, domains,
+                  call_metrics, step_metrics, results, start_event, tabs),
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        start_event.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    api.close()
+
+    launched = sum(1 for r in results.values() if r["launched"])
+    completed = sum(r["lookups"] for r in results.values())
+    steps = {name: labels[""] for name, labels in step_metrics.snapshot().items()}
+    # Mọi worker khởi động cùng lúc nên pha khởi động kéo dài bằng lần khởi động chậm nhất
+    launch_wall = steps.get("launch", {}).get("max", 0.0)
+    return {
+        "concurrency": concurrency,
+        "tabs": tabs,
+        "elapsed_s": round(elapsed, 3),
+        "profiles_launched": launched,
+        "profiles_launched_per_min": round(launched * 60 / launch_wall, 2) if launch_wall else 0.0,
+        "lookups": completed,
+        "lookups_per_min": round(completed * 60 / elapsed, 2) if elapsed else 0.0,
+        "errors": sum(r["errors"] for r in results.values()),
+        "peak_rss_mb": round(rss.peak_bytes / (1024 * 1024), 1),
+        "steps": steps,
+        "top_calls": call_metrics.top(10, by="total"),
+    }
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """So sánh lookups_per_min với baseline, trả về danh sách regression"""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    failures = []
+    for level in report["levels"]:
+        base = previous.get(level["concurrency"])
+        if not base or not base.get("lookups_per_min"):
+            continue
+        ratio = level["lookups_per_min"] / base["lookups_per_min"]
+        if ratio < 1 - max_regression:
+            failures.append(f"concurrency={level['concurrency']}: lookups_per_min "
+                            f"{level['lookups_per_min']} vs baseline {base['lookups_per_min']} ({ratio:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark")
+    parser.add_argument("--levels", default="1,4,16,64", help="Các mức concurrency, phân cách bằng dấu phẩy")
+    parser.add_argument("--lookups", type=int, default=10, help="Số lượt tra domain mỗi worker")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Độ trễ của stub Local API")
+    parser.add_argument("--site-latency-ms", type=float, default=0.0, help="Độ trễ của fixture site")
+    parser.add_argument("--search-latency-ms", type=float, default=0.0, help="Độ trễ thêm cho kết quả tìm kiếm")
+    parser.add_argument("--results", type=int, default=5, help="Số kết quả mỗi lần tìm kiếm")
+    parser.add_argument("--client-side", action="store_true", help="Fixture render kết quả bằng JavaScript")
+    parser.add_argument("--tabs", type=int, default=1, help="Số tab tra domain song song trong mỗi profile")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Chạy bằng ProcessRunner với số worker process này (0 = thread trong một process)")
+    parser.add_argument("--keep-delays", action="store_true", help="Giữ random_delay/gõ phím như chạy thật")
+    parser.add_argument("--output", help="Ghi report JSON ra file")
+    parser.add_argument("--baseline", help="Report JSON trước đó để so sánh")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Mức giảm tối đa cho phép (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    if not args.keep_delays:
+        config.delay_scale = 0.0
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    stub_settings = StubSettings(latency_ms=args.api_latency_ms, headless=True)
+    site_settings = FixtureSettings(
+        latency_ms=args.site_latency_ms,
+        search_latency_ms=args.search_latency_ms,
+        results_per_search=args.results,
+        client_side_results=args.client_side,
+    )
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "lookups_per_worker": args.lookups,
+        "delay_scale": config.delay_scale,
+        "fixture": vars(site_settings),
+        "levels": [],
+    }
+    with AdsPowerStubServer(settings=stub_settings, profiles=max(levels)) as stub, \
+            GoDaddyFixtureSite(settings=site_settings) as site:
+        for concurrency in levels:
+            if args.processes:
+                report["levels"].append(run_level_processes(concurrency, args.lookups, stub, site, args.processes))
+            else:
+                report["levels"].append(run_level(concurrency, args.lookups, stub, site, args.tabs))
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures = compare(report, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Kiểm tra browser reaper: process khởi động profile rồi thoát không được để lại browser chạy
+
+Chạy một process con khởi động profile trên stub Local API, cho nó thoát bình thường
+(atexit) hoặc nhận SIGTERM, rồi kiểm tra stub không còn browser nào chạy. Exit code 1 nếu
+còn browser.
+
+    python -m benchmarks.check_reaper --profiles 3
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List
+from loguru import logger
+from adspower_stub_server import AdsPowerStubServer, StubSettings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Process con: khởi động mọi profile, báo "ready" rồi thoát hoặc chờ signal
+_CHILD = """
+import sys, time
+from adspower_api_sync import AdsPowerAPISync
+api = AdsPowerAPISync(api_url=sys.argv[1])
+for profile_id in sys.argv[3:]:
+    assert api.start_browser(profile_id).get("code") == 0
+print("ready", flush=True)
+if sys.argv[2] == "signal":
+    time.sleep(60)
+"""
+
+
+def run_case(stub: AdsPowerStubServer, mode: str, profile_ids: List[str], timeout: float = 30.0) -> List[str]:
+    """Chạy process con ở chế độ "exit" hoặc "signal", trả về các profile vẫn còn chạy"""
+    child = subprocess.Popen(
+        [sys.executable, "-c", _CHILD, stub.url, mode, *profile_ids],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    ready = child.stdout.readline().strip() == "ready"
+    if ready and mode == "signal":
+        child.send_signal(signal.SIGTERM)
+    child.wait(timeout=timeout)
+    if not ready:
+        raise RuntimeError(f"Child process failed before starting browsers (exit code {child.returncode})")
+    # Stub xử lý request stop trong thread riêng: chờ ngắn cho trạng thái cập nhật
+    deadline = time.monotonic() + 2
+    while stub.state.browsers and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return sorted(stub.state.browsers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that exiting processes stop their browsers")
+    parser.add_argument("--profiles", type=int, default=3, help="Số profile process con khởi động")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    modes = ["exit"] + (["signal"] if hasattr(signal, "SIGTERM") and os.name == "posix" else [])
+    failures = []
+    with AdsPowerStubServer(settings=StubSettings(launch_browser=False), profiles=args.profiles) as stub:
+        for mode in modes:
+            left = run_case(stub, mode, stub.profile_ids)
+            print(f"{mode}: {len(left)} browsers left running")
+            if left:
+                failures.append(f"{mode}: browsers still running {left}")
+                stub.state.stop_all()
+
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
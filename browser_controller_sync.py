@@ -2,25 +2,123 @@
 Browser Controller sử dụng Playwright - Sync Version
 Điều khiển trình duyệt thông qua CDP connection (Synchronous)
 """
+from __future__ import annotations
+
+import json
 import random
+import secrets
 import time
-from typing import Optional, Dict, List, Any
-from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page
-from loguru import logger
+from typing import TYPE_CHECKING, Optional, Dict, List, Any
 from config import config
 from adspower_api_sync import AdsPowerAPISync
+from log_utils import hot_log, logger, truncate
+from metrics import CallMetrics, cdp_call, record_cdp_call, record_delay
+from resilience import CircuitBreaker, RetryPolicy, SELECTOR_TIMEOUT
+from utils import EXTRACTORS
+
+if TYPE_CHECKING:
+    # Playwright chỉ được import khi start_playwright()
+    from playwright.sync_api import Browser, BrowserContext, Page
+
+
+# Trích xuất trong trang: duyệt text node và attribute bằng TreeWalker, chạy cùng pattern
+# với DataExtractor (truyền từ Python), chỉ trả về kết quả đã gọn
+_EXTRACT_SCRIPT = """
+({patterns, dedupe, limit}) => {
+    const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+    const results = {};
+    const seen = {};
+    const regexes = {};
+    for (const [kind, source] of Object.entries(patterns)) {
+        results[kind] = [];
+        seen[kind] = new Set();
+        if (kind !== 'links') regexes[kind] = new RegExp(source, 'g');
+    }
+    const add = (kind, value) => {
+        if (!value || (limit && results[kind].length >= limit)) return;
+        if (dedupe) {
+            if (seen[kind].has(value)) return;
+            seen[kind].add(value);
+        }
+        results[kind].push(value);
+    };
+    const scan = (text) => {
+        for (const [kind, regex] of Object.entries(regexes)) {
+            regex.lastIndex = 0;
+            for (const match of text.matchAll(regex)) {
+                add(kind, kind === 'phones' ? match.slice(1).map(g => g || '').join('') : match[0]);
+            }
+        }
+    };
+    const root = document.documentElement;
+    if (!root) return results;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, {
+        acceptNode: (node) => node.nodeType === Node.ELEMENT_NODE && SKIP.has(node.tagName)
+            ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT
+    });
+    for (let node = walker.currentNode; node; node = walker.nextNode()) {
+        if (node.nodeType === Node.TEXT_NODE) {
+            scan(node.nodeValue);
+            continue;
+        }
+        for (const attr of node.attributes) {
+            if (attr.name === 'href' && 'links' in results) add('links', attr.value);
+            scan(attr.value);
+        }
+    }
+    return results;
+}
+"""
+
+_PAGE_INFO_SCRIPT = """
+() => ({
+    title: document.title,
+    userAgent: navigator.userAgent,
+    localStorageCount: localStorage.length,
+    sessionStorageCount: sessionStorage.length
+})
+"""
+
+# Helper được cài sẵn cho mọi context
+_BUILTIN_SCRIPTS = {
+    "extract": _EXTRACT_SCRIPT,
+    "pageInfo": _PAGE_INFO_SCRIPT,
+}
+
+# Lời gọi helper theo tên: payload mỗi lần chỉ gồm tên và tham số
+_CALL_SCRIPT = """
+async ([key, name, args]) => {
+    const helpers = window[key];
+    if (!helpers || !helpers[name]) return {missing: true};
+    return {value: await helpers[name](...args)};
+}
+"""
 
 
 class BrowserControllerSync:
     """Controller đồng bộ để điều khiển trình duyệt thông qua Playwright"""
     
-    def __init__(self, adspower_api: AdsPowerAPISync):
+    def __init__(self, adspower_api: AdsPowerAPISync, call_metrics: Optional[CallMetrics] = None):
+        """
+        Args:
+            adspower_api: Client AdsPower Local API
+            call_metrics: Bật đo số lần gọi/độ trễ của từng method (tùy chọn, xem enable_metrics)
+        """
         self.adspower_api = adspower_api
         self.playwright = None
         self.browser = None
         self.context = None
-        self.pages: List[Page] = []
+        self.pages: Dict[int, Page] = {}  # handle -> page, handle không đổi khi đóng trang khác
+        self._free_pages: List[Page] = []  # Trang đã reset, chờ tái sử dụng
+        self._next_handle = 0
         self.current_user_id = None
+        self.call_metrics = call_metrics
+        # Kết nối CDP chỉ retry khi mất kết nối/lỗi mạng, dùng chung breaker theo profile với Local API
+        self.retry_policy = RetryPolicy()
+        self.scripts: Dict[str, str] = dict(_BUILTIN_SCRIPTS)  # Script registry: tên -> function JS
+        self._installed_scripts: set = set()  # Các script đã add_init_script vào context hiện tại
+        # Tên biến global ngẫu nhiên, không enumerable, để helper khó bị trang phát hiện
+        self._helpers_key = f"__h{secrets.token_hex(6)}"
     
     def __enter__(self):
         """Context manager entry"""
@@ -31,32 +129,96 @@ class BrowserControllerSync:
         """Context manager exit"""
         self.close()
     
+    def enable_metrics(self, call_metrics: Optional[CallMetrics] = None) -> CallMetrics:
+        """Bật đo số lần gọi CDP và độ trễ theo method/selector"""
+        self.call_metrics = call_metrics or self.call_metrics or CallMetrics(namespace="browser")
+        return self.call_metrics
+    
+    def disable_metrics(self) -> None:
+        """Tắt đo (các method quay về gọi trực tiếp)"""
+        self.call_metrics = None
+    
+    def get_metrics(self) -> Dict:
+        """Lấy số liệu đo dạng dict (rỗng nếu chưa bật)"""
+        return self.call_metrics.snapshot() if self.call_metrics else {}
+    
+    @property
+    def breaker(self) -> Optional[CircuitBreaker]:
+        """Circuit breaker của profile đang kết nối (dùng chung với AdsPowerAPISync)"""
+        if not self.current_user_id:
+            return None
+        return self.adspower_api.breakers.get(f"profile:{self.current_user_id}")
+    
     def start_playwright(self):
         """Khởi động Playwright"""
         try:
+            from playwright.sync_api import sync_playwright
             self.playwright = sync_playwright().start()
             logger.info("Playwright started successfully")
         except Exception as e:
-            logger.error(f"Failed to start Playwright: {e}")
+            logger.error("Failed to start Playwright: {}", e)
             raise
     
-    def connect_to_browser(self, profile_id: str, webdriver_url: str) -> Browser:
-        """Kết nối đến trình duyệt AdsPower thông qua CDP (API v2)"""
+    @cdp_call
+    def connect_to_browser(self, profile_id: str, webdriver_url: str,
+                           new_context: Optional[bool] = None) -> Browser:
+        """
+        Kết nối đến trình duyệt AdsPower thông qua CDP (API v2)
+        
+        Args:
+            profile_id: ID profile
+            webdriver_url: WebSocket URL (data.ws.puppeteer của start_browser)
+            new_context: True để tạo context riêng thay vì dùng context mặc định của profile
+                (mặc định theo config.use_new_context)
+        """
         try:
             
             # Kết nối đến trình duyệt thông qua CDP
-            self.browser = self.playwright.chromium.connect_over_cdp(webdriver_url)
             self.current_user_id = profile_id
+            self.browser = self.retry_policy.run(
+                lambda: self.playwright.chromium.connect_over_cdp(webdriver_url),
+                breaker=self.breaker,
+                name=f"connect_over_cdp({profile_id})",
+            )
             
-            logger.info(f"Successfully connected to browser for profile: {profile_id}")
+            use_new_context = config.use_new_context if new_context is None else new_context
+            if not use_new_context:
+                self.attach_default_context()
+            
+            logger.info("Successfully connected to browser for profile: {}", profile_id)
             return self.browser
             
         except Exception as e:
-            logger.error(f"Failed to connect to browser: {e}")
+            logger.error("Failed to connect to browser: {}", e)
             raise
     
+    def attach_default_context(self) -> Optional[BrowserContext]:
+        """
+        Dùng context mặc định của profile AdsPower cùng các tab đang mở
+        
+        Context mặc định giữ cookies và HTTP cache của profile; các tab có sẵn được
+        gán handle 0, 1, ... theo thứ tự.
+        """
+        context = self._default_context()
+        if context is None:
+            return None
+        
+        self.context = context
+        self._installed_scripts = set()
+        self._install_scripts()
+        for page in self.context.pages:
+            if page in self.pages.values():
+                continue
+            page.set_default_timeout(config.page_timeout)
+            page.set_default_navigation_timeout(config.navigation_timeout)
+            self._register_page(page)
+        
+        hot_log.log("Attached to default context with {} existing pages", len(self.pages))
+        return self.context
+    
+    @cdp_call
     def create_context(self, **kwargs) -> BrowserContext:
-        """Tạo browser context mới"""
+        """Tạo browser context mới (context riêng, không dùng cache/cookies của profile)"""
         if not self.browser:
             raise Exception("Browser not connected. Call connect_to_browser() first.")
         
@@ -74,17 +236,19 @@ class BrowserControllerSync:
             }
             
             self.context = self.browser.new_context(**context_options)
-            logger.info("Browser context created successfully")
+            self._installed_scripts = set()
+            self._install_scripts()
+            hot_log.log("Browser context created successfully")
             return self.context
             
         except Exception as e:
-            logger.error(f"Failed to create browser context: {e}")
+            logger.error("Failed to create browser context: {}", e)
             raise
     
-    def new_page(self, **kwargs) -> Page:
-        """Tạo trang mới"""
-        if not self.context:
-            self.create_context()
+    @cdp_call
+    def new_page(self, handle: Optional[int] = None, **kwargs) -> Page:
+        """Tạo trang mới (gán cho handle nếu có, mặc định handle mới)"""
+        self._ensure_context()
         
         try:
             page = self.context.new_page()
@@ -93,34 +257,145 @@ class BrowserControllerSync:
             page.set_default_timeout(config.page_timeout)
             page.set_default_navigation_timeout(config.navigation_timeout)
             
-            self.pages.append(page)
-            logger.info(f"New page created. Total pages: {len(self.pages)}")
+            self._register_page(page, handle)
+            hot_log.log("New page created. Total pages: {}", len(self.pages))
             return page
             
         except Exception as e:
-            logger.error(f"Failed to create new page: {e}")
+            logger.error("Failed to create new page: {}", e)
             raise
     
-    def get_page(self, index: int = 0) -> Page:
-        """Lấy trang theo index"""
-        if not self.pages or index >= len(self.pages):
-            return self.new_page()
-        return self.pages[index]
+    def _default_context(self) -> Optional[BrowserContext]:
+        """Context mặc định của profile (None nếu chưa kết nối)"""
+        if self.browser and self.browser.contexts:
+            return self.browser.contexts[0]
+        return None
+    
+    def _ensure_context(self) -> None:
+        """Gắn context mặc định của profile, hoặc tạo context mới nếu cần"""
+        if self.context:
+            return
+        if config.use_new_context or not self.attach_default_context():
+            self.create_context()
+    
+    def _register_page(self, page: Page, handle: Optional[int] = None) -> int:
+        """Gán trang cho một handle (mặc định handle mới)"""
+        if handle is None:
+            handle = self._next_handle
+        self.pages[handle] = page
+        self._next_handle = max(self._next_handle, handle + 1)
+        return handle
+    
+    def _take_free_page(self) -> Optional[Page]:
+        """Lấy một trang còn sống từ free list"""
+        while self._free_pages:
+            page = self._free_pages.pop()
+            if not page.is_closed():
+                return page
+        return None
     
+    def get_page(self, index: int = 0) -> Page:
+        """Lấy trang theo handle (tạo hoặc tái sử dụng trang nếu handle chưa có)"""
+        if index not in self.pages:
+            self._ensure_context()
+        page = self.pages.get(index)
+        if page is not None:
+            return page
+        
+        page = self._take_free_page()
+        if page is None:
+            return self.new_page(handle=index)
+        
+        hot_log.log("Reusing recycled page for handle {}", index)
+        self._register_page(page, index)
+        return page
+    
+    def acquire_page(self) -> int:
+        """Lấy một trang cho tác vụ mới (ưu tiên trang đã tái chế), trả về handle"""
+        handle = self._next_handle
+        self.get_page(handle)
+        return handle
+    
+    @cdp_call
+    def release_page(self, page_index: int, clear_storage: bool = False) -> None:
+        """
+        Trả trang về free list thay vì đóng
+        
+        Trang được đưa về about:blank; handle bị giải phóng, các handle khác không đổi.
+        
+        Args:
+            page_index: Handle của trang
+            clear_storage: Xóa cookies/localStorage/sessionStorage/IndexedDB/cache của origin đang mở
+        """
+        page = self.pages.pop(page_index, None)
+        if page is None or page.is_closed():
+            return
+        
+        try:
+            if clear_storage:
+                self._clear_origin_state(page)
+            page.goto("about:blank")
+            
+            if len(self._free_pages) < config.page_pool_max_idle:
+                self._free_pages.append(page)
+                hot_log.log("Page {} released. Idle pages: {}", page_index, len(self._free_pages))
+            else:
+                page.close()
+                hot_log.log("Page {} closed (idle pool full)", page_index)
+                
+        except Exception as e:
+            # Trang lỗi không được tái sử dụng
+            logger.warning("Failed to recycle page {}: {}", page_index, e)
+            if not page.is_closed():
+                page.close()
+    
+    def _clear_origin_state(self, page: Page) -> None:
+        """Xóa dữ liệu của origin hiện tại của trang"""
+        origin = page.evaluate("""
+            () => {
+                try { sessionStorage.clear(); localStorage.clear(); } catch (e) {}
+                return location.origin;
+            }
+        """)
+        if not origin or origin == "null":
+            return
+        
+        session = self.context.new_cdp_session(page)
+        try:
+            session.send("Storage.clearDataForOrigin", {
+                "origin": origin,
+                "storageTypes": "cookies,local_storage,indexeddb,cache_storage,service_workers",
+            })
+        finally:
+            session.detach()
+        record_cdp_call(2)
+        hot_log.log("Cleared storage for origin {}", origin)
+    
+    @cdp_call
     def navigate_to(self, url: str, page_index: int = 0, **kwargs) -> Page:
-        """Điều hướng đến URL"""
+        """
+        Điều hướng đến URL
+        
+        Lỗi điều hướng (kể cả timeout) được tính cho breaker của profile; khi breaker mở,
+        raise CircuitOpenError ngay thay vì chờ hết navigation timeout.
+        """
         page = self.get_page(page_index)
         
         try:
-            logger.info(f"Navigating to: {url}")
-            page.goto(url, **kwargs)
-            logger.info(f"Successfully navigated to: {url}")
+            hot_log.log("Navigating to: {}", url)
+            breaker = self.breaker
+            if breaker is None:
+                page.goto(url, **kwargs)
+            else:
+                breaker.call(page.goto, url, trip_on=RetryPolicy.DEFAULT_TRIP_ON | {SELECTOR_TIMEOUT}, **kwargs)
+            hot_log.log("Successfully navigated to: {}", url)
             return page
             
         except Exception as e:
-            logger.error(f"Failed to navigate to {url}: {e}")
+            logger.error("Failed to navigate to {}: {}", url, e)
             raise
     
+    @cdp_call
     def wait_for_element(self, selector: str, page_index: int = 0, timeout: int = None) -> Any:
         """Chờ element xuất hiện"""
         page = self.get_page(page_index)
@@ -128,25 +403,27 @@ class BrowserControllerSync:
         
         try:
             element = page.wait_for_selector(selector, timeout=timeout)
-            logger.info(f"Element found: {selector}")
+            hot_log.log("Element found: {}", selector)
             return element
             
         except Exception as e:
-            logger.error(f"Element not found: {selector}, timeout: {timeout}ms")
+            logger.error("Element not found: {}, timeout: {}ms", selector, timeout)
             raise
     
+    @cdp_call
     def click_element(self, selector: str, page_index: int = 0, **kwargs) -> None:
         """Click vào element"""
         page = self.get_page(page_index)
         
         try:
             page.click(selector, **kwargs)
-            logger.info(f"Clicked element: {selector}")
+            hot_log.log("Clicked element: {}", selector)
             
         except Exception as e:
-            logger.error(f"Failed to click element {selector}: {e}")
+            logger.error("Failed to click element {}: {}", selector, e)
             raise
     
+    @cdp_call
     def fill_input(self, selector: str, text: str, page_index: int = 0, 
                    min_delay: float = 0.05, max_delay: float = 0.15, 
                    clear_first: bool = True, **kwargs) -> None:
@@ -175,59 +452,68 @@ class BrowserControllerSync:
             if clear_first:
                 page.keyboard.press("Control+a")  # Select all
                 page.keyboard.press("Delete")     # Delete selected
-                time.sleep(random.uniform(0.1, 0.3))  # Delay sau khi xóa
+                clear_delay = random.uniform(0.1, 0.3) * config.delay_scale
+                time.sleep(clear_delay)  # Delay sau khi xóa
+                record_delay(clear_delay)
             
             # Điền từng ký tự với delay ngẫu nhiên
             for char in text:
                 page.keyboard.type(char)
                 # Delay ngẫu nhiên giữa các ký tự
-                delay = random.uniform(min_delay, max_delay)
+                delay = random.uniform(min_delay, max_delay) * config.delay_scale
                 time.sleep(delay)
+                record_delay(delay)
             
-            logger.info(f"Filled input {selector} with text: {text[:20]}... (human-like typing)")
+            # wait_for_selector + click + (2 phím xóa) + từng ký tự; decorator đã đếm 1 lần
+            record_cdp_call(1 + (2 if clear_first else 0) + len(text))
+            hot_log.log("Filled input {} with text: {} (human-like typing)", selector, truncate(text, 20))
             
         except Exception as e:
-            logger.error(f"Failed to fill input {selector}: {e}")
+            logger.error("Failed to fill input {}: {}", selector, e)
             raise
     
+    @cdp_call
     def send_key_enter(self, selector: str, page_index: int = 0, **kwargs) -> None:
         """Gửi key enter vào input"""
         page = self.get_page(page_index)
         
         try:
             page.keyboard.press("Enter")
-            logger.info(f"Sent key enter to {selector}")
+            hot_log.log("Sent key enter to {}", selector)
             
         except Exception as e:
-            logger.error(f"Failed to send key enter to {selector}: {e}")
+            logger.error("Failed to send key enter to {}: {}", selector, e)
             raise
     
+    @cdp_call
     def get_text(self, selector: str, page_index: int = 0) -> str:
         """Lấy text từ element"""
         page = self.get_page(page_index)
         
         try:
             text = page.text_content(selector)
-            logger.info(f"Got text from {selector}: {text[:50]}...")
+            hot_log.log("Got text from {}: {}", selector, truncate(text, 50))
             return text or ""
             
         except Exception as e:
-            logger.error(f"Failed to get text from {selector}: {e}")
+            logger.error("Failed to get text from {}: {}", selector, e)
             raise
     
+    @cdp_call
     def get_attribute(self, selector: str, attribute: str, page_index: int = 0) -> str:
         """Lấy attribute từ element"""
         page = self.get_page(page_index)
         
         try:
             value = page.get_attribute(selector, attribute)
-            logger.info(f"Got attribute {attribute} from {selector}: {value}")
+            hot_log.log("Got attribute {} from {}: {}", attribute, selector, truncate(value))
             return value or ""
             
         except Exception as e:
-            logger.error(f"Failed to get attribute {attribute} from {selector}: {e}")
+            logger.error("Failed to get attribute {} from {}: {}", attribute, selector, e)
             raise
     
+    @cdp_call
     def take_screenshot(self, path: str = None, page_index: int = 0, **kwargs) -> bytes:
         """Chụp ảnh màn hình"""
         page = self.get_page(page_index)
@@ -235,153 +521,265 @@ class BrowserControllerSync:
         try:
             if path:
                 page.screenshot(path=path, **kwargs)
-                logger.info(f"Screenshot saved to: {path}")
+                hot_log.log("Screenshot saved to: {}", path)
             else:
                 screenshot = page.screenshot(**kwargs)
-                logger.info("Screenshot taken")
+                hot_log.log("Screenshot taken")
                 return screenshot
                 
         except Exception as e:
-            logger.error(f"Failed to take screenshot: {e}")
+            logger.error("Failed to take screenshot: {}", e)
             raise
     
+    @cdp_call
     def evaluate_script(self, script: str, page_index: int = 0) -> Any:
         """Thực thi JavaScript"""
         page = self.get_page(page_index)
         
         try:
             result = page.evaluate(script)
-            logger.info(f"Script executed successfully")
+            hot_log.log("Script executed successfully")
             return result
             
         except Exception as e:
-            logger.error(f"Failed to execute script: {e}")
+            logger.error("Failed to execute script: {}", e)
             raise
     
+    @cdp_call
     def inject_script(self, script: str, page_index: int = 0) -> None:
         """Inject JavaScript vào trang"""
         page = self.get_page(page_index)
         
         try:
             page.add_script_tag(content=script)
-            logger.info("Script injected successfully")
+            hot_log.log("Script injected successfully")
+            
+        except Exception as e:
+            logger.error("Failed to inject script: {}", e)
+            raise
+    
+    def _script_source(self, name: str) -> str:
+        """Đoạn JS cài helper ``name`` vào window[helpers_key]"""
+        return (
+            "(() => {"
+            f" const key = {json.dumps(self._helpers_key)};"
+            " if (!Object.prototype.hasOwnProperty.call(window, key))"
+            " Object.defineProperty(window, key, {value: {}, enumerable: false});"
+            f" window[key][{json.dumps(name)}] = ({self.scripts[name].strip()});"
+            " })();"
+        )
+    
+    def _install_scripts(self) -> None:
+        """Cài các script chưa cài vào context hiện tại (chạy cho mọi document mới)"""
+        if not self.context:
+            return
+        for name in self.scripts:
+            if name not in self._installed_scripts:
+                self.context.add_init_script(script=self._script_source(name))
+                self._installed_scripts.add(name)
+                record_cdp_call(1)
+    
+    def register_script(self, name: str, source: str) -> None:
+        """
+        Đăng ký helper JS để gọi bằng call(name, *args)
+        
+        Source là một function expression, ví dụ ``"(selector) => document.querySelectorAll(selector).length"``.
+        Helper được cài một lần cho mỗi context qua add_init_script; các trang đã mở
+        sẵn được cài khi gọi lần đầu.
+        """
+        if self.scripts.get(name) == source:
+            return
+        self.scripts[name] = source
+        self._installed_scripts.discard(name)
+        self._install_scripts()
+        hot_log.log("Registered script {}", name)
+    
+    @cdp_call
+    def call(self, name: str, *args, page_index: int = 0) -> Any:
+        """Gọi helper đã đăng ký trong trang, chỉ gửi tên và tham số qua CDP"""
+        if name not in self.scripts:
+            raise KeyError(f"Script not registered: {name}")
+        page = self.get_page(page_index)
+        
+        try:
+            payload = [self._helpers_key, name, list(args)]
+            result = page.evaluate(_CALL_SCRIPT, payload)
+            if result.get("missing"):
+                # Document được tạo trước khi cài init script: cài trực tiếp rồi gọi lại
+                page.evaluate(self._script_source(name))
+                result = page.evaluate(_CALL_SCRIPT, payload)
+                record_cdp_call(2)
+            hot_log.log("Called script {}", name)
+            return result.get("value")
             
         except Exception as e:
-            logger.error(f"Failed to inject script: {e}")
+            logger.error("Failed to call script {}: {}", name, e)
             raise
     
+    def extract_in_page(self, kinds: tuple = tuple(EXTRACTORS), page_index: int = 0,
+                        dedupe: bool = True, limit: int = 0) -> Dict[str, List[str]]:
+        """
+        Trích xuất links/emails/phones/prices ngay trong trang, không tải HTML về Python
+        
+        Dùng cùng pattern với DataExtractor nhưng quét text node và attribute (bỏ qua
+        script/style), nên match vắt qua nhiều element sẽ không được tìm thấy.
+        
+        Args:
+            kinds: Các extractor cần chạy
+            page_index: Handle của trang
+            dedupe: Loại bỏ kết quả trùng, giữ thứ tự xuất hiện
+            limit: Số kết quả tối đa mỗi loại (0 = không giới hạn)
+        """
+        patterns = {kind: EXTRACTORS[kind][0].pattern for kind in kinds}
+        results = self.call("extract", {"patterns": patterns, "dedupe": dedupe, "limit": limit},
+                            page_index=page_index)
+        hot_log.log("Extracted in page: {}", {kind: len(values) for kind, values in results.items()})
+        return results
+    
+    @cdp_call
     def wait_for_load_state(self, state: str = "load", page_index: int = 0) -> None:
         """Chờ trang load hoàn tất"""
         page = self.get_page(page_index)
         
         try:
             page.wait_for_load_state(state)
-            logger.info(f"Page load state '{state}' completed")
+            hot_log.log("Page load state '{}' completed", state)
             
         except Exception as e:
-            logger.error(f"Failed to wait for load state '{state}': {e}")
+            logger.error("Failed to wait for load state '{}': {}", state, e)
             raise
     
+    @cdp_call
     def get_cookies(self, page_index: int = 0) -> List[Dict]:
         """Lấy cookies từ trang"""
         page = self.get_page(page_index)
         
         try:
             cookies = page.context.cookies()
-            logger.info(f"Retrieved {len(cookies)} cookies")
+            hot_log.log("Retrieved {} cookies", len(cookies))
             return cookies
             
         except Exception as e:
-            logger.error(f"Failed to get cookies: {e}")
+            logger.error("Failed to get cookies: {}", e)
             raise
     
+    @cdp_call
     def set_cookies(self, cookies: List[Dict], page_index: int = 0) -> None:
         """Set cookies cho trang"""
         page = self.get_page(page_index)
         
         try:
             page.context.add_cookies(cookies)
-            logger.info(f"Set {len(cookies)} cookies")
+            hot_log.log("Set {} cookies", len(cookies))
             
         except Exception as e:
-            logger.error(f"Failed to set cookies: {e}")
+            logger.error("Failed to set cookies: {}", e)
             raise
     
+    @cdp_call
     def get_local_storage(self, page_index: int = 0) -> Dict[str, str]:
         """Lấy local storage"""
         page = self.get_page(page_index)
         
         try:
             storage = page.evaluate("() => ({ ...localStorage })")
-            logger.info(f"Retrieved local storage with {len(storage)} items")
+            hot_log.log("Retrieved local storage with {} items", len(storage))
             return storage
             
         except Exception as e:
-            logger.error(f"Failed to get local storage: {e}")
+            logger.error("Failed to get local storage: {}", e)
             raise
     
+    @cdp_call
     def set_local_storage(self, key: str, value: str, page_index: int = 0) -> None:
         """Set local storage item"""
         page = self.get_page(page_index)
         
         try:
             page.evaluate(f"localStorage.setItem('{key}', '{value}')")
-            logger.info(f"Set local storage: {key} = {value}")
+            hot_log.log("Set local storage: {} = {}", key, truncate(value))
             
         except Exception as e:
-            logger.error(f"Failed to set local storage: {e}")
+            logger.error("Failed to set local storage: {}", e)
             raise
     
+    @cdp_call
     def get_session_storage(self, page_index: int = 0) -> Dict[str, str]:
         """Lấy session storage"""
         page = self.get_page(page_index)
         
         try:
             storage = page.evaluate("() => ({ ...sessionStorage })")
-            logger.info(f"Retrieved session storage with {len(storage)} items")
+            hot_log.log("Retrieved session storage with {} items", len(storage))
             return storage
             
         except Exception as e:
-            logger.error(f"Failed to get session storage: {e}")
+            logger.error("Failed to get session storage: {}", e)
             raise
     
+    @cdp_call
     def set_session_storage(self, key: str, value: str, page_index: int = 0) -> None:
         """Set session storage item"""
         page = self.get_page(page_index)
         
         try:
             page.evaluate(f"sessionStorage.setItem('{key}', '{value}')")
-            logger.info(f"Set session storage: {key} = {value}")
+            hot_log.log("Set session storage: {} = {}", key, truncate(value))
             
         except Exception as e:
-            logger.error(f"Failed to set session storage: {e}")
+            logger.error("Failed to set session storage: {}", e)
             raise
     
     def close_page(self, page_index: int = 0) -> None:
-        """Đóng trang"""
-        if page_index < len(self.pages):
+        """Đóng trang (handle của các trang khác không đổi)"""
+        page = self.pages.get(page_index)
+        if page is not None:
             try:
-                self.pages[page_index].close()
+                page.close()
                 self.pages.pop(page_index)
-                logger.info(f"Page {page_index} closed")
+                hot_log.log("Page {} closed", page_index)
                 
             except Exception as e:
-                logger.error(f"Failed to close page {page_index}: {e}")
+                logger.error("Failed to close page {}: {}", page_index, e)
                 raise
     
     def close_context(self) -> None:
-        """Đóng browser context"""
+        """Đóng browser context (context mặc định của profile chỉ được tách ra, không đóng)"""
         if self.context:
             try:
-                self.context.close()
+                if self.context is not self._default_context():
+                    self.context.close()
                 self.context = None
                 self.pages.clear()
+                self._free_pages.clear()
+                # Lần attach/create tiếp theo đánh handle lại từ 0 và cài lại script
+                self._next_handle = 0
+                self._installed_scripts = set()
                 logger.info("Browser context closed")
                 
             except Exception as e:
-                logger.error(f"Failed to close browser context: {e}")
+                logger.error("Failed to close browser context: {}", e)
                 raise
     
+    def reset_connection(self) -> None:
+        """
+        Bỏ kết nối CDP hiện tại (browser đã crash hoặc mất kết nối) mà không gọi tới browser
+
+        Handle của trang được đánh lại từ 0 ở lần connect_to_browser tiếp theo.
+        """
+        if self.browser is not None:
+            try:
+                if self.browser.is_connected():
+                    self.browser.close()
+            except Exception as e:
+                hot_log.log("Ignoring error while dropping browser connection: {}", e)
+        self.browser = None
+        self.context = None
+        self.pages.clear()
+        self._free_pages.clear()
+        self._next_handle = 0
+        self._installed_scripts = set()
+
     def close_browser(self) -> None:
         """Đóng trình duyệt (API v2)"""
         if self.current_user_id:
@@ -389,14 +787,14 @@ class BrowserControllerSync:
                 # Dừng trình duyệt AdsPower
                 result = self.adspower_api.stop_browser(self.current_user_id)
                 if result.get('code') == 0:
-                    logger.info(f"Browser stopped for profile: {self.current_user_id}")
+                    logger.info("Browser stopped for profile: {}", self.current_user_id)
                 else:
-                    logger.warning(f"Failed to stop browser: {result.get('msg')}")
+                    logger.warning("Failed to stop browser: {}", result.get('msg'))
                 
                 self.current_user_id = None
                 
             except Exception as e:
-                logger.error(f"Failed to stop browser: {e}")
+                logger.error("Failed to stop browser: {}", e)
                 raise
     
     def close(self) -> None:
@@ -411,31 +809,33 @@ class BrowserControllerSync:
                 logger.info("Playwright stopped")
                 
         except Exception as e:
-            logger.error(f"Error during cleanup: {e}")
+            logger.error("Error during cleanup: {}", e)
             raise
     
     def get_page_info(self, page_index: int = 0) -> Dict:
-        """Lấy thông tin trang"""
+        """Lấy thông tin trang (call và get_cookies bên trong đã được đo)"""
         page = self.get_page(page_index)
         
         try:
+            details = self.call("pageInfo", page_index=page_index)
             info = {
                 'url': page.url,
-                'title': page.title(),
+                'title': details['title'],
                 'viewport': page.viewport_size,
-                'user_agent': page.evaluate('navigator.userAgent'),
+                'user_agent': details['userAgent'],
                 'cookies_count': len(self.get_cookies(page_index)),
-                'local_storage_count': len(self.get_local_storage(page_index)),
-                'session_storage_count': len(self.get_session_storage(page_index))
+                'local_storage_count': details['localStorageCount'],
+                'session_storage_count': details['sessionStorageCount']
             }
             
-            logger.info(f"Page info retrieved for page {page_index}")
+            hot_log.log("Page info retrieved for page {}", page_index)
             return info
             
         except Exception as e:
-            logger.error(f"Failed to get page info: {e}")
+            logger.error("Failed to get page info: {}", e)
             raise
     
+    @cdp_call
     def wait_for_network_idle(self, page_index: int = 0, timeout: int = None) -> None:
         """Chờ network idle"""
         page = self.get_page(page_index)
@@ -443,60 +843,65 @@ class BrowserControllerSync:
         
         try:
             page.wait_for_load_state("networkidle", timeout=timeout)
-            logger.info("Network idle state reached")
+            hot_log.log("Network idle state reached")
             
         except Exception as e:
-            logger.error(f"Failed to wait for network idle: {e}")
+            logger.error("Failed to wait for network idle: {}", e)
             raise
     
+    @cdp_call
     def scroll_to_element(self, selector: str, page_index: int = 0) -> None:
         """Scroll đến element"""
         page = self.get_page(page_index)
         
         try:
             page.locator(selector).scroll_into_view_if_needed()
-            logger.info(f"Scrolled to element: {selector}")
+            hot_log.log("Scrolled to element: {}", selector)
             
         except Exception as e:
-            logger.error(f"Failed to scroll to element {selector}: {e}")
+            logger.error("Failed to scroll to element {}: {}", selector, e)
             raise
     
+    @cdp_call
     def hover_element(self, selector: str, page_index: int = 0) -> None:
         """Hover vào element"""
         page = self.get_page(page_index)
         
         try:
             page.hover(selector)
-            logger.info(f"Hovered over element: {selector}")
+            hot_log.log("Hovered over element: {}", selector)
             
         except Exception as e:
-            logger.error(f"Failed to hover over element {selector}: {e}")
+            logger.error("Failed to hover over element {}: {}", selector, e)
             raise
     
+    @cdp_call
     def select_option(self, selector: str, value: str, page_index: int = 0) -> None:
         """Chọn option trong select"""
         page = self.get_page(page_index)
         
         try:
             page.select_option(selector, value)
-            logger.info(f"Selected option {value} in {selector}")
+            hot_log.log("Selected option {} in {}", value, selector)
             
         except Exception as e:
-            logger.error(f"Failed to select option {value} in {selector}: {e}")
+            logger.error("Failed to select option {} in {}: {}", value, selector, e)
             raise
     
+    @cdp_call
     def upload_file(self, selector: str, file_path: str, page_index: int = 0) -> None:
         """Upload file"""
         page = self.get_page(page_index)
         
         try:
             page.set_input_files(selector, file_path)
-            logger.info(f"Uploaded file {file_path} to {selector}")
+            hot_log.log("Uploaded file {} to {}", file_path, selector)
             
         except Exception as e:
-            logger.error(f"Failed to upload file {file_path} to {selector}: {e}")
+            logger.error("Failed to upload file {} to {}: {}", file_path, selector, e)
             raise
     
+    @cdp_call
     def download_file(self, url: str, download_path: str, page_index: int = 0) -> None:
         """Download file"""
         page = self.get_page(page_index)
@@ -506,8 +911,8 @@ class BrowserControllerSync:
                 page.goto(url)
             download = download_info.value
             download.save_as(download_path)
-            logger.info(f"Downloaded file to {download_path}")
+            hot_log.log("Downloaded file to {}", download_path)
             
         except Exception as e:
-            logger.error(f"Failed to download file from {url}: {e}")
+            logger.error("Failed to download file from {}: {}", url, e)
             raise
@@ -0,0 +1,139 @@
+"""
+Browser Reaper - Dừng mọi profile mà process đã khởi động khi process kết thúc
+"""
+import atexit
+import os
+import signal
+import threading
+from collections import deque
+from typing import Dict, List
+from log_utils import logger
+from config import config
+
+# SIGINT đã thành KeyboardInterrupt và vẫn chạy atexit; SIGTERM/SIGHUP mặc định giết
+# process ngay, không chạy atexit
+_SIGNALS = tuple(getattr(signal, name) for name in ("SIGTERM", "SIGHUP") if hasattr(signal, name))
+
+
+class BrowserReaper:
+    """
+    Theo dõi các profile được start_browser trong process và dừng chúng khi thoát
+
+    AdsPowerAPISync tự đăng ký profile khi khởi động thành công và bỏ đăng ký khi dừng.
+    Handler atexit và SIGTERM/SIGHUP được cài ở lần đăng ký đầu tiên (signal chỉ cài được
+    từ main thread).
+    """
+
+    def __init__(self):
+        self._profiles: Dict[str, object] = {}  # profile_id -> AdsPowerAPISync đã khởi động
+        # RLock: handler signal chạy trong main thread, có thể ngay lúc main thread đang giữ lock
+        self._lock = threading.RLock()
+        self._installed = False
+        self._previous_handlers: Dict[int, object] = {}
+
+    def track(self, api, profile_id: str) -> None:
+        """Ghi nhận profile do process này khởi động"""
+        if not config.reap_on_exit:
+            return
+        with self._lock:
+            self._profiles[profile_id] = api
+        self.install()
+
+    def untrack(self, profile_id: str) -> None:
+        """Bỏ theo dõi (profile đã dừng, hoặc cần giữ chạy sau khi process thoát)"""
+        with self._lock:
+            self._profiles.pop(profile_id, None)
+
+    def tracked(self) -> List[str]:
+        with self._lock:
+            return list(self._profiles)
+
+    def install(self) -> None:
+        """
+        Cài handler atexit và SIGTERM/SIGHUP (tự gọi ở lần track đầu tiên)
+
+        Gọi sớm từ main thread khi profile được khởi động trong thread khác, để signal
+        vẫn dừng được browser.
+        """
+        with self._lock:
+            if self._installed:
+                return
+            self._installed = True
+        atexit.register(self.reap)
+        if threading.current_thread() is not threading.main_thread():
+            logger.debug("Browser reaper: signal handlers need the main thread, relying on atexit")
+            return
+        for signum in _SIGNALS:
+            try:
+                self._previous_handlers[signum] = signal.signal(signum, self._on_signal)
+            except (ValueError, OSError) as e:
+                logger.debug("Browser reaper: cannot handle signal {}: {}", signum, e)
+
+    def _on_signal(self, signum, frame) -> None:
+        logger.warning("Received signal {}, stopping {} browsers", signum, len(self._profiles))
+        self.reap()
+        previous = self._previous_handlers.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+            return
+        # Handler mặc định: khôi phục và gửi lại signal để process kết thúc như bình thường
+        signal.signal(signum, signal.SIG_DFL if previous is None else previous)
+        os.kill(os.getpid(), signum)
+
+    def reap(self) -> Dict[str, Dict]:
+        """Dừng đồng thời mọi profile đang được theo dõi"""
+        with self._lock:
+            profiles = dict(self._profiles)
+        if not profiles:
+            return {}
+
+        by_api: Dict[int, tuple] = {}
+        for profile_id, api in profiles.items():
+            by_api.setdefault(id(api), (api, []))[1].append(profile_id)
+
+        logger.info("Stopping {} browsers started by this process", len(profiles))
+        results = {}
+        for api, profile_ids in by_api.values():
+            results.update(_stop_browsers(api, profile_ids))
+        return results
+
+
+def _stop_browsers(api, profile_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Dừng đồng thời bằng thread thường (tối đa config.stop_concurrency)
+
+    Không dùng stop_multiple_browsers: ThreadPoolExecutor từ chối việc mới khi interpreter
+    đang tắt, đúng lúc handler atexit chạy.
+    """
+    pending = deque(profile_ids)
+    results: Dict[str, Dict] = {}
+
+    def stop_pending() -> None:
+        while True:
+            try:
+                profile_id = pending.popleft()
+            except IndexError:
+                return
+            try:
+                results[profile_id] = api.stop_browser(profile_id)
+            except Exception as e:
+                logger.error("Failed to stop browser for profile {}: {}", profile_id, e)
+                results[profile_id] = {"error": str(e)}
+
+    threads = []
+    for number in range(max(1, min(config.stop_concurrency, len(profile_ids)))):
+        thread = threading.Thread(target=stop_pending, name=f"reap-browser-{number}", daemon=True)
+        try:
+            thread.start()
+        except RuntimeError:
+            # Không tạo được thread nữa: dừng tuần tự trong thread hiện tại
+            break
+        threads.append(thread)
+    stop_pending()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# Reaper dùng chung cho cả process
+reaper = BrowserReaper()
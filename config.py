@@ -1,39 +1,50 @@
 """
 Cấu hình cho AdsPower Automation
+
+``config`` là proxy của ``settings.AdsPowerConfig``: pydantic chỉ được import và file
+``.env`` chỉ được đọc ở lần truy cập thuộc tính đầu tiên, nên import các module của
+project không phải trả chi phí đó.
 """
-import os
-from typing import Optional
-try:
-    from pydantic_settings import BaseSettings
-except ImportError:
-    from pydantic import BaseSettings
-
-
-class AdsPowerConfig(BaseSettings):
-    """Cấu hình cho AdsPower API"""
-    
-    # AdsPower Local API settings
-    adspower_api_url: str = "http://127.0.0.1:50325"
-    adspower_api_key: Optional[str] = None
-    
-    # Browser settings
-    browser_timeout: int = 30000  # 30 seconds
-    page_timeout: int = 30000     # 30 seconds
-    navigation_timeout: int = 60000  # 60 seconds
-    
-    # Logging settings
-    log_level: str = "INFO"
-    log_file: str = "adspower_automation.log"
-    
-    # Default browser settings
-    headless: bool = False
-    viewport_width: int = 1920
-    viewport_height: int = 1080
-    
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
+import threading
+from typing import Any
+
+_instance = None
+_lock = threading.Lock()
+
+
+def get_config():
+    """Instance AdsPowerConfig dùng chung (tạo ở lần gọi đầu tiên)"""
+    global _instance
+    if _instance is None:
+        with _lock:
+            if _instance is None:
+                from settings import AdsPowerConfig
+                _instance = AdsPowerConfig()
+    return _instance
+
+
+class LazyConfig:
+    """Proxy chuyển mọi thao tác đọc/ghi thuộc tính tới instance AdsPowerConfig"""
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_config(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_config(), name, value)
+
+    def __repr__(self) -> str:
+        return repr(get_config())
 
 
 # Global config instance
-config = AdsPowerConfig()
+config = LazyConfig()
+
+
+def __getattr__(name: str) -> Any:
+    # Giữ tương thích ``from config import AdsPowerConfig``
+    if name == "AdsPowerConfig":
+        from settings import AdsPowerConfig
+        return AdsPowerConfig
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,7 +5,7 @@ Tích hợp GoDaddy Automation
 from adspower_api_sync import AdsPowerAPISync
 from browser_controller_sync import BrowserControllerSync
 from godaddy_auto import GoDaddyAutomation, create_sample_billing_info, create_sample_payment_info
-from loguru import logger
+from log_utils import logger, setup_logging
 
 
 def demo_basic_usage():
@@ -247,6 +247,8 @@ def demo_godaddy_quick_search():
 
 
 if __name__ == "__main__":
+    setup_logging()
+    
     # Chạy demo cơ bản
     demo_basic_usage()
     
@@ -3,7 +3,8 @@ Demo AdsPower Automation với API v2 - Tính năng mới
 """
 from adspower_api_sync import AdsPowerAPISync
 from browser_controller_sync import BrowserControllerSync
-from loguru import logger
+from health_monitor import BrowserHealthMonitor
+from log_utils import logger, setup_logging
 import time
 from concurrent.futures import ThreadPoolExecutor
 
@@ -34,29 +35,38 @@ def demo_api_v2_features():
     except Exception as e:
         logger.error(f"❌ Lỗi trong demo API v2: {e}")
     finally:
+        # Dừng đồng thời các browser đã khởi động
+        api.stop_multiple_browsers(profiles)
         api.close()
         logger.info("🔚 Đã đóng kết nối API")
 
+def google_search(browser: BrowserControllerSync):
+    """Tìm kiếm trên Google"""
+    # Điều hướng đến Google
+    logger.info("🔍 Điều hướng đến Google...")
+    browser.navigate_to("https://www.google.com")
+    browser.wait_for_load_state("load")
+    
+    # Lấy thông tin trang
+    page_info = browser.get_page_info()
+    logger.info(f"📄 Trang hiện tại: {page_info['title']}")
+    logger.info(f"🔗 URL: {page_info['url']}")
+    
+    # Tìm kiếm
+    logger.info("🔍 Thực hiện tìm kiếm...")
+    browser.fill_input("textarea[name='q']", "AdsPower automation")
+    browser.click_element("input[name='btnK']")
+    browser.wait_for_load_state("networkidle")
+
 def automation_task(profile_id: str,webdriver_url: str, api:AdsPowerAPISync):
     """Tác vụ tự động hóa"""
     with BrowserControllerSync(api) as browser:
         try:
             browser.connect_to_browser(profile_id, webdriver_url)
-            # Điều hướng đến Google
-            logger.info("🔍 Điều hướng đến Google...")
-            browser.navigate_to("https://www.google.com")
-            browser.wait_for_load_state("load")
-            
-            # Lấy thông tin trang
-            page_info = browser.get_page_info()
-            logger.info(f"📄 Trang hiện tại: {page_info['title']}")
-            logger.info(f"🔗 URL: {page_info['url']}")
-            
-            # Tìm kiếm
-            logger.info("🔍 Thực hiện tìm kiếm...")
-            browser.fill_input("textarea[name='q']", "AdsPower automation")
-            browser.click_element("input[name='btnK']")
-            browser.wait_for_load_state("networkidle")
+            # Browser crash/mất kết nối: khởi động lại profile và chạy lại tác vụ
+            monitor = BrowserHealthMonitor(browser)
+            monitor.run(google_search, browser)
+            logger.info(f"🩺 Health: {monitor.stats()}")
         except Exception as e:
             logger.error(f"❌ Lỗi trong demo API v2: {e}")
         finally:
@@ -75,5 +85,6 @@ def create_mutiple_profiles(api:AdsPowerAPISync):
     return results
 
 if __name__ == "__main__":
+    setup_logging()
     # Chạy demo chính
     demo_api_v2_features()
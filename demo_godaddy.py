@@ -4,7 +4,7 @@ Demo GoDaddy Automation - Tự động hóa mua domain
 from adspower_api_sync import AdsPowerAPISync
 from browser_controller_sync import BrowserControllerSync
 from godaddy_auto import GoDaddyAutomation, create_sample_billing_info, create_sample_payment_info
-from loguru import logger
+from log_utils import logger, setup_logging
 
 
 def demo_search_domains():
@@ -291,4 +291,5 @@ def main():
 
 
 if __name__ == "__main__":
+    setup_logging()
     main()
@@ -3,22 +3,107 @@ GoDaddy Automation - Tự động hóa mua domain và quản lý
 """
 import time
 import random
-from typing import Dict, List, Optional, Tuple
-from loguru import logger
+from urllib.parse import quote
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from log_utils import logger
 from browser_controller_sync import BrowserControllerSync
 from adspower_api_sync import AdsPowerAPISync
 from utils import AdsPowerUtils
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
+from metrics import StepTimer, timed_step
+from tab_pool import TabPool
+from lookup_cache import DomainLookupCache, normalize_domain
+from jsonl_io import JsonlWriter, iter_jsonl
+
+
+# Helper JS của GoDaddy, cài một lần cho mỗi context qua script registry của controller
+_SEARCH_RESULTS_SCRIPT = """
+() => {
+    const results = [];
+    
+    // Tìm các element chứa kết quả domain
+    const domainElements = document.querySelectorAll([
+        '.domain-name',
+        '.domain-result',
+        '.search-result',
+        '[data-cy="domain-result"]',
+        '.domain-card'
+    ].join(', '));
+    
+    domainElements.forEach((element, index) => {
+        try {
+            const domainName = element.querySelector('.domain-name, .domain-text, h3, h4')?.textContent?.trim();
+            const priceElement = element.querySelector('.price, .domain-price, .cost, [data-cy="price"]');
+            const price = priceElement?.textContent?.trim();
+            const availability = element.querySelector('.available, .unavailable, .status')?.textContent?.trim();
+            
+            if (domainName) {
+                results.push({
+                    domain: domainName,
+                    price: price || 'N/A',
+                    availability: availability || 'Unknown',
+                    index: index
+                });
+            }
+        } catch (e) {
+            console.log('Error parsing domain element:', e);
+        }
+    });
+    
+    return results;
+}
+"""
+
+_CART_SUMMARY_SCRIPT = """
+() => {
+    const summary = {
+        items: [],
+        total: null,
+        subtotal: null,
+        tax: null
+    };
+    
+    // Lấy danh sách items
+    const items = document.querySelectorAll('.cart-item, .order-item, .domain-item');
+    items.forEach(item => {
+        const name = item.querySelector('.item-name, .domain-name, .product-name')?.textContent?.trim();
+        const price = item.querySelector('.item-price, .domain-price, .product-price')?.textContent?.trim();
+        if (name) {
+            summary.items.push({ name, price });
+        }
+    });
+    
+    // Lấy tổng tiền
+    const totalElement = document.querySelector('.total, .order-total, .cart-total');
+    if (totalElement) {
+        summary.total = totalElement.textContent.trim();
+    }
+    
+    return summary;
+}
+"""
 
 
 class GoDaddyAutomation:
     """Class tự động hóa GoDaddy"""
     
-    def __init__(self, browser_controller: BrowserControllerSync):
+    def __init__(self, browser_controller: BrowserControllerSync, timings_file: Optional[str] = None,
+                 base_url: str = "https://www.godaddy.com/en-ca",
+                 lookup_cache: Optional[DomainLookupCache] = None):
+        """
+        Args:
+            browser_controller: Controller đã kết nối đến trình duyệt
+            timings_file: File JSON lines để ghi nối thời gian từng bước của mỗi flow (tùy chọn)
+            base_url: Trang chủ GoDaddy (đổi sang fixture site local khi test/benchmark)
+            lookup_cache: Cache kết quả tra domain, dùng chung giữa các job/profile (tùy chọn)
+        """
         self.browser = browser_controller
-        self.base_url = "https://www.godaddy.com/en-ca"
+        self.base_url = base_url
+        self.timings_file = timings_file
+        self.lookup_cache = lookup_cache
+        self.browser.register_script("godaddy.searchResults", _SEARCH_RESULTS_SCRIPT)
+        self.browser.register_script("godaddy.cartSummary", _CART_SUMMARY_SCRIPT)
         
+    @timed_step("navigate")
     def navigate_to_godaddy(self) -> None:
         """Điều hướng đến GoDaddy"""
         logger.info("🌐 Điều hướng đến GoDaddy...")
@@ -26,6 +111,7 @@ class GoDaddyAutomation:
         self.browser.wait_for_load_state("load")
         AdsPowerUtils.random_delay(2, 4)
         
+    @timed_step("search")
     def search_domain(self, domain_name: str) -> Dict:
         """Tìm kiếm domain"""
         logger.info(f"🔍 Tìm kiếm domain: {domain_name}")
@@ -85,45 +171,10 @@ class GoDaddyAutomation:
                 "error": str(e)
             }
     
-    def _get_search_results(self) -> List[Dict]:
+    def _get_search_results(self, page_index: int = 0) -> List[Dict]:
         """Lấy kết quả tìm kiếm domain"""
         try:
-            results = self.browser.evaluate_script("""
-                () => {
-                    const results = [];
-                    
-                    // Tìm các element chứa kết quả domain
-                    const domainElements = document.querySelectorAll([
-                        '.domain-name',
-                        '.domain-result',
-                        '.search-result',
-                        '[data-cy="domain-result"]',
-                        '.domain-card'
-                    ].join(', '));
-                    
-                    domainElements.forEach((element, index) => {
-                        try {
-                            const domainName = element.querySelector('.domain-name, .domain-text, h3, h4')?.textContent?.trim();
-                            const priceElement = element.querySelector('.price, .domain-price, .cost, [data-cy="price"]');
-                            const price = priceElement?.textContent?.trim();
-                            const availability = element.querySelector('.available, .unavailable, .status')?.textContent?.trim();
-                            
-                            if (domainName) {
-                                results.push({
-                                    domain: domainName,
-                                    price: price || 'N/A',
-                                    availability: availability || 'Unknown',
-                                    index: index
-                                });
-                            }
-                        } catch (e) {
-                            console.log('Error parsing domain element:', e);
-                        }
-                    });
-                    
-                    return results;
-                }
-            """)
+            results = self.browser.call("godaddy.searchResults", page_index=page_index)
             
             return results if results else []
             
@@ -131,6 +182,78 @@ class GoDaddyAutomation:
             logger.error(f"❌ Lỗi lấy kết quả tìm kiếm: {e}")
             return []
     
+    def _search_url(self, domain_name: str) -> str:
+        """URL trang kết quả tìm kiếm của một domain"""
+        return f"{self.base_url}/domainsearch/find?domainToCheck={quote(domain_name)}"
+    
+    def _submit_search(self, page_index: int, domain_name: str) -> None:
+        """Mở trang kết quả trên tab, chỉ chờ response đầu tiên (commit)"""
+        self.browser.navigate_to(self._search_url(domain_name), page_index=page_index, wait_until="commit")
+        AdsPowerUtils.random_delay(0.2, 0.5)
+    
+    def _collect_search(self, page_index: int, domain_name: str) -> Dict:
+        """Chờ tab tải xong và lấy kết quả tìm kiếm"""
+        self.browser.wait_for_load_state("networkidle", page_index)
+        results = self._get_search_results(page_index)
+        logger.info(f"📊 Tìm thấy {len(results)} kết quả cho domain: {domain_name}")
+        return {
+            "domain": domain_name,
+            "results": results,
+            "status": "success"
+        }
+    
+    def search_domains_parallel(self, domain_list: List[str], tabs: int = 4) -> List[Dict]:
+        """
+        Tìm kiếm nhiều domain song song trên nhiều tab của cùng profile
+        
+        Mỗi tab mở thẳng URL kết quả tìm kiếm; trong lúc chờ tab cũ nhất, các tab còn lại
+        vẫn đang tải. Kết quả giữ nguyên thứ tự của domain_list, cùng dạng với search_domain.
+        Domain có trong lookup_cache (còn hạn) không mở tab.
+        
+        Args:
+            domain_list: Danh sách domain
+            tabs: Số tab dùng đồng thời
+        """
+        def on_error(domain_name: str, error: Exception) -> Dict:
+            return {
+                "domain": domain_name,
+                "results": [],
+                "status": "error",
+                "error": str(error)
+            }
+        
+        def search(misses: List[str]) -> List[Dict]:
+            logger.info(f"🔍 Tìm kiếm {len(misses)} domain trên {tabs} tab...")
+            # Trả các tab phụ về controller sau mỗi lần tra, kể cả khi lỗi
+            with TabPool(self.browser, size=min(tabs, len(misses))) as pool:
+                return pool.map(misses, self._submit_search, self._collect_search, on_error=on_error)
+        
+        timer = StepTimer("search_domains_parallel", tabs=tabs)
+        with timer:
+            with timer.step("search"):
+                results = self._search_with_cache(domain_list, search)
+        self._export_timings(timer)
+        return results
+    
+    def _search_with_cache(self, domain_list: List[str], search) -> List[Dict]:
+        """
+        Lấy kết quả từ lookup_cache trước, chỉ gọi search(misses) cho domain chưa có
+        
+        Kết quả giữ nguyên thứ tự của domain_list; kết quả lấy từ cache có "cached": True.
+        """
+        cached = self.lookup_cache.get_many(domain_list) if self.lookup_cache else {}
+        misses = list(dict.fromkeys(domain for domain in domain_list if domain not in cached))
+        if cached:
+            logger.info(f"💾 {sum(domain in cached for domain in domain_list)}/{len(domain_list)} domain lấy từ cache")
+        
+        fresh = dict(zip(misses, search(misses))) if misses else {}
+        if self.lookup_cache:
+            for domain, result in fresh.items():
+                self.lookup_cache.put(domain, result)
+        
+        return [cached[domain] if domain in cached else fresh[domain] for domain in domain_list]
+    
+    @timed_step("add_to_cart")
     def add_domain_to_cart(self, domain_name: str, duration: str = "1 year") -> bool:
         """Thêm domain vào giỏ hàng"""
         logger.info(f"🛒 Thêm domain {domain_name} vào giỏ hàng...")
@@ -187,6 +310,7 @@ class GoDaddyAutomation:
             logger.error(f"❌ Lỗi thêm domain vào giỏ hàng: {e}")
             return False
     
+    @timed_step("checkout")
     def proceed_to_checkout(self) -> bool:
         """Tiến hành thanh toán"""
         logger.info("💳 Tiến hành thanh toán...")
@@ -219,6 +343,7 @@ class GoDaddyAutomation:
             logger.error(f"❌ Lỗi tiến hành thanh toán: {e}")
             return False
     
+    @timed_step("fill_billing")
     def fill_billing_info(self, billing_info: Dict) -> bool:
         """Điền thông tin thanh toán"""
         logger.info("📝 Điền thông tin thanh toán...")
@@ -261,6 +386,7 @@ class GoDaddyAutomation:
             logger.error(f"❌ Lỗi điền thông tin thanh toán: {e}")
             return False
     
+    @timed_step("fill_payment")
     def fill_payment_info(self, payment_info: Dict) -> bool:
         """Điền thông tin thanh toán"""
         logger.info("💳 Điền thông tin thanh toán...")
@@ -325,34 +451,7 @@ class GoDaddyAutomation:
     def get_cart_summary(self) -> Dict:
         """Lấy thông tin giỏ hàng"""
         try:
-            summary = self.browser.evaluate_script("""
-                () => {
-                    const summary = {
-                        items: [],
-                        total: null,
-                        subtotal: null,
-                        tax: null
-                    };
-                    
-                    // Lấy danh sách items
-                    const items = document.querySelectorAll('.cart-item, .order-item, .domain-item');
-                    items.forEach(item => {
-                        const name = item.querySelector('.item-name, .domain-name, .product-name')?.textContent?.trim();
-                        const price = item.querySelector('.item-price, .domain-price, .product-price')?.textContent?.trim();
-                        if (name) {
-                            summary.items.push({ name, price });
-                        }
-                    });
-                    
-                    // Lấy tổng tiền
-                    const totalElement = document.querySelector('.total, .order-total, .cart-total');
-                    if (totalElement) {
-                        summary.total = totalElement.textContent.trim();
-                    }
-                    
-                    return summary;
-                }
-            """)
+            summary = self.browser.call("godaddy.cartSummary")
             
             return summary
             
@@ -361,7 +460,7 @@ class GoDaddyAutomation:
             return {"items": [], "total": None}
     
     def buy_domain_complete(self, domain_name: str, billing_info: Dict, payment_info: Dict) -> Dict:
-        """Mua domain hoàn chỉnh"""
+        """Mua domain hoàn chỉnh (kèm thời gian từng bước trong result["timings"])"""
         logger.info(f"🚀 Bắt đầu mua domain: {domain_name}")
         
         result = {
@@ -371,6 +470,24 @@ class GoDaddyAutomation:
             "error": None
         }
         
+        timer = StepTimer("buy_domain", domain=domain_name)
+        with timer:
+            self._buy_domain_steps(domain_name, billing_info, payment_info, result)
+        result["timings"] = timer.summary()
+        self._export_timings(timer)
+        return result
+    
+    def _export_timings(self, timer: StepTimer) -> None:
+        """Ghi thời gian từng bước ra file JSON lines nếu được cấu hình"""
+        if not self.timings_file:
+            return
+        try:
+            timer.export_jsonl(self.timings_file)
+        except Exception as e:
+            logger.warning(f"⚠️ Không thể ghi timings vào {self.timings_file}: {e}")
+    
+    def _buy_domain_steps(self, domain_name: str, billing_info: Dict, payment_info: Dict, result: Dict) -> Dict:
+        """Các bước mua domain, cập nhật trực tiếp vào result"""
         try:
             # Bước 1: Điều hướng đến GoDaddy
             self.navigate_to_godaddy()
@@ -426,26 +543,189 @@ class GoDaddyAutomation:
             logger.error(f"❌ Lỗi trong quá trình mua domain: {e}")
             return result
     
+    def buy_domains_batch(self, domain_list: List[str], billing_info: Dict, payment_info: Dict) -> Dict:
+        """
+        Mua nhiều domain trong một giỏ hàng: mỗi domain chỉ tốn một lần tìm kiếm và một
+        click thêm vào giỏ; checkout và điền form chỉ chạy một lần cho cả lô
+
+        Dừng trước bước hoàn tất mua hàng giống buy_domain_complete.
+
+        Returns:
+            Dict gồm kết quả từng domain trong "domains" (status: added/failed/error,
+            kèm timings), giỏ hàng trước checkout và thời gian các bước chung
+        """
+        logger.info(f"🚀 Bắt đầu mua {len(domain_list)} domain trong một giỏ hàng")
+
+        result = {
+            "domains": [],
+            "status": "pending",
+            "steps_completed": [],
+            "cart": None,
+            "error": None
+        }
+
+        timer = StepTimer("buy_domains_batch", domains=len(domain_list))
+        with timer:
+            try:
+                self._buy_domains_batch_steps(domain_list, billing_info, payment_info, result)
+            except Exception as e:
+                result["status"] = "error"
+                result["error"] = str(e)
+                logger.error(f"❌ Lỗi trong quá trình mua domain theo lô: {e}")
+        result["timings"] = timer.summary()
+        self._export_timings(timer)
+        return result
+
+    def _add_domain_from_search(self, domain_name: str) -> Dict:
+        """Mở thẳng trang kết quả của domain rồi thêm vào giỏ hàng"""
+        domain_result = {"domain": domain_name, "status": "pending", "error": None}
+        timer = StepTimer("buy_domains_batch.domain", domain=domain_name)
+        with timer:
+            try:
+                with timer.step("search"):
+                    self._submit_search(0, domain_name)
+                    search_result = self._collect_search(0, domain_name)
+                domain_result["results"] = search_result["results"]
+
+                if self.add_domain_to_cart(domain_name):
+                    domain_result["status"] = "added"
+                else:
+                    domain_result["status"] = "failed"
+                    domain_result["error"] = "Không thể thêm domain vào giỏ hàng"
+            except Exception as e:
+                domain_result["status"] = "error"
+                domain_result["error"] = str(e)
+                logger.error(f"❌ Lỗi thêm domain {domain_name}: {e}")
+        domain_result["timings"] = timer.summary()
+        self._export_timings(timer)
+        return domain_result
+
+    def _buy_domains_batch_steps(self, domain_list: List[str], billing_info: Dict,
+                                 payment_info: Dict, result: Dict) -> Dict:
+        """Các bước mua domain theo lô, cập nhật trực tiếp vào result"""
+        # Bước 1: Điều hướng đến GoDaddy (một lần cho cả lô)
+        self.navigate_to_godaddy()
+        result["steps_completed"].append("navigate_to_godaddy")
+
+        # Bước 2: Tìm kiếm và thêm từng domain vào giỏ hàng
+        for domain in domain_list:
+            result["domains"].append(self._add_domain_from_search(domain))
+            AdsPowerUtils.random_delay(1, 2)
+
+        added = [d["domain"] for d in result["domains"] if d["status"] == "added"]
+        if not added:
+            result["status"] = "error"
+            result["error"] = "Không thêm được domain nào vào giỏ hàng"
+            return result
+        result["steps_completed"].append("add_to_cart")
+        result["cart"] = self.get_cart_summary()
+
+        # Bước 3: Checkout và điền form một lần
+        if not self.proceed_to_checkout():
+            result["status"] = "error"
+            result["error"] = "Không thể tiến hành thanh toán"
+            return result
+        result["steps_completed"].append("proceed_to_checkout")
+
+        if not self.fill_billing_info(billing_info):
+            result["status"] = "error"
+            result["error"] = "Không thể điền thông tin thanh toán"
+            return result
+        result["steps_completed"].append("fill_billing_info")
+
+        if not self.fill_payment_info(payment_info):
+            result["status"] = "error"
+            result["error"] = "Không thể điền thông tin thẻ"
+            return result
+        result["steps_completed"].append("fill_payment_info")
+
+        # Bước 4: Hoàn tất mua hàng (chỉ demo, không thực sự mua)
+        logger.warning("⚠️ Dừng tại bước hoàn tất mua hàng để tránh mua thật")
+        result["status"] = "completed_demo"
+        result["steps_completed"].append("ready_to_purchase")
+
+        logger.success(f"✅ Hoàn thành demo mua {len(added)}/{len(domain_list)} domain")
+        return result
+
     def search_multiple_domains(self, domain_list: List[str]) -> List[Dict]:
-        """Tìm kiếm nhiều domain"""
+        """Tìm kiếm nhiều domain (domain có trong lookup_cache không tra lại)"""
         logger.info(f"🔍 Tìm kiếm {len(domain_list)} domains...")
         
-        results = []
-        for domain in domain_list:
-            logger.info(f"🔍 Tìm kiếm: {domain}")
-            result = self.search_domain(domain)
-            results.append(result)
-            AdsPowerUtils.random_delay(2, 4)  # Delay giữa các lần tìm kiếm
+        def search(misses: List[str]) -> List[Dict]:
+            results = []
+            for domain in misses:
+                logger.info(f"🔍 Tìm kiếm: {domain}")
+                result = self.search_domain(domain)
+                results.append(result)
+                AdsPowerUtils.random_delay(2, 4)  # Delay giữa các lần tìm kiếm
+            return results
+        
+        timer = StepTimer("search_multiple_domains", domains=len(domain_list))
+        with timer:
+            results = self._search_with_cache(domain_list, search)
+        self._export_timings(timer)
         
         return results
     
-    def get_available_domains(self, search_results: List[Dict]) -> List[Dict]:
-        """Lấy danh sách domain có sẵn"""
+    def iter_search_domains(self, domain_list: Iterable[str], checkpoint_file: str) -> Iterator[Dict]:
+        """
+        Tìm kiếm nhiều domain, trả về từng kết quả ngay khi xong (generator)
+        
+        Mỗi kết quả được ghi nối vào checkpoint_file (JSON lines, .gz để nén) trước khi yield. Chạy lại
+        với cùng checkpoint_file sẽ bỏ qua các domain đã tìm thành công, nên danh sách lớn
+        không cần giữ trong bộ nhớ và chạy tiếp được sau khi bị dừng giữa chừng.
+        
+        Args:
+            domain_list: Danh sách (hoặc iterator) domain
+            checkpoint_file: File JSON lines lưu tiến độ
+        """
+        completed = self._load_checkpoint(checkpoint_file)
+        if completed:
+            logger.info(f"♻️ Bỏ qua {len(completed)} domain đã có trong {checkpoint_file}")
+        
+        with JsonlWriter(checkpoint_file, append=True) as checkpoint:
+            for domain in domain_list:
+                key = normalize_domain(domain)
+                if key in completed:
+                    continue
+                
+                result = self.lookup_cache.get(domain) if self.lookup_cache else None
+                if result is None:
+                    result = self.search_domain(domain)
+                    if self.lookup_cache:
+                        self.lookup_cache.put(domain, result)
+                    AdsPowerUtils.random_delay(2, 4)  # Delay giữa các lần tìm kiếm
+                
+                checkpoint.write(result)
+                checkpoint.flush()
+                if result["status"] == "success":
+                    completed.add(key)
+                yield result
+    
+    @staticmethod
+    def _load_checkpoint(checkpoint_file: str) -> Set[str]:
+        """Các domain (đã chuẩn hóa) tìm thành công trong checkpoint_file"""
+        return {normalize_domain(result["domain"]) for result in iter_jsonl(checkpoint_file)
+                if result.get("status") == "success"}
+    
+    def get_available_domains(self, search_results: Optional[List[Dict]] = None,
+                              domain_list: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Lấy danh sách domain có sẵn
+        
+        Args:
+            search_results: Kết quả của search_multiple_domains
+            domain_list: Hoặc danh sách domain cần tra (qua lookup_cache trước)
+        """
+        if search_results is None:
+            search_results = self.search_multiple_domains(domain_list or [])
+        
         available = []
         for result in search_results:
             if result["status"] == "success":
                 for domain_result in result["results"]:
-                    if "available" in domain_result.get("availability", "").lower():
+                    availability = domain_result.get("availability", "").lower()
+                    if "available" in availability and "unavailable" not in availability:
                         available.append(domain_result)
         
         return available
@@ -0,0 +1,412 @@
+"""
+GoDaddy Fixture Site
+Web app local mô phỏng trang search/cart/checkout của GoDaddy để test và benchmark GoDaddyAutomation
+"""
+import argparse
+import hashlib
+import html
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, quote, urlparse
+from log_utils import logger
+
+
+PREFIX = "/en-ca"
+ALTERNATIVE_TLDS = ["com", "net", "org", "co", "io", "ca", "info", "biz", "xyz", "online", "store", "site"]
+
+
+class FixtureSettings:
+    """Cấu hình hành vi của fixture site"""
+
+    def __init__(self, latency_ms: float = 0.0, latency_jitter_ms: float = 0.0,
+                 search_latency_ms: float = 0.0, results_per_search: int = 5,
+                 available_ratio: float = 0.67, client_side_results: bool = False,
+                 page_weight_kb: int = 0):
+        """
+        Args:
+            latency_ms: Độ trễ cố định cho mọi response (ms)
+            latency_jitter_ms: Độ trễ ngẫu nhiên cộng thêm, từ 0 đến giá trị này (ms)
+            search_latency_ms: Độ trễ thêm cho kết quả tìm kiếm (backend tìm kiếm chậm hơn)
+            results_per_search: Số domain-card trả về mỗi lần tìm kiếm
+            available_ratio: Tỷ lệ domain có sẵn (0.0 - 1.0), cố định theo tên domain
+            client_side_results: Render kết quả bằng JavaScript sau một request XHR như
+                GoDaddy thật, thay vì trả sẵn trong HTML
+            page_weight_kb: Thêm nội dung (links, emails, số điện thoại, giá) để trang nặng
+                như trang thật, dùng cho benchmark trích xuất dữ liệu
+        """
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.search_latency_ms = search_latency_ms
+        self.results_per_search = results_per_search
+        self.available_ratio = available_ratio
+        self.client_side_results = client_side_results
+        self.page_weight_kb = page_weight_kb
+
+
+def _digest(domain: str) -> int:
+    return int(hashlib.sha1(domain.encode("utf-8")).hexdigest(), 16)
+
+
+def domain_price(domain: str) -> str:
+    """Giá cố định theo tên domain (deterministic)"""
+    return f"${9 + _digest(domain) % 40}.99"
+
+
+def domain_available(domain: str, available_ratio: float = 0.67) -> bool:
+    """Trạng thái có sẵn cố định theo tên domain"""
+    return (_digest(domain) >> 8) % 1000 < available_ratio * 1000
+
+
+class _FixtureState:
+    """Giỏ hàng theo session cookie"""
+
+    def __init__(self):
+        self.carts: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def cart(self, session_id: str) -> List[str]:
+        with self._lock:
+            return list(self.carts.get(session_id, []))
+
+    def add(self, session_id: str, domain: str) -> None:
+        with self._lock:
+            items = self.carts.setdefault(session_id, [])
+            if domain not in items:
+                items.append(domain)
+
+
+def _page(title: str, body: str, page_weight_kb: int = 0) -> str:
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{html.escape(title)}</title></head>
+<body>
+<header>
+  <a class="logo" href="{PREFIX}">GoDaddy Fixture</a>
+  <a class="cart-link" href="{PREFIX}/cart">Cart</a>
+  <form class="domain-search" action="{PREFIX}/domainsearch/find" method="get">
+    <input type="text" name="searchText" placeholder="Find your domain" autocomplete="off">
+    <button type="submit" data-cy="search-button">Search</button>
+  </form>
+</header>
+<main>{body}</main>
+{_filler(page_weight_kb)}
+</body></html>"""
+
+
+def _filler(page_weight_kb: int) -> str:
+    """Nội dung phụ (footer, promo) để trang có kích thước như trang thật"""
+    if page_weight_kb <= 0:
+        return ""
+    blocks = []
+    size = 0
+    index = 0
+    while size < page_weight_kb * 1024:
+        block = (f'<div class="promo"><a href="{PREFIX}/offers/{index}">Offer {index}</a> '
+                 f'<p>Contact sales{index}@example.com or call (555) {100 + index % 900:03d}-{index % 10000:04d}. '
+                 f'Hosting from ${index % 20 + 1}.99 per month, renews at {index % 50 + 10}.00 USD.</p></div>')
+        blocks.append(block)
+        size += len(block)
+        index += 1
+    return f'<footer class="site-footer">{"".join(blocks)}</footer>'
+
+
+def _search_results(query: str, count: int) -> List[str]:
+    """Domain chính xác + các domain thay thế theo TLD"""
+    query = query.strip().lower()
+    if not query:
+        return []
+    name, _, tld = query.partition(".")
+    results = [query if tld else f"{name}.com"]
+    for alt in ALTERNATIVE_TLDS:
+        candidate = f"{name}.{alt}"
+        if candidate not in results:
+            results.append(candidate)
+        if len(results) >= count:
+            break
+    index = 1
+    while len(results) < count:
+        results.append(f"{name}{index}.com")
+        index += 1
+    return results[:count]
+
+
+def render_home(settings: FixtureSettings) -> str:
+    return _page("Domain Names, Websites, Hosting", "<h1>Find a domain</h1>", settings.page_weight_kb)
+
+
+def search_result_items(query: str, settings: FixtureSettings) -> List[Dict[str, object]]:
+    """Dữ liệu kết quả tìm kiếm (dùng cho cả HTML và API JSON)"""
+    return [
+        {
+            "domain": domain,
+            "price": domain_price(domain),
+            "available": domain_available(domain, settings.available_ratio),
+        }
+        for domain in _search_results(query, settings.results_per_search)
+    ]
+
+
+def _domain_card(item: Dict[str, object]) -> str:
+    domain = html.escape(str(item["domain"]))
+    if item["available"]:
+        status = '<span class="available">Available</span>'
+        button = (f'<form method="post" action="{PREFIX}/cart/add?domain={quote(str(item["domain"]))}">'
+                  f'<button type="submit" class="add-to-cart-button" data-domain="{domain}" '
+                  f'data-cy="add-to-cart">Add to Cart</button></form>')
+    else:
+        status = '<span class="unavailable">Taken</span>'
+        button = ""
+    return (f'<div class="domain-card" data-domain="{domain}">'
+            f'<h3 class="domain-name">{domain}</h3>'
+            f'<span class="price">{item["price"]}</span>{status}{button}</div>')
+
+
+# Render kết quả phía client giống SPA của GoDaddy: trang trả về khung rỗng,
+# sau đó fetch API và chèn domain-card (cùng markup với render phía server)
+_CLIENT_SCRIPT = """<script>
+(function () {
+  const query = %s;
+  const esc = s => String(s).replace(/[&<>"']/g, c => '&#' + c.charCodeAt(0) + ';');
+  fetch('%s/api/search?q=' + encodeURIComponent(query))
+    .then(r => r.json())
+    .then(items => {
+      const container = document.querySelector('.search-results');
+      container.innerHTML = items.map(item => {
+        const button = item.available
+          ? '<form method="post" action="%s/cart/add?domain=' + encodeURIComponent(item.domain) + '">'
+            + '<button type="submit" class="add-to-cart-button" data-domain="' + esc(item.domain) + '" data-cy="add-to-cart">Add to Cart</button></form>'
+          : '';
+        const status = item.available ? '<span class="available">Available</span>' : '<span class="unavailable">Taken</span>';
+        return '<div class="domain-card" data-domain="' + esc(item.domain) + '"><h3 class="domain-name">' + esc(item.domain) + '</h3>'
+          + '<span class="price">' + esc(item.price) + '</span>' + status + button + '</div>';
+      }).join('');
+    });
+})();
+</script>"""
+
+
+def render_search(query: str, settings: FixtureSettings) -> str:
+    if settings.client_side_results:
+        script = _CLIENT_SCRIPT % (json.dumps(query), PREFIX, PREFIX)
+        body = f'<h2>Results for {html.escape(query)}</h2><div class="search-results"></div>{script}'
+    else:
+        cards = "".join(_domain_card(item) for item in search_result_items(query, settings))
+        body = f'<h2>Results for {html.escape(query)}</h2><div class="search-results">{cards}</div>'
+    return _page(f"{query} - Domain Search", body, settings.page_weight_kb)
+
+
+def render_cart(items: List[str], settings: FixtureSettings) -> str:
+    rows = []
+    total = 0.0
+    for domain in items:
+        price = domain_price(domain)
+        total += float(price.lstrip("$"))
+        rows.append(f'<div class="cart-item"><span class="item-name">{html.escape(domain)}</span>'
+                    f'<span class="item-price">{price}</span></div>')
+    body = (f'<h1>Your Cart</h1><div class="cart-items">{"".join(rows)}</div>'
+            f'<div class="order-total">${total:.2f}</div>'
+            f'<a class="checkout-button" data-cy="checkout" href="{PREFIX}/checkout">Continue to Checkout</a>')
+    return _page("Cart", body, settings.page_weight_kb)
+
+
+def render_checkout(items: List[str], settings: FixtureSettings) -> str:
+    months = "".join(f'<option value="{m:02d}">{m:02d}</option>' for m in range(1, 13))
+    months += "".join(f'<option value="{m}">{m}</option>' for m in range(1, 13))
+    years = "".join(f'<option value="{y}">{y}</option>' for y in range(2024, 2040))
+    total = sum(float(domain_price(d).lstrip("$")) for d in items)
+    body = f"""<h1>Checkout</h1>
+<form class="billing-form">
+  <input name="firstName"><input name="lastName"><input name="email" type="email">
+  <input name="phone"><input name="address"><input name="city">
+  <select name="state"><option value="NY">NY</option><option value="CA">CA</option><option value="ON">ON</option></select>
+  <input name="zipCode">
+  <select name="country"><option value="US">US</option><option value="CA">CA</option><option value="VN">VN</option></select>
+</form>
+<form class="payment-form">
+  <input name="cardNumber">
+  <select name="expiryMonth">{months}</select>
+  <select name="expiryYear">{years}</select>
+  <input name="cvv"><input name="cardholderName">
+</form>
+<div class="order-total">${total:.2f}</div>
+<button class="purchase-button" data-cy="complete-purchase" type="button">Complete Purchase</button>"""
+    return _page("Checkout", body, settings.page_weight_kb)
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """HTTP handler của fixture site"""
+
+    server_version = "GoDaddyFixture/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("Fixture {} - {}", self.address_string(), format % args)
+
+    def _session(self) -> Optional[str]:
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "fixture_session":
+                return value
+        return None
+
+    def _delay(self, extra_ms: float = 0.0) -> None:
+        settings = self.server.site.settings
+        delay_ms = settings.latency_ms + extra_ms
+        if settings.latency_jitter_ms:
+            delay_ms += random.uniform(0, settings.latency_jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+    def do_GET(self):
+        site: "GoDaddyFixtureSite" = self.server.site
+        settings = site.settings
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        path = parsed.path.rstrip("/") or "/"
+
+        if path in ("/", PREFIX):
+            self._delay()
+            return self._html(render_home(settings))
+        if path == f"{PREFIX}/domainsearch/find":
+            query = params.get("searchText") or params.get("domainToCheck") or ""
+            # Với client_side_results, độ trễ tìm kiếm nằm ở request API
+            self._delay(0.0 if settings.client_side_results else settings.search_latency_ms)
+            return self._html(render_search(query, settings))
+        if path == f"{PREFIX}/api/search":
+            self._delay(settings.search_latency_ms)
+            return self._json(search_result_items(params.get("q", ""), settings))
+        if path == f"{PREFIX}/cart":
+            self._delay()
+            return self._html(render_cart(site.state.cart(self._session() or ""), settings))
+        if path == f"{PREFIX}/checkout":
+            self._delay()
+            return self._html(render_checkout(site.state.cart(self._session() or ""), settings))
+        self._html(_page("Not found", "<h1>404</h1>"), status=404)
+
+    def do_POST(self):
+        site: "GoDaddyFixtureSite" = self.server.site
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if parsed.path != f"{PREFIX}/cart/add":
+            return self._html(_page("Not found", "<h1>404</h1>"), status=404)
+
+        self._delay()
+        domain = parse_qs(parsed.query).get("domain", [""])[0]
+        session_id = self._session() or uuid.uuid4().hex
+        if domain:
+            site.state.add(session_id, domain)
+        self.send_response(303)
+        self.send_header("Location", f"{PREFIX}/cart")
+        self.send_header("Set-Cookie", f"fixture_session={session_id}; Path=/")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _json(self, payload: object) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _html(self, content: str, status: int = 200) -> None:
+        body = content.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GoDaddyFixtureSite:
+    """
+    Fixture site chạy local
+
+    Ví dụ:
+        with GoDaddyFixtureSite() as site:
+            godaddy = GoDaddyAutomation(browser, base_url=site.base_url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: FixtureSettings = None):
+        self.settings = settings or FixtureSettings()
+        self.state = _FixtureState()
+        self._httpd = ThreadingHTTPServer((host, port), _FixtureHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.site = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """URL dùng cho GoDaddyAutomation(base_url=...)"""
+        return f"{self.url}{PREFIX}"
+
+    def start(self) -> "GoDaddyFixtureSite":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("GoDaddy fixture site listening on {}", self.base_url)
+        return self
+
+    def serve_forever(self) -> None:
+        """Chạy server trên thread hiện tại (dùng cho CLI)"""
+        logger.info("GoDaddy fixture site listening on {}", self.base_url)
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        if self._thread:
+            self._httpd.shutdown()
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GoDaddy fixture site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--search-latency-ms", type=float, default=0.0)
+    parser.add_argument("--results", type=int, default=5, help="Số kết quả mỗi lần tìm kiếm")
+    parser.add_argument("--available-ratio", type=float, default=0.67)
+    parser.add_argument("--client-side", action="store_true", help="Render kết quả tìm kiếm bằng JavaScript")
+    parser.add_argument("--page-weight-kb", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = FixtureSettings(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        search_latency_ms=args.search_latency_ms,
+        results_per_search=args.results,
+        available_ratio=args.available_ratio,
+        client_side_results=args.client_side,
+        page_weight_kb=args.page_weight_kb,
+    )
+    site = GoDaddyFixtureSite(args.host, args.port, settings=settings)
+    try:
+        site.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Fixture site stopped")
+
+
+if __name__ == "__main__":
+    main()
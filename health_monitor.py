@@ -0,0 +1,241 @@
+"""
+Health Monitor - Phát hiện browser crash/mất kết nối CDP, khởi động lại profile và chạy lại job
+"""
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+from log_utils import logger
+from adspower_api_sync import AdsPowerAPISync
+from browser_controller_sync import BrowserControllerSync
+from config import config
+from resilience import BROWSER_NOT_ACTIVE, CDP_DISCONNECTED, CircuitOpenError, classify_error
+
+
+class BrowserRecoveryError(Exception):
+    """Không khôi phục được browser (hết retry budget hoặc breaker của profile đang mở)"""
+
+
+class BrowserHealthMonitor:
+    """
+    Theo dõi browser của một profile và khôi phục khi browser crash hoặc mất kết nối CDP
+
+    Nghe event ``disconnected`` của Playwright và kiểm tra ``get_browser_status``; khi
+    browser hỏng, profile được khởi động lại và controller kết nối lại. Số lần khởi động
+    lại bị giới hạn bởi retry budget (``max_restarts`` lần trong ``restart_window`` giây).
+
+    Sync Playwright chỉ gửi event trong thread đang gọi Playwright, nên monitor chạy
+    cùng thread với controller và phát hiện lỗi ở lời gọi kế tiếp, không có thread riêng.
+    """
+
+    def __init__(self, controller: BrowserControllerSync, profile_id: Optional[str] = None,
+                 max_restarts: int = None, restart_window: float = None,
+                 ready_timeout: int = None, start_options: Optional[Dict] = None):
+        """
+        Args:
+            controller: Controller đã connect_to_browser
+            profile_id: Profile cần theo dõi (mặc định controller.current_user_id)
+            max_restarts: Số lần khởi động lại tối đa trong restart_window
+            restart_window: Cửa sổ (giây) của retry budget
+            ready_timeout: Giây chờ profile Active sau khi khởi động lại
+            start_options: Tham số thêm cho start_browser (headless, window_width...)
+        """
+        self.controller = controller
+        self.adspower_api: AdsPowerAPISync = controller.adspower_api
+        self.profile_id = profile_id or controller.current_user_id
+        self.max_restarts = config.health_max_restarts if max_restarts is None else max_restarts
+        self.restart_window = config.health_restart_window if restart_window is None else restart_window
+        self.ready_timeout = ready_timeout or config.health_ready_timeout
+        self.start_options = start_options or {}
+        self.disconnects_total = 0
+        self.restarts_total = 0
+        self.requeued_total = 0
+        self._disconnected = False
+        self._restarts: Deque[float] = deque()
+        self._watched = None
+
+    def watch(self) -> None:
+        """Đăng ký event disconnected cho browser hiện tại của controller"""
+        browser = self.controller.browser
+        if browser is None or browser is self._watched:
+            return
+        browser.on("disconnected", self._on_disconnected)
+        self._watched = browser
+        self._disconnected = False
+
+    def _on_disconnected(self, _browser) -> None:
+        self._disconnected = True
+        self.disconnects_total += 1
+        logger.warning("Browser for profile {} disconnected", self.profile_id)
+
+    @property
+    def disconnected(self) -> bool:
+        browser = self.controller.browser
+        return self._disconnected or browser is None or not browser.is_connected()
+
+    def check(self) -> bool:
+        """Browser còn kết nối và Local API báo profile đang Active"""
+        if self.disconnected:
+            return False
+        try:
+            status = self.adspower_api.get_browser_status(self.profile_id)
+        except Exception as e:
+            logger.warning("Health check for profile {} failed: {}", self.profile_id, e)
+            return False
+        return status.get("code") == 0 and status.get("data", {}).get("status") == "Active"
+
+    def is_browser_failure(self, error: Exception) -> bool:
+        """Lỗi do browser crash/mất kết nối (job chạy lại được sau khi khôi phục)"""
+        return classify_error(error) in (CDP_DISCONNECTED, BROWSER_NOT_ACTIVE) or self.disconnected
+
+    def budget_left(self) -> int:
+        """Số lần khởi động lại còn lại trong cửa sổ hiện tại"""
+        cutoff = time.monotonic() - self.restart_window
+        while self._restarts and self._restarts[0] < cutoff:
+            self._restarts.popleft()
+        return max(self.max_restarts - len(self._restarts), 0)
+
+    def restart(self, count_budget: bool = True) -> None:
+        """
+        Khởi động lại profile và kết nối lại controller
+
+        Args:
+            count_budget: False cho lần khởi động lại chủ động (ví dụ tái chế vì bộ nhớ):
+                lần đầu không tính vào retry budget, các lần thử lại khi lỗi vẫn tính
+
+        Raises:
+            BrowserRecoveryError: Hết retry budget hoặc breaker của profile đang mở
+        """
+        last_error: Optional[Exception] = None
+        attempt = 0
+        while True:
+            if (count_budget or attempt) and not self.budget_left():
+                raise BrowserRecoveryError(
+                    f"Restart budget exhausted for profile {self.profile_id} "
+                    f"({self.max_restarts} restarts in {self.restart_window:.0f}s)"
+                ) from last_error
+            if count_budget or attempt:
+                self._restarts.append(time.monotonic())
+            attempt += 1
+            try:
+                self._restart_once()
+                self.restarts_total += 1
+                logger.info("Profile {} restarted and reconnected", self.profile_id)
+                return
+            except CircuitOpenError as e:
+                raise BrowserRecoveryError(str(e)) from e
+            except Exception as e:
+                last_error = e
+                delay = self.controller.retry_policy.delay(attempt)
+                logger.warning("Restart of profile {} failed: {}. Retrying in {:.2f}s",
+                               self.profile_id, e, delay)
+                time.sleep(delay)
+
+    def _restart_once(self) -> None:
+        logger.warning("Restarting browser for profile {}", self.profile_id)
+        if self._watched is not None:
+            # Không đếm event disconnected do chính reset_connection gây ra
+            self._watched.remove_listener("disconnected", self._on_disconnected)
+            self._watched = None
+        self.controller.reset_connection()
+
+        status = self.adspower_api.get_browser_status(self.profile_id)
+        if status.get("code") == 0 and status.get("data", {}).get("status") == "Active":
+            # Process còn chạy nhưng CDP không dùng được: dừng hẳn trước khi mở lại
+            self.adspower_api.stop_browser(self.profile_id)
+
+        result = self.adspower_api.start_browser(self.profile_id, **self.start_options)
+        if result.get("code") != 0:
+            raise RuntimeError(f"start_browser failed: {result.get('msg')}")
+        if not self.adspower_api.wait_for_browser_ready(self.profile_id, timeout=self.ready_timeout):
+            raise RuntimeError(f"Browser not active after {self.ready_timeout}s")
+
+        self.controller.connect_to_browser(self.profile_id, result["data"]["ws"]["puppeteer"])
+        self.watch()
+
+    def ensure_healthy(self) -> None:
+        """Khởi động lại nếu browser không còn dùng được"""
+        if not self.check():
+            self.restart()
+
+    def run(self, job: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Chạy job(*args, **kwargs); nếu browser hỏng giữa chừng thì khôi phục và chạy lại job
+
+        Raises:
+            BrowserRecoveryError: Không khôi phục được browser
+        """
+        self.watch()
+        while True:
+            if self._disconnected:
+                self.restart()
+            try:
+                return job(*args, **kwargs)
+            except Exception as e:
+                if not self.is_browser_failure(e):
+                    raise
+                logger.warning("Job interrupted by browser failure on profile {}: {}", self.profile_id, e)
+                self.requeued_total += 1
+                self.restart()
+
+    def run_jobs(self, jobs: Iterable[Any], worker: Callable[[BrowserControllerSync, Any], Any],
+                 on_error: Callable[[Any, Exception], Any] = None,
+                 max_job_attempts: int = 3) -> List[Any]:
+        """
+        Chạy lần lượt các job trên profile, giữ nguyên thứ tự kết quả
+
+        Job đang chạy khi browser hỏng được đưa lại cuối hàng đợi sau khi khôi phục, để
+        một job lỗi lặp lại không chặn các job khác.
+
+        Args:
+            jobs: Danh sách job
+            worker: worker(controller, job) -> kết quả
+            on_error: on_error(job, exception) - kết quả thay thế khi lỗi (mặc định raise)
+            max_job_attempts: Số lần chạy tối đa của một job khi browser hỏng liên tiếp
+        """
+        self.watch()
+        pending: Deque = deque((position, job, 1) for position, job in enumerate(jobs))
+        results: Dict[int, Any] = {}
+
+        while pending:
+            position, job, attempt = pending.popleft()
+            try:
+                if self._disconnected:
+                    self.restart()
+                results[position] = worker(self.controller, job)
+            except BrowserRecoveryError as e:
+                # Không còn browser để chạy: các job còn lại cũng thất bại
+                results[position] = self._handle_error(job, e, on_error)
+                for remaining_position, remaining_job, _ in pending:
+                    results[remaining_position] = self._handle_error(remaining_job, e, on_error)
+                pending.clear()
+            except Exception as e:
+                if not self.is_browser_failure(e) or attempt >= max_job_attempts:
+                    results[position] = self._handle_error(job, e, on_error)
+                    continue
+                logger.warning("Re-queueing job after browser failure on profile {}: {}", self.profile_id, e)
+                self.requeued_total += 1
+                pending.append((position, job, attempt + 1))
+                try:
+                    self.restart()
+                except BrowserRecoveryError as recovery_error:
+                    for remaining_position, remaining_job, _ in pending:
+                        results[remaining_position] = self._handle_error(remaining_job, recovery_error, on_error)
+                    pending.clear()
+
+        return [results[position] for position in sorted(results)]
+
+    @staticmethod
+    def _handle_error(job: Any, error: Exception, on_error: Optional[Callable[[Any, Exception], Any]]) -> Any:
+        if on_error is None:
+            raise error
+        return on_error(job, error)
+
+    def stats(self) -> Dict:
+        """Số lần mất kết nối, khởi động lại, job chạy lại và budget còn lại"""
+        return {
+            "profile_id": self.profile_id,
+            "disconnects_total": self.disconnects_total,
+            "restarts_total": self.restarts_total,
+            "requeued_total": self.requeued_total,
+            "restart_budget_left": self.budget_left(),
+        }
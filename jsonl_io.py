@@ -0,0 +1,218 @@
+"""
+JSON lines I/O - Ghi/đọc dạng stream cho tập kết quả lớn
+
+Hỗ trợ nén gzip (.gz) và zstd (.zst, cần ``zstandard``), dùng ``orjson`` nếu có để
+serialize nhanh hơn. Bộ nhớ không phụ thuộc kích thước file.
+"""
+import gzip
+import io
+import json
+import os
+import re
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from log_utils import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize một bản ghi thành một dòng JSON (bytes, có newline)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str) + b"\n"
+        except TypeError:
+            # orjson không hỗ trợ key khác str, số nguyên quá lớn...
+            pass
+    return (json.dumps(obj, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def loads(line: bytes) -> Any:
+    """Parse một dòng JSON"""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def _compression(path: str) -> Optional[str]:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _open(path: str, mode: str) -> BinaryIO:
+    """Mở file ở chế độ binary ("rb", "wb" hoặc "ab") theo đuôi nén"""
+    compression = _compression(path)
+    if compression == "gzip":
+        return gzip.open(path, mode)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is required for .zst files: pip install zstandard")
+        raw = open(path, mode)
+        if mode == "rb":
+            return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        # Mỗi lần mở để ghi tạo một frame mới; đọc nối các frame lại với nhau
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+    return open(path, mode)
+
+
+def _split_suffix(path: str):
+    """'out/results.jsonl.gz' -> ('out/results', '.jsonl.gz')"""
+    directory, name = os.path.split(path)
+    stem, dot, suffix = name.partition(".")
+    return os.path.join(directory, stem), (dot + suffix) if dot else ""
+
+
+def _rotated(path: str) -> List[Tuple[int, str]]:
+    base, suffix = _split_suffix(path)
+    directory = os.path.dirname(base) or "."
+    if not os.path.isdir(directory):
+        return []
+    pattern = re.compile(re.escape(os.path.basename(base)) + r"\.(\d+)" + re.escape(suffix) + "$")
+    parts = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            parts.append((int(match.group(1)), os.path.join(os.path.dirname(base), name)))
+    return sorted(parts)
+
+
+def rotated_parts(path: str) -> List[str]:
+    """Các file đã rotate của path, theo thứ tự ghi (cũ trước)"""
+    return [part for _, part in _rotated(path)]
+
+
+class JsonlWriter:
+    """
+    Ghi bản ghi JSON lines dạng stream, có append và rotate theo kích thước/số dòng
+
+    Khi rotate, file hiện tại được đổi tên thành ``<tên>.<n><đuôi>`` (n tăng dần) và
+    một file mới được mở tại path; ``iter_jsonl`` đọc lại theo đúng thứ tự ghi.
+    """
+
+    def __init__(self, path: str, append: bool = True, rotate_bytes: Optional[int] = None,
+                 rotate_lines: Optional[int] = None):
+        """
+        Args:
+            path: File đích (.jsonl, .jsonl.gz, .jsonl.zst)
+            append: Ghi nối vào file đã có (False = ghi đè)
+            rotate_bytes: Rotate khi số byte (chưa nén) của file hiện tại vượt ngưỡng
+            rotate_lines: Rotate khi số dòng của file hiện tại vượt ngưỡng
+        """
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.rotate_lines = rotate_lines
+        self.lines_written = 0
+        self._bytes = 0
+        self._lines = 0
+        self._file = self._open_file(append)
+
+    def _open_file(self, append: bool) -> BinaryIO:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        exists = append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        f = _open(self.path, "ab" if append else "wb")
+        if exists and _compression(self.path) is None and not _ends_with_newline(self.path):
+            # Kết thúc dòng bị cắt (process dừng khi đang ghi) để dòng mới không bị dính vào
+            f.write(b"\n")
+        return f
+
+    def write(self, record: Any) -> None:
+        """Ghi một bản ghi"""
+        line = dumps(record)
+        self._file.write(line)
+        self._bytes += len(line)
+        self._lines += 1
+        self.lines_written += 1
+        if ((self.rotate_bytes and self._bytes >= self.rotate_bytes)
+                or (self.rotate_lines and self._lines >= self.rotate_lines)):
+            self.rotate()
+
+    def write_many(self, records: Iterable[Any]) -> int:
+        """Ghi nhiều bản ghi (nhận cả generator), trả về số bản ghi đã ghi"""
+        count = 0
+        for record in records:
+            self.write(record)
+            count += 1
+        return count
+
+    def rotate(self) -> Optional[str]:
+        """Đóng file hiện tại, đổi tên thành phần tiếp theo và mở file mới"""
+        self._file.close()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self._file = self._open_file(append=False)
+            return None
+
+        base, suffix = _split_suffix(self.path)
+        parts = _rotated(self.path)
+        index = parts[-1][0] + 1 if parts else 1
+        target = f"{base}.{index}{suffix}"
+        os.replace(self.path, target)
+        logger.debug("Rotated {} -> {}", self.path, target)
+
+        self._bytes = 0
+        self._lines = 0
+        self._file = self._open_file(append=False)
+        return target
+
+    def flush(self) -> None:
+        """Đẩy dữ liệu xuống file (gzip/zstd: flush tới điểm đọc được)"""
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def iter_jsonl(path: str, include_rotated: bool = True) -> Iterator[Any]:
+    """
+    Đọc từng bản ghi từ file JSON lines (kèm các phần đã rotate)
+
+    Dòng hỏng (ví dụ dòng cuối bị cắt khi process bị dừng) được bỏ qua.
+    """
+    paths = rotated_parts(path) if include_rotated else []
+    if os.path.exists(path):
+        paths.append(path)
+
+    for part in paths:
+        with _open(part, "rb") as raw:
+            reader = io.BufferedReader(raw) if not isinstance(raw, io.BufferedIOBase) else raw
+            try:
+                for line in reader:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield loads(line)
+                    except ValueError:
+                        logger.warning("Skipping malformed line in {}", part)
+            except EOFError:
+                # File nén bị cắt giữa chừng
+                logger.warning("Truncated compressed file: {}", part)
+
+
+def write_jsonl(path: str, records: Iterable[Any], append: bool = False) -> int:
+    """Ghi nhiều bản ghi ra file, trả về số bản ghi"""
+    with JsonlWriter(path, append=append) as writer:
+        return writer.write_many(records)
@@ -0,0 +1,94 @@
+"""
+Logging helpers - Log lazy cho hot path và cắt bớt payload lớn
+"""
+import sys
+from typing import Any, Optional
+from config import config
+
+
+class LazyLogger:
+    """
+    Proxy của ``loguru.logger``, chỉ import loguru ở lần dùng đầu tiên
+
+    Method trả về là method của logger thật nên caller (module/dòng) trong log vẫn đúng.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        from loguru import logger as _logger
+        return getattr(_logger, name)
+
+
+logger = LazyLogger()
+
+
+class Truncated:
+    """
+    Bọc một giá trị để chỉ chuyển thành chuỗi (và cắt bớt) khi log thực sự được ghi
+
+    Dùng làm tham số cho ``logger.info("...{}", Truncated(response.text))``:
+    nếu level bị lọc, ``str()`` không bao giờ được gọi.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: Optional[int] = None):
+        self.value = value
+        self.limit = limit if limit is not None else config.log_max_payload
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else str(self.value)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}...(+{len(text) - self.limit} chars)"
+        return text
+
+    def __format__(self, format_spec: str) -> str:
+        return format(str(self), format_spec)
+
+
+def truncate(value: Any, limit: Optional[int] = None) -> Truncated:
+    """Cắt bớt giá trị khi log (lazy)"""
+    return Truncated(value, limit)
+
+
+class HotPathLogger:
+    """
+    Facade log cho các thao tác lặp lại nhiều lần (click, fill, request...)
+
+    Message dùng ``{}`` placeholder và tham số riêng nên chỉ được format khi level
+    được bật. Level lấy từ ``config.hot_path_log_level``.
+    """
+
+    def __init__(self, level: Optional[str] = None):
+        self._logger = None
+        self.level = level.upper() if level else None
+
+    def set_level(self, level: str) -> None:
+        self.level = level.upper()
+
+    def log(self, message: str, *args: Any) -> None:
+        if self._logger is None:
+            # Tạo ở lần log đầu tiên để import module không phải nạp loguru/config
+            self._logger = logger.opt(depth=1)
+            self.level = self.level or config.hot_path_log_level.upper()
+        self._logger.log(self.level, message, *args)
+
+
+hot_log = HotPathLogger()
+
+
+def setup_logging(level: Optional[str] = None, log_file: Optional[str] = None) -> None:
+    """
+    Cấu hình sink của loguru theo ``config.log_level`` và ``config.log_file``
+
+    Khi level cao hơn ``hot_path_log_level`` (ví dụ INFO so với DEBUG), log của
+    hot path bị loại trước khi format.
+    """
+    level = (level or config.log_level).upper()
+    log_file = log_file if log_file is not None else config.log_file
+
+    logger.remove()
+    logger.add(sys.stderr, level=level)
+    if log_file:
+        logger.add(log_file, level=level, encoding="utf-8")
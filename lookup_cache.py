@@ -0,0 +1,198 @@
+"""
+Lookup Cache - Cache kết quả tra domain trên đĩa (SQLite) với TTL theo trạng thái
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from log_utils import logger
+from config import config
+
+
+def normalize_domain(domain: str) -> str:
+    """Chuẩn hóa domain làm khóa cache: chữ thường, bỏ scheme/www/path, punycode"""
+    value = domain.strip().lower()
+    if "://" in value:
+        value = value.split("://", 1)[1]
+    value = value.split("/", 1)[0].split("?", 1)[0].rstrip(".")
+    if value.startswith("www."):
+        value = value[4:]
+    try:
+        value = value.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    return value
+
+
+def availability_state(search_result: Dict) -> str:
+    """
+    Trạng thái của domain trong một kết quả search_domain
+
+    Returns:
+        "available", "unavailable", "unknown" hoặc "error"
+    """
+    if search_result.get("status") != "success":
+        return "error"
+
+    results = search_result.get("results") or []
+    if not results:
+        return "unknown"
+
+    target = normalize_domain(search_result.get("domain", ""))
+    entry = next((r for r in results if normalize_domain(r.get("domain", "")) == target), results[0])
+    availability = (entry.get("availability") or "").lower()
+    if any(word in availability for word in ("unavailable", "not available", "taken", "registered")):
+        return "unavailable"
+    if "available" in availability:
+        return "available"
+    return "unknown"
+
+
+class DomainLookupCache:
+    """
+    Cache kết quả search_domain theo domain đã chuẩn hóa
+
+    Lưu trong SQLite (chế độ WAL) nên dùng chung được giữa các job và profile. TTL
+    tách theo trạng thái: domain còn trống hết hạn nhanh hơn domain đã có chủ; kết quả
+    lỗi không được cache.
+    """
+
+    def __init__(self, path: str = None, ttl_available: int = None,
+                 ttl_unavailable: int = None, ttl_unknown: int = None):
+        """
+        Args:
+            path: File SQLite (mặc định config.lookup_cache_file, ":memory:" để chỉ giữ trong RAM)
+            ttl_available: TTL (giây) cho domain còn trống
+            ttl_unavailable: TTL (giây) cho domain đã có chủ
+            ttl_unknown: TTL (giây) khi không xác định được trạng thái
+        """
+        self.path = path or config.lookup_cache_file
+        self.ttls = {
+            "available": config.lookup_cache_ttl_available if ttl_available is None else ttl_available,
+            "unavailable": config.lookup_cache_ttl_unavailable if ttl_unavailable is None else ttl_unavailable,
+            "unknown": config.lookup_cache_ttl_unknown if ttl_unknown is None else ttl_unknown,
+        }
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if self.path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS domain_lookups (
+                domain TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                result TEXT NOT NULL,
+                checked_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, domain: str) -> Optional[Dict]:
+        """Kết quả còn hạn của domain (None nếu không có hoặc đã hết hạn)"""
+        return self.get_many([domain]).get(domain)
+
+    def get_many(self, domains: Iterable[str]) -> Dict[str, Dict]:
+        """Tra nhiều domain một lần, trả về dict domain (như truyền vào) -> kết quả"""
+        keys = {}
+        for domain in domains:
+            keys.setdefault(normalize_domain(domain), []).append(domain)
+        if not keys:
+            return {}
+
+        now = time.time()
+        found = {}
+        with self._lock:
+            rows = []
+            key_list = list(keys)
+            # Giới hạn số tham số của SQLite
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT domain, state, result, checked_at FROM domain_lookups "
+                    f"WHERE domain IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now),
+                ).fetchall())
+
+        for key, state, result, checked_at in rows:
+            cached = json.loads(result)
+            for domain in keys[key]:
+                found[domain] = {**cached, "domain": domain, "cached": True,
+                                 "cache_state": state, "checked_at": checked_at}
+
+        hits = sum(len(keys[row[0]]) for row in rows)
+        misses = sum(len(v) for v in keys.values()) - hits
+        with self._lock:
+            # Cache dùng chung giữa các tab/thread: cập nhật bộ đếm trong lock
+            self.hits += hits
+            self.misses += misses
+        return found
+
+    def put(self, domain: str, search_result: Dict) -> bool:
+        """Lưu kết quả search_domain; trả về False nếu kết quả lỗi (không cache)"""
+        state = availability_state(search_result)
+        if state == "error":
+            return False
+
+        now = time.time()
+        stored = {k: v for k, v in search_result.items() if k not in ("cached", "cache_state", "checked_at")}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO domain_lookups (domain, state, result, checked_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (normalize_domain(domain), state, json.dumps(stored, ensure_ascii=False),
+                 now, now + self.ttls[state]),
+            )
+            self._conn.commit()
+        return True
+
+    def invalidate(self, domain: str) -> None:
+        """Xóa cache của một domain"""
+        with self._lock:
+            self._conn.execute("DELETE FROM domain_lookups WHERE domain = ?", (normalize_domain(domain),))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Xóa các bản ghi đã hết hạn, trả về số bản ghi đã xóa"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM domain_lookups WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info("Purged {} expired domain lookups", cursor.rowcount)
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM domain_lookups")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Số hit/miss của instance này và số bản ghi theo trạng thái"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM domain_lookups WHERE expires_at > ? GROUP BY state",
+                (time.time(),),
+            ).fetchall()
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 3) if total else 0.0,
+            "entries": dict(rows),
+        }
+
+    def close(self) -> None:
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,493 @@
+"""
+Metrics - Đo thời gian từng bước và đếm số lần gọi CDP
+"""
+import functools
+import inspect
+import json
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from jsonl_io import JsonlWriter
+
+
+_state = threading.local()
+
+
+def _active_steps() -> List["StepRecord"]:
+    """Danh sách các bước đang chạy trên thread hiện tại"""
+    steps = getattr(_state, "steps", None)
+    if steps is None:
+        steps = _state.steps = []
+    return steps
+
+
+def current_timer() -> Optional["StepTimer"]:
+    """Lấy StepTimer đang được kích hoạt trên thread hiện tại"""
+    return getattr(_state, "timer", None)
+
+
+def record_delay(seconds: float) -> None:
+    """Ghi nhận thời gian delay nhân tạo (random_delay, gõ phím) cho các bước đang chạy"""
+    for step in _active_steps():
+        step.delay_time += seconds
+
+
+def record_cdp_call(count: int = 1) -> None:
+    """Ghi nhận số lần gọi CDP cho các bước đang chạy"""
+    for step in _active_steps():
+        step.cdp_calls += count
+
+
+def cdp_call(func: Callable) -> Callable:
+    """
+    Decorator cho các method của controller gọi tới Playwright/CDP
+
+    Luôn đếm số lần gọi cho StepTimer đang chạy. Nếu instance có ``call_metrics``
+    (CallMetrics) thì đo thêm độ trễ theo method và selector.
+    """
+    params = list(inspect.signature(func).parameters)
+    selector_pos = params.index("selector") if "selector" in params else None
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        record_cdp_call()
+        metrics = getattr(self, "call_metrics", None)
+        if metrics is None:
+            return func(self, *args, **kwargs)
+
+        selector = kwargs.get("selector", "")
+        if not selector and selector_pos is not None and len(args) >= selector_pos:
+            selector = args[selector_pos - 1]
+        start = time.perf_counter()
+        try:
+            result = func(self, *args, **kwargs)
+        except Exception:
+            metrics.observe(func.__name__, selector, time.perf_counter() - start, ok=False)
+            raise
+        metrics.observe(func.__name__, selector, time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile (nearest-rank) trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class _Series:
+    """Số liệu của một cặp (method, label)"""
+
+    __slots__ = ("count", "failures", "total", "max", "samples")
+
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.failures = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+
+
+class CallMetrics:
+    """
+    Thống kê số lần gọi, lỗi và độ trễ (p50/p95/p99) theo method và label
+
+    Percentile được tính trên ``max_samples`` mẫu gần nhất của mỗi series.
+    """
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self, namespace: str = "browser", max_samples: int = 2048):
+        self.namespace = namespace
+        self.max_samples = max_samples
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, label: str, seconds: float, ok: bool = True) -> None:
+        """Ghi nhận một lần gọi"""
+        key = (method, label or "")
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.max_samples)
+            series.count += 1
+            series.total += seconds
+            if seconds > series.max:
+                series.max = seconds
+            if not ok:
+                series.failures += 1
+            series.samples.append(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def state(self) -> Dict[str, Any]:
+        """Trạng thái thô (picklable) để gộp vào CallMetrics ở process khác bằng merge()"""
+        with self._lock:
+            return {
+                "series": {
+                    key: (series.count, series.failures, series.total, series.max, list(series.samples))
+                    for key, series in self._series.items()
+                },
+            }
+
+    def merge(self, state: Dict[str, Any]) -> None:
+        """Cộng dồn trạng thái lấy từ state() của một CallMetrics khác"""
+        with self._lock:
+            for key, (count, failures, total, max_value, samples) in state["series"].items():
+                key = tuple(key)
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = _Series(self.max_samples)
+                series.count += count
+                series.failures += failures
+                series.total += total
+                series.max = max(series.max, max_value)
+                series.samples.extend(samples)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Xuất số liệu dạng dict: {method: {label: {...}}}, thời gian tính bằng giây"""
+        return self._calls_snapshot()
+
+    def _calls_snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            items = [(key, series.count, series.failures, series.total, series.max, list(series.samples))
+                     for key, series in self._series.items()]
+
+        data: Dict[str, Any] = {}
+        for (method, label), count, failures, total, max_value, samples in items:
+            samples.sort()
+            entry = {
+                "count": count,
+                "failures": failures,
+                "total": round(total, 6),
+                "avg": round(total / count, 6) if count else 0.0,
+                "max": round(max_value, 6),
+            }
+            for q in self.QUANTILES:
+                entry[f"p{q}"] = round(percentile(samples, q), 6)
+            data.setdefault(method, {})[label] = entry
+        return data
+
+    def top(self, n: int = 10, by: str = "total") -> List[Dict[str, Any]]:
+        """Các lời gọi tốn nhiều nhất (theo total, count, p95...)"""
+        rows = []
+        for method, labels in self._calls_snapshot().items():
+            for label, entry in labels.items():
+                rows.append({"method": method, "label": label, **entry})
+        rows.sort(key=lambda row: row.get(by, 0), reverse=True)
+        return rows[:n]
+
+    def to_prometheus(self) -> str:
+        """Xuất số liệu theo định dạng text của Prometheus (summary + counter)"""
+        prefix = f"{self.namespace}_call"
+        lines = [
+            f"# HELP {prefix}_seconds Call latency in seconds",
+            f"# TYPE {prefix}_seconds summary",
+        ]
+        failures = []
+        for method, labels in sorted(self._calls_snapshot().items()):
+            for label, entry in sorted(labels.items()):
+                tags = f'method="{method}",label="{_escape_label(label)}"'
+                for q in self.QUANTILES:
+                    lines.append(f'{prefix}_seconds{{{tags},quantile="{q / 100}"}} {entry[f"p{q}"]}')
+                lines.append(f"{prefix}_seconds_sum{{{tags}}} {entry['total']}")
+                lines.append(f"{prefix}_seconds_count{{{tags}}} {entry['count']}")
+                failures.append(f"{prefix}_failures_total{{{tags}}} {entry['failures']}")
+        lines.append(f"# HELP {prefix}_failures_total Failed calls")
+        lines.append(f"# TYPE {prefix}_failures_total counter")
+        lines.extend(failures)
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    """Escape giá trị label theo định dạng Prometheus"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class StepRecord:
+    """Kết quả đo của một bước"""
+
+    __slots__ = ("name", "started_at", "wall_time", "delay_time", "cdp_calls", "status", "error")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.wall_time = 0.0
+        self.delay_time = 0.0
+        self.cdp_calls = 0
+        self.status = "ok"
+        self.error = None
+
+    @property
+    def wait_time(self) -> float:
+        """Thời gian chờ thực (không tính delay nhân tạo)"""
+        return max(self.wall_time - self.delay_time, 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "step": self.name,
+            "started_at": round(self.started_at, 3),
+            "wall_time": round(self.wall_time, 4),
+            "delay_time": round(self.delay_time, 4),
+            "wait_time": round(self.wait_time, 4),
+            "cdp_calls": self.cdp_calls,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class StepTimer:
+    """
+    Đo thời gian từng bước của một flow
+
+    Dùng như context manager cho cả flow (kích hoạt timer trên thread hiện tại),
+    ``step(name)`` cho từng bước, hoặc decorator ``timed_step(name)`` trên method.
+    """
+
+    def __init__(self, flow: str, **labels):
+        self.flow = flow
+        self.labels = labels
+        self.records: List[StepRecord] = []
+        self._top_level: List[StepRecord] = []  # Bước không lồng trong bước khác (tính tổng flow)
+        self._depth = 0
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = current_timer()
+        _state.timer = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _state.timer = self._previous
+        self._previous = None
+
+    def step(self, name: str) -> "_StepContext":
+        """Context manager đo một bước"""
+        return _StepContext(self, name)
+
+    def timed(self, name: str = None) -> Callable:
+        """Decorator đo một hàm như một bước của timer này"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.step(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @property
+    def total_time(self) -> float:
+        return sum(r.wall_time for r in self._top_level)
+
+    def summary(self) -> Dict[str, Any]:
+        """Tổng hợp kết quả đo để gắn vào result dict (tổng flow chỉ tính các bước ngoài cùng)"""
+        return {
+            "flow": self.flow,
+            "total_time": round(self.total_time, 4),
+            "delay_time": round(sum(r.delay_time for r in self._top_level), 4),
+            "cdp_calls": sum(r.cdp_calls for r in self._top_level),
+            "steps": [r.to_dict() for r in self.records],
+        }
+
+    def to_jsonl_lines(self) -> List[str]:
+        """Mỗi bước thành một dòng JSON (kèm flow và labels) để tổng hợp"""
+        return [json.dumps(row, ensure_ascii=False) for row in self.to_records()]
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Mỗi bước thành một dict (kèm flow và labels)"""
+        return [{"flow": self.flow, **self.labels, **record.to_dict()} for record in self.records]
+
+    def export_jsonl(self, filename: str) -> None:
+        """Ghi nối (append) kết quả đo vào file JSON lines (.gz/.zst để nén)"""
+        if not self.records:
+            return
+        with JsonlWriter(filename, append=True) as writer:
+            writer.write_many(self.to_records())
+
+
+class _StepContext:
+    """Context manager cho một bước của StepTimer"""
+
+    def __init__(self, timer: StepTimer, name: str):
+        self.timer = timer
+        self.record = StepRecord(name)
+        self._start = 0.0
+        self._top_level = False
+
+    def __enter__(self) -> StepRecord:
+        self._top_level = self.timer._depth == 0
+        self.timer._depth += 1
+        _active_steps().append(self.record)
+        self._start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.record.wall_time = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.record.status = "error"
+            self.record.error = str(exc_val)
+        steps = _active_steps()
+        if self.record in steps:
+            steps.remove(self.record)
+        self.timer._depth -= 1
+        self.timer.records.append(self.record)
+        if self._top_level:
+            self.timer._top_level.append(self.record)
+        return False
+
+
+def timed_step(name: str = None) -> Callable:
+    """
+    Decorator đo một method như một bước của StepTimer đang kích hoạt
+
+    Không có timer nào được kích hoạt thì gọi hàm bình thường (gần như không tốn chi phí).
+    """
+    def decorator(func):
+        step_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = current_timer()
+            if timer is None:
+                return func(*args, **kwargs)
+            with timer.step(step_name) as record:
+                result = func(*args, **kwargs)
+                # Các bước của GoDaddyAutomation báo lỗi bằng giá trị trả về thay vì raise
+                if result is False or (isinstance(result, dict) and result.get("status") == "error"):
+                    record.status = "failed"
+                return result
+        return wrapper
+    return decorator
+
+
+class _SizeStats:
+    """Thống kê kích thước payload (bytes)"""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, size: int) -> None:
+        self.count += 1
+        self.total += size
+        if size > self.max:
+            self.max = size
+
+    def merge(self, count: int, total: int, max_value: int) -> None:
+        self.count += count
+        self.total += total
+        self.max = max(self.max, max_value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "avg": round(self.total / self.count, 1) if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+class APIMetrics(CallMetrics):
+    """
+    Số liệu cho AdsPower Local API: độ trễ theo endpoint, mã lỗi và kích thước payload
+
+    Mã lỗi gồm lỗi HTTP (``http_<status>``), lỗi kết nối (tên exception) và
+    response có ``code != 0`` của AdsPower (``code_<code>``).
+    """
+
+    def __init__(self, namespace: str = "adspower_api", max_samples: int = 2048):
+        super().__init__(namespace=namespace, max_samples=max_samples)
+        self._errors: Dict[str, Dict[str, int]] = {}
+        self._request_sizes: Dict[str, _SizeStats] = {}
+        self._response_sizes: Dict[str, _SizeStats] = {}
+
+    def observe_request(self, method: str, endpoint: str, seconds: float,
+                        error_code: Optional[str] = None,
+                        request_bytes: int = 0, response_bytes: int = 0) -> None:
+        """Ghi nhận một request đến Local API"""
+        self.observe(method, endpoint, seconds, ok=error_code is None)
+        with self._lock:
+            if error_code is not None:
+                codes = self._errors.setdefault(endpoint, {})
+                codes[error_code] = codes.get(error_code, 0) + 1
+            self._request_sizes.setdefault(endpoint, _SizeStats()).add(request_bytes)
+            self._response_sizes.setdefault(endpoint, _SizeStats()).add(response_bytes)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._errors.clear()
+            self._request_sizes.clear()
+            self._response_sizes.clear()
+
+    def state(self) -> Dict[str, Any]:
+        """Như CallMetrics.state(), thêm mã lỗi và kích thước payload"""
+        state = super().state()
+        with self._lock:
+            state["errors"] = {endpoint: dict(codes) for endpoint, codes in self._errors.items()}
+            state["sizes"] = {
+                endpoint: tuple((stats.count, stats.total, stats.max) for stats in (
+                    self._request_sizes[endpoint], self._response_sizes[endpoint]))
+                for endpoint in self._request_sizes
+            }
+        return state
+
+    def merge(self, state: Dict[str, Any]) -> None:
+        super().merge(state)
+        with self._lock:
+            for endpoint, codes in state.get("errors", {}).items():
+                merged = self._errors.setdefault(endpoint, {})
+                for code, count in codes.items():
+                    merged[code] = merged.get(code, 0) + count
+            for endpoint, (request_size, response_size) in state.get("sizes", {}).items():
+                self._request_sizes.setdefault(endpoint, _SizeStats()).merge(*request_size)
+                self._response_sizes.setdefault(endpoint, _SizeStats()).merge(*response_size)
+
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        """Snapshot rẻ nhất: số request và số lỗi theo endpoint, cộng mọi method (không tính percentile)"""
+        counters: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            for (_, label), series in self._series.items():
+                entry = counters.setdefault(label, {"count": 0, "failures": 0})
+                entry["count"] += series.count
+                entry["failures"] += series.failures
+        return counters
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Xuất toàn bộ số liệu: requests (độ trễ), errors (mã lỗi) và payload (bytes)"""
+        requests_data = self._calls_snapshot()
+        with self._lock:
+            errors = {endpoint: dict(codes) for endpoint, codes in self._errors.items()}
+            payload = {
+                endpoint: {
+                    "request_bytes": self._request_sizes[endpoint].to_dict(),
+                    "response_bytes": self._response_sizes[endpoint].to_dict(),
+                }
+                for endpoint in self._request_sizes
+            }
+        return {"requests": requests_data, "errors": errors, "payload": payload}
+
+    def to_prometheus(self) -> str:
+        """Xuất số liệu theo định dạng text của Prometheus"""
+        lines = [super().to_prometheus().rstrip("\n")]
+        snapshot = self.snapshot()
+        prefix = self.namespace
+        lines.append(f"# HELP {prefix}_errors_total Errors by code")
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for endpoint, codes in sorted(snapshot["errors"].items()):
+            for code, count in sorted(codes.items()):
+                lines.append(f'{prefix}_errors_total{{label="{_escape_label(endpoint)}",code="{code}"}} {count}')
+        for direction in ("request_bytes", "response_bytes"):
+            lines.append(f"# HELP {prefix}_{direction}_total Payload size in bytes")
+            lines.append(f"# TYPE {prefix}_{direction}_total counter")
+            for endpoint, sizes in sorted(snapshot["payload"].items()):
+                lines.append(f'{prefix}_{direction}_total{{label="{_escape_label(endpoint)}"}} {sizes[direction]["total"]}')
+        return "\n".join(lines) + "\n"
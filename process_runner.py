@@ -0,0 +1,484 @@
+"""
+Process Runner - Chia profile cho nhiều worker process để vượt giới hạn của một interpreter
+"""
+import importlib
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+from log_utils import logger, setup_logging
+from config import config, get_config
+from metrics import APIMetrics, CallMetrics
+
+# Playwright (greenlet, thread của driver) không an toàn khi fork
+_START_METHOD = "spawn"
+
+# Message từ worker process về supervisor
+_RESULT = "result"  # (index, ok, value): kết quả hoặc exception của job
+_LOST = "lost"  # (index, error): profile không khôi phục được, job cần chạy ở profile khác
+_PROFILE_DOWN = "profile_down"  # (profile_id, stats, error): thread của profile kết thúc
+_METRICS = "metrics"  # (state): trạng thái metrics cộng dồn của process
+_EXIT = "exit"  # (): process đã dừng xong
+
+Worker = Union[str, Callable[[Any, Any], Any]]
+
+
+def _resolve_worker(worker: Worker) -> Callable[[Any, Any], Any]:
+    """Worker dạng "module:function" hoặc function ở top-level của module"""
+    if isinstance(worker, str):
+        module_name, _, name = worker.partition(":")
+        return getattr(importlib.import_module(module_name), name)
+    return worker
+
+
+def _picklable_error(error: Optional[BaseException]) -> Optional[BaseException]:
+    """Exception gửi được qua pipe (exception không pickle được đổi thành RuntimeError)"""
+    if error is None:
+        return None
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def _config_values() -> Dict[str, Any]:
+    """Cấu hình của supervisor (kể cả giá trị đổi lúc chạy) để áp lại trong worker process"""
+    settings = get_config()
+    return settings.model_dump() if hasattr(settings, "model_dump") else settings.dict()
+
+
+def _launch_profile(api, profile_id: str, start_options: Dict) -> str:
+    """Khởi động profile (hoặc dùng browser đang chạy), trả về ws endpoint"""
+    status = api.get_browser_status(profile_id)
+    if status.get("code") == 0 and status.get("data", {}).get("status") == "Active":
+        return status["data"]["ws"]["puppeteer"]
+    result = api.start_browser(profile_id, **start_options)
+    if result.get("code") != 0:
+        raise RuntimeError(f"start_browser failed: {result.get('msg')}")
+    return result["data"]["ws"]["puppeteer"]
+
+
+def _profile_main(api, profile_id: str, worker: Callable, job_queue, send: Callable[[Tuple], None],
+                  call_metrics: CallMetrics, options: Dict) -> None:
+    """Thread của một profile: Playwright riêng, lấy job từ hàng đợi của process tới khi gặp None"""
+    from browser_controller_sync import BrowserControllerSync
+    from health_monitor import BrowserHealthMonitor, BrowserRecoveryError
+
+    stats = None
+    error: Optional[BaseException] = None
+    try:
+        with BrowserControllerSync(api, call_metrics=call_metrics) as controller:
+            controller.connect_to_browser(profile_id, _launch_profile(api, profile_id, options["start_options"]))
+            monitor = BrowserHealthMonitor(controller, profile_id, start_options=options["start_options"])
+            try:
+                while True:
+                    message = job_queue.get()
+                    if message is None:
+                        break
+                    index, job = message
+                    try:
+                        value = monitor.run(worker, controller, job)
+                    except BrowserRecoveryError as e:
+                        # Profile hỏng hẳn: trả job cho profile khác và dừng thread này
+                        send((_LOST, index, _picklable_error(e)))
+                        error = e
+                        break
+                    except Exception as e:
+                        send((_RESULT, index, False, _picklable_error(e)))
+                        continue
+                    try:
+                        send((_RESULT, index, True, value))
+                    except (pickle.PicklingError, TypeError, AttributeError) as e:
+                        send((_RESULT, index, False, RuntimeError(f"Result of job {index} is not picklable: {e}")))
+            finally:
+                stats = monitor.stats()
+    except Exception as e:
+        logger.error("Profile {} stopped in worker process {}: {}", profile_id, os.getpid(), e)
+        error = error or e
+    send((_PROFILE_DOWN, profile_id, stats, _picklable_error(error)))
+
+
+def _process_main(profile_ids: List[str], worker: Worker, job_queue, connection, options: Dict) -> None:
+    """Entry point của worker process"""
+    # Ctrl+C gửi SIGINT cho cả nhóm process: để supervisor quyết định cách dừng
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name, value in options["config"].items():
+        setattr(config, name, value)
+    setup_logging(level=options["log_level"])
+
+    from adspower_api_sync import AdsPowerAPISync
+    from browser_reaper import reaper
+    if config.reap_on_exit:
+        # Profile được khởi động trong thread phụ: cài handler SIGTERM từ main thread
+        reaper.install()
+
+    worker = _resolve_worker(worker)
+    api = AdsPowerAPISync(api_url=options["api_url"], api_key=options["api_key"])
+    call_metrics = CallMetrics(namespace="browser")
+    lock = threading.Lock()
+
+    def send(message: Tuple) -> None:
+        with lock:
+            connection.send(message)
+
+    def send_metrics() -> None:
+        send((_METRICS, {
+            "api": api.metrics.state(),
+            "calls": call_metrics.state(),
+            "breakers": api.breakers.snapshot(),
+        }))
+
+    stop = threading.Event()
+
+    def report() -> None:
+        while not stop.wait(options["metrics_interval"]):
+            send_metrics()
+
+    threads = [
+        threading.Thread(target=_profile_main, name=f"profile-{profile_id}", daemon=True,
+                         args=(api, profile_id, worker, job_queue, send, call_metrics, options))
+        for profile_id in profile_ids
+    ]
+    for thread in threads:
+        thread.start()
+    threading.Thread(target=report, name="metrics-reporter", daemon=True).start()
+    for thread in threads:
+        thread.join()
+
+    stop.set()
+    send_metrics()
+    api.close()
+    send((_EXIT,))
+    connection.close()
+
+
+class _WorkerProcess:
+    """Một worker process và trạng thái supervisor theo dõi"""
+
+    __slots__ = ("process", "profile_ids", "jobs", "connection", "live", "assigned", "exited")
+
+    def __init__(self, process, profile_ids: List[str], jobs, connection):
+        self.process = process
+        self.profile_ids = profile_ids
+        self.jobs = jobs  # Hàng đợi job riêng: process crash không khóa hàng đợi của process khác
+        self.connection = connection  # Đầu đọc của pipe kết quả, None khi process đã thoát
+        self.live = len(profile_ids)  # Số thread profile còn chạy
+        self.assigned: Set[int] = set()  # Job đã gửi, chưa có kết quả
+        self.exited = False
+
+    @property
+    def free_slots(self) -> int:
+        return self.live - len(self.assigned) if self.connection is not None else 0
+
+
+class ProcessRunner:
+    """
+    Chạy job trên nhiều profile AdsPower, chia profile cho nhiều worker process
+
+    Mỗi worker process nhận một phần profile và chạy một thread cho mỗi profile; mỗi thread
+    có Playwright driver riêng (sync Playwright gắn với thread) và được BrowserHealthMonitor
+    khôi phục khi browser hỏng. JSON, regex và log của các profile vì vậy chia ra nhiều GIL.
+
+    Supervisor (process gọi ``run``) gửi job cho process còn profile rảnh, gom kết quả theo
+    thứ tự job và gộp metrics (APIMetrics, CallMetrics, breaker) mà worker gửi về định kỳ.
+    Job của profile hoặc process không khôi phục được được chạy lại ở profile khác.
+
+    Worker process được tạo bằng ``spawn``: ``worker``, job và kết quả phải picklable
+    (worker là function top-level hoặc chuỗi "module:function"), và script gọi ``run``
+    phải có ``if __name__ == "__main__":``.
+    """
+
+    def __init__(self, profile_ids: Iterable[str], worker: Worker, processes: int = None,
+                 api_url: str = None, api_key: str = None, start_options: Optional[Dict] = None,
+                 max_job_attempts: int = 3, metrics_interval: float = None, shutdown_timeout: float = None,
+                 log_level: str = None):
+        """
+        Args:
+            profile_ids: Các profile được dùng
+            worker: worker(controller, job) -> kết quả; function top-level hoặc "module:function"
+            processes: Số worker process (mặc định config.process_workers, 0 = số CPU)
+            api_url: URL của AdsPower Local API (mặc định config.adspower_api_url)
+            api_key: API key (mặc định config.adspower_api_key)
+            start_options: Tham số thêm cho start_browser (headless, window_width...)
+            max_job_attempts: Số lần chạy tối đa của một job khi profile/process chạy nó hỏng
+            metrics_interval: Giây giữa hai lần worker gửi metrics về
+            shutdown_timeout: Giây chờ worker dừng profile và thoát trước khi terminate
+            log_level: Level log của worker process (mặc định config.log_level)
+        """
+        self.profile_ids = list(dict.fromkeys(profile_ids))
+        if not self.profile_ids:
+            raise ValueError("ProcessRunner needs at least one profile")
+        if not isinstance(worker, str):
+            try:
+                pickle.dumps(worker)
+            except Exception as e:
+                raise ValueError(f"worker must be a module-level function or 'module:function': {e}") from e
+        self.worker = worker
+        processes = processes or config.process_workers or os.cpu_count() or 1
+        self.processes = max(1, min(processes, len(self.profile_ids)))
+        self.api_url = api_url or config.adspower_api_url
+        self.api_key = api_key if api_key is not None else config.adspower_api_key
+        self.start_options = start_options or {}
+        self.max_job_attempts = max_job_attempts
+        self.metrics_interval = config.process_metrics_interval if metrics_interval is None else metrics_interval
+        self.shutdown_timeout = config.process_shutdown_timeout if shutdown_timeout is None else shutdown_timeout
+        self.log_level = log_level
+
+        self.profile_stats: Dict[str, Optional[Dict]] = {}
+        self.jobs_total = 0
+        self.jobs_failed = 0
+        self.requeued_total = 0
+        self.processes_crashed = 0
+        self.elapsed = 0.0
+        self._states: Dict[int, Dict] = {}  # pid -> metrics mới nhất (cộng dồn) của process
+
+    def shards(self) -> List[List[str]]:
+        """Chia profile cho các process (xen kẽ)"""
+        return [self.profile_ids[i::self.processes] for i in range(self.processes)]
+
+    def run(self, jobs: Iterable[Any], on_error: Callable[[Any, Exception], Any] = None) -> List[Any]:
+        """
+        Chạy mọi job và trả về kết quả theo thứ tự job
+
+        Args:
+            jobs: Danh sách job (picklable)
+            on_error: on_error(job, exception) - kết quả thay thế khi lỗi (mặc định raise,
+                các worker process bị dừng ngay)
+        """
+        jobs = list(jobs)
+        context = multiprocessing.get_context(_START_METHOD)
+        options = {
+            "config": _config_values(),
+            "api_url": self.api_url,
+            "api_key": self.api_key,
+            "start_options": self.start_options,
+            "metrics_interval": self.metrics_interval,
+            "log_level": self.log_level,
+        }
+
+        self._states.clear()
+        self.profile_stats.clear()
+        self.jobs_total = len(jobs)
+        self.jobs_failed = self.requeued_total = self.processes_crashed = 0
+        started = time.perf_counter()
+
+        workers: List[_WorkerProcess] = []
+        for number, shard in enumerate(self.shards()):
+            job_queue = context.Queue()
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(target=_process_main, name=f"profile-worker-{number}", daemon=True,
+                                      args=(shard, self.worker, job_queue, writer, options))
+            process.start()
+            # Chỉ worker giữ đầu ghi: supervisor nhận EOF ngay khi process thoát hoặc crash
+            writer.close()
+            workers.append(_WorkerProcess(process, shard, job_queue, reader))
+        logger.info("Started {} worker processes for {} profiles", len(workers), len(self.profile_ids))
+
+        try:
+            results = self._collect(jobs, workers, on_error)
+        except BaseException:
+            self.elapsed = time.perf_counter() - started
+            self._terminate(workers)
+            raise
+        self._shutdown(workers)
+        self.elapsed = time.perf_counter() - started
+        logger.info("Ran {} jobs on {} processes in {:.1f}s ({} failed)",
+                    len(jobs), len(workers), self.elapsed, self.jobs_failed)
+        return [results[index] for index in range(len(jobs))]
+
+    def _collect(self, jobs: List[Any], workers: List[_WorkerProcess],
+                 on_error: Optional[Callable[[Any, Exception], Any]]) -> Dict[int, Any]:
+        results: Dict[int, Any] = {}
+        attempts = [1] * len(jobs)
+        pending: Deque[int] = deque(range(len(jobs)))
+
+        def dispatch() -> None:
+            # Chỉ gửi cho profile đang rảnh: job không nằm chờ trong process có thể crash
+            while pending:
+                worker = max(workers, key=lambda w: w.free_slots)
+                if worker.free_slots <= 0:
+                    return
+                index = pending.popleft()
+                worker.assigned.add(index)
+                worker.jobs.put((index, jobs[index]))
+
+        def fail(index: int, error: BaseException) -> None:
+            self.jobs_failed += 1
+            results[index] = self._handle_error(jobs[index], error, on_error)
+
+        def requeue(index: int, error: BaseException) -> None:
+            if index in results:
+                return
+            if attempts[index] >= self.max_job_attempts:
+                fail(index, error)
+                return
+            attempts[index] += 1
+            self.requeued_total += 1
+            pending.append(index)
+
+        dispatch()
+        while len(results) < len(jobs):
+            if not any(w.live for w in workers if w.connection is not None):
+                error = RuntimeError("No live profiles left to run jobs")
+                for index in range(len(jobs)):
+                    if index not in results:
+                        fail(index, error)
+                break
+
+            by_connection = {w.connection: w for w in workers if w.connection is not None}
+            for connection in wait(list(by_connection), timeout=1.0):
+                worker = by_connection[connection]
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # Process đã thoát: job đã gửi cho nó được chạy lại ở process khác
+                    error = self._process_gone(worker)
+                    for index in sorted(worker.assigned):
+                        requeue(index, error)
+                    worker.assigned.clear()
+                    continue
+
+                kind = message[0]
+                if kind == _RESULT:
+                    _, index, ok, value = message
+                    worker.assigned.discard(index)
+                    if index not in results:
+                        if ok:
+                            results[index] = value
+                        else:
+                            fail(index, value)
+                elif kind == _LOST:
+                    _, index, error = message
+                    worker.assigned.discard(index)
+                    logger.warning("Re-queueing job {} after profile failure: {}", index, error)
+                    requeue(index, error)
+                else:
+                    self._record(worker, message)
+            dispatch()
+        return results
+
+    def _process_gone(self, worker: _WorkerProcess) -> RuntimeError:
+        """Đóng pipe của process đã thoát; đếm crash nếu process không kịp báo _EXIT"""
+        worker.connection.close()
+        worker.connection = None
+        worker.live = 0
+        worker.process.join(timeout=5)
+        error = RuntimeError(f"Worker process {worker.process.pid} exited with code {worker.process.exitcode}")
+        if not worker.exited:
+            self.processes_crashed += 1
+            logger.error("{}", error)
+            if config.reap_on_exit:
+                # Process bị kill không chạy được reaper của nó: supervisor dừng thay
+                self._stop_profiles(worker.profile_ids)
+        return error
+
+    def _stop_profiles(self, profile_ids: List[str]) -> None:
+        from adspower_api_sync import AdsPowerAPISync
+        api = AdsPowerAPISync(api_url=self.api_url, api_key=self.api_key)
+        try:
+            api.stop_multiple_browsers(profile_ids)
+        except Exception as e:
+            logger.error("Failed to stop browsers of crashed worker {}: {}", profile_ids, e)
+        finally:
+            api.close()
+
+    def _record(self, worker: _WorkerProcess, message: Tuple) -> None:
+        """Lưu metrics, thống kê profile và trạng thái thoát gửi về từ worker"""
+        kind = message[0]
+        if kind == _METRICS:
+            self._states[worker.process.pid] = message[1]
+        elif kind == _PROFILE_DOWN:
+            _, profile_id, stats, error = message
+            worker.live = max(worker.live - 1, 0)
+            self.profile_stats[profile_id] = stats
+            if error is not None:
+                logger.error("Profile {} is down: {}", profile_id, error)
+        elif kind == _EXIT:
+            worker.exited = True
+
+    def _shutdown(self, workers: List[_WorkerProcess]) -> None:
+        """Báo mọi thread profile dừng, gom metrics cuối cùng và chờ process thoát"""
+        for worker in workers:
+            if worker.connection is not None:
+                for _ in range(worker.live):
+                    worker.jobs.put(None)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while time.monotonic() < deadline:
+            by_connection = {w.connection: w for w in workers if w.connection is not None}
+            if not by_connection:
+                break
+            for connection in wait(list(by_connection), timeout=max(deadline - time.monotonic(), 0)):
+                worker = by_connection[connection]
+                try:
+                    self._record(worker, connection.recv())
+                except (EOFError, OSError):
+                    self._process_gone(worker)
+        self._terminate(workers)
+
+    def _terminate(self, workers: List[_WorkerProcess]) -> None:
+        """Dừng các process còn chạy (SIGTERM: browser reaper của process dừng profile)"""
+        for worker in workers:
+            worker.jobs.cancel_join_thread()
+            if worker.process.is_alive():
+                logger.warning("Terminating worker process {}", worker.process.pid)
+                worker.process.terminate()
+        for worker in workers:
+            worker.process.join(timeout=self.shutdown_timeout)
+            if worker.connection is not None:
+                worker.connection.close()
+                worker.connection = None
+            worker.jobs.close()
+
+    @staticmethod
+    def _handle_error(job: Any, error: BaseException, on_error: Optional[Callable[[Any, Exception], Any]]) -> Any:
+        if on_error is None:
+            raise error
+        return on_error(job, error)
+
+    # ----- Metrics -----
+
+    def merged_metrics(self) -> Tuple[APIMetrics, CallMetrics]:
+        """Gộp APIMetrics và CallMetrics của mọi worker process (gọi được trong lúc run)"""
+        states = list(self._states.values())
+        size = 2048 * max(len(states), 1)
+        api_metrics = APIMetrics(max_samples=size)
+        call_metrics = CallMetrics(namespace="browser", max_samples=size)
+        for state in states:
+            api_metrics.merge(state["api"])
+            call_metrics.merge(state["calls"])
+        return api_metrics, call_metrics
+
+    def metrics(self) -> Dict:
+        """Số liệu gộp: Local API, lời gọi CDP, breaker theo process và thống kê profile"""
+        api_metrics, call_metrics = self.merged_metrics()
+        return {
+            "api": api_metrics.snapshot(),
+            "calls": call_metrics.snapshot(),
+            "breakers": {str(pid): state["breakers"] for pid, state in list(self._states.items())},
+            "profile_health": dict(self.profile_stats),
+            **self.stats(),
+        }
+
+    def to_prometheus(self) -> str:
+        """Số liệu gộp theo định dạng text của Prometheus"""
+        api_metrics, call_metrics = self.merged_metrics()
+        return api_metrics.to_prometheus() + call_metrics.to_prometheus()
+
+    def stats(self) -> Dict:
+        """Số process, job và thông lượng của lần run gần nhất"""
+        return {
+            "processes": self.processes,
+            "profiles": len(self.profile_ids),
+            "jobs_total": self.jobs_total,
+            "jobs_failed": self.jobs_failed,
+            "requeued_total": self.requeued_total,
+            "processes_crashed": self.processes_crashed,
+            "elapsed_s": round(self.elapsed, 3),
+            "jobs_per_min": round(self.jobs_total * 60 / self.elapsed, 2) if self.elapsed else 0.0,
+        }
@@ -0,0 +1,167 @@
+"""
+Profile Warm-up - Làm nóng HTTP cache / service worker của profile trước khi chạy job
+"""
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from log_utils import logger
+from adspower_api_sync import AdsPowerAPISync
+from browser_controller_sync import BrowserControllerSync
+from config import config
+
+
+class _CacheProbe:
+    """
+    Đếm response lấy từ cache qua sự kiện CDP Network của một trang
+
+    Một request có thể phát cả requestServedFromCache lẫn responseReceived (fromDiskCache),
+    nên mỗi requestId chỉ được phân loại một lần khi tổng hợp.
+    """
+
+    def __init__(self, controller: BrowserControllerSync, page_index: int):
+        page = controller.get_page(page_index)
+        self.session = controller.context.new_cdp_session(page)
+        self._requests: set = set()
+        self._disk_cache: set = set()
+        self._service_worker: set = set()
+        self._served_from_cache: set = set()
+        self.session.on("Network.responseReceived", self._on_response)
+        self.session.on("Network.requestServedFromCache", self._on_served_from_cache)
+        self.session.send("Network.enable")
+
+    def _on_response(self, event: Dict) -> None:
+        request_id = event.get("requestId")
+        response = event.get("response", {})
+        self._requests.add(request_id)
+        if response.get("fromServiceWorker"):
+            self._service_worker.add(request_id)
+        elif response.get("fromDiskCache") or response.get("fromPrefetchCache"):
+            self._disk_cache.add(request_id)
+
+    def _on_served_from_cache(self, event: Dict) -> None:
+        request_id = event.get("requestId")
+        self._requests.add(request_id)
+        self._served_from_cache.add(request_id)
+
+    def result(self) -> Dict:
+        # Memory cache: lấy từ cache nhưng không phải disk cache / service worker
+        memory_cache = self._served_from_cache - self._disk_cache - self._service_worker
+        hits = len(self._disk_cache | self._service_worker | memory_cache)
+        requests = len(self._requests)
+        return {
+            "requests": requests,
+            "disk_cache": len(self._disk_cache),
+            "memory_cache": len(memory_cache),
+            "service_worker": len(self._service_worker),
+            "hit_ratio": round(hits / requests, 3) if requests else 0.0,
+        }
+
+    def detach(self) -> None:
+        try:
+            self.session.detach()
+        except Exception:
+            pass
+
+
+class ProfileWarmer:
+    """
+    Tải trước danh sách URL cho nhiều profile, chạy nền với số luồng giới hạn
+
+    Mỗi profile được làm nóng trong một thread riêng với Playwright riêng (Playwright
+    sync gắn với thread tạo ra nó). Sau lượt tải đầu, mỗi URL được tải lại một lần để
+    kiểm tra response có lấy từ disk cache / service worker hay không.
+    """
+
+    def __init__(self, adspower_api: AdsPowerAPISync, urls: Optional[List[str]] = None,
+                 max_workers: int = None, headless: bool = None, keep_open: bool = False):
+        """
+        Args:
+            adspower_api: Client AdsPower Local API (dùng chung giữa các thread)
+            urls: Danh sách URL cần làm nóng (mặc định config.warmup_urls)
+            max_workers: Số profile làm nóng đồng thời (mặc định config.warmup_concurrency)
+            headless: Chạy ẩn khi profile chưa mở (mặc định config.headless)
+            keep_open: Giữ trình duyệt chạy sau khi làm nóng (profile đang mở sẵn luôn được giữ)
+        """
+        self.adspower_api = adspower_api
+        self.urls = urls if urls is not None else list(config.warmup_urls)
+        self.max_workers = max_workers or config.warmup_concurrency
+        self.headless = config.headless if headless is None else headless
+        self.keep_open = keep_open
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def warm_profile(self, profile_id: str) -> Dict:
+        """Làm nóng một profile (chạy đồng bộ) và trả về số liệu cache hit theo URL"""
+        started = time.perf_counter()
+        result = {"profile_id": profile_id, "status": "success", "urls": []}
+
+        status = self.adspower_api.get_browser_status(profile_id)
+        already_running = status.get("code") == 0 and status.get("data", {}).get("status") == "Active"
+        if already_running:
+            browser_data = status["data"]
+        else:
+            started_browser = self.adspower_api.start_browser(profile_id, headless=self.headless)
+            if started_browser.get("code") != 0:
+                return {**result, "status": "error", "error": started_browser.get("msg")}
+            browser_data = started_browser["data"]
+
+        controller = BrowserControllerSync(self.adspower_api)
+        try:
+            controller.start_playwright()
+            controller.connect_to_browser(profile_id, browser_data["ws"]["puppeteer"], new_context=False)
+            page_index = controller.acquire_page()
+
+            for url in self.urls:
+                try:
+                    controller.navigate_to(url, page_index=page_index, wait_until="load")
+                    probe = _CacheProbe(controller, page_index)
+                    try:
+                        controller.navigate_to(url, page_index=page_index, wait_until="load")
+                        controller.wait_for_network_idle(page_index)
+                    finally:
+                        probe.detach()
+                    result["urls"].append({"url": url, **probe.result()})
+                except Exception as e:
+                    logger.warning("Warm-up failed for {} on profile {}: {}", url, profile_id, e)
+                    result["urls"].append({"url": url, "error": str(e)})
+
+            controller.release_page(page_index)
+        except Exception as e:
+            logger.error("Warm-up failed for profile {}: {}", profile_id, e)
+            result.update(status="error", error=str(e))
+        finally:
+            if already_running or self.keep_open:
+                # Giữ trình duyệt đang chạy, chỉ dừng Playwright
+                controller.current_user_id = None
+            controller.close()
+
+        result["elapsed_s"] = round(time.perf_counter() - started, 3)
+        warmed = [u for u in result["urls"] if "hit_ratio" in u]
+        result["hit_ratio"] = round(sum(u["hit_ratio"] for u in warmed) / len(warmed), 3) if warmed else 0.0
+        logger.info("Profile {} warmed: {} URLs, cache hit ratio {}",
+                    profile_id, len(warmed), result["hit_ratio"])
+        return result
+
+    def warm_in_background(self, profile_ids: List[str]) -> Dict[str, Future]:
+        """Bắt đầu làm nóng các profile ở nền, trả về Future theo profile_id"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="profile-warmup")
+        return {profile_id: self._executor.submit(self.warm_profile, profile_id)
+                for profile_id in profile_ids}
+
+    def warm_profiles(self, profile_ids: List[str]) -> Dict[str, Dict]:
+        """Làm nóng các profile và chờ tất cả hoàn tất"""
+        futures = self.warm_in_background(profile_ids)
+        return {profile_id: future.result() for profile_id, future in futures.items()}
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Dừng thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
@@ -0,0 +1,326 @@
+"""
+Resilience - Phân loại lỗi, retry với exponential backoff + jitter và circuit breaker
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+from log_utils import logger
+from config import config
+
+
+# Các loại lỗi
+THROTTLED = "throttled"                      # Local API giới hạn tốc độ (code -1 "Too many request")
+BROWSER_NOT_ACTIVE = "browser_not_active"    # Profile chưa mở / đã đóng
+CDP_DISCONNECTED = "cdp_disconnected"        # Mất kết nối CDP (browser crash, bị đóng)
+SELECTOR_TIMEOUT = "selector_timeout"        # Playwright timeout khi chờ element/điều hướng
+NETWORK = "network"                          # Không kết nối được Local API
+API_ERROR = "api_error"                      # Local API trả code != 0 vì lý do khác
+OTHER = "other"
+ALL_KINDS = frozenset({THROTTLED, BROWSER_NOT_ACTIVE, CDP_DISCONNECTED, SELECTOR_TIMEOUT, NETWORK, API_ERROR, OTHER})
+
+_THROTTLE_MARKERS = ("too many request", "rate limit")
+_NOT_ACTIVE_MARKERS = ("not open", "not active", "not running", "is not started")
+_DISCONNECT_MARKERS = (
+    "target closed", "target page, context or browser has been closed", "browser has been closed",
+    "connection closed", "websocket", "browser closed", "econnreset", "econnrefused",
+)
+
+
+def classify_error(error: Any) -> str:
+    """
+    Phân loại lỗi từ exception hoặc response dict của Local API
+
+    Returns:
+        Một trong THROTTLED, BROWSER_NOT_ACTIVE, CDP_DISCONNECTED, SELECTOR_TIMEOUT,
+        NETWORK, API_ERROR, OTHER
+    """
+    if isinstance(error, dict):
+        message = str(error.get("msg", "")).lower()
+        if any(marker in message for marker in _THROTTLE_MARKERS):
+            return THROTTLED
+        if any(marker in message for marker in _NOT_ACTIVE_MARKERS):
+            return BROWSER_NOT_ACTIVE
+        return API_ERROR
+
+    message = str(error).lower()
+    name = type(error).__name__
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429 or any(marker in message for marker in _THROTTLE_MARKERS):
+        return THROTTLED
+    # requests: ConnectionError, Timeout, ...; kiểm tra theo module để không phải import requests
+    if type(error).__module__.startswith(("requests", "urllib3")):
+        status = getattr(response, "status_code", None)
+        return API_ERROR if status is not None and 400 <= status < 500 else NETWORK
+    if "net::err_" in message:
+        # Lỗi mạng của trình duyệt khi điều hướng (proxy chết, DNS...)
+        return NETWORK
+    if any(marker in message for marker in _DISCONNECT_MARKERS):
+        return CDP_DISCONNECTED
+    # playwright TimeoutError (không import playwright chỉ để so sánh class)
+    if name == "TimeoutError" and "playwright" in type(error).__module__:
+        return SELECTOR_TIMEOUT
+    if any(marker in message for marker in _NOT_ACTIVE_MARKERS):
+        return BROWSER_NOT_ACTIVE
+    return OTHER
+
+
+class CircuitOpenError(Exception):
+    """Circuit breaker đang mở, lời gọi bị từ chối ngay"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker open for {name} (retry after {retry_after:.1f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một profile hoặc endpoint
+
+    closed -> open sau ``failure_threshold`` lỗi liên tiếp; sau ``recovery_timeout`` giây
+    chuyển sang half_open và cho một lời gọi thử: thành công thì đóng lại, lỗi thì mở tiếp.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = None, recovery_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.breaker_failure_threshold
+        self.recovery_timeout = config.breaker_recovery_timeout if recovery_timeout is None else recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.failures_total = 0
+        self.rejected_total = 0
+        self.opened_total = 0
+        self.last_error_kind: Optional[str] = None
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Có cho phép lời gọi tiếp theo không (đếm lời gọi bị từ chối)"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.rejected_total += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected_total += 1
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def retry_after(self) -> float:
+        """Số giây còn lại trước khi cho lời gọi thử"""
+        return max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker {} closed", self.name)
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, kind: str = OTHER) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self.failures_total += 1
+            self.last_error_kind = kind
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_total += 1
+                    logger.warning("Circuit breaker {} opened after {} failures ({})",
+                                   self.name, self.consecutive_failures, kind)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Trả lại quyền thử của half_open, không đổi trạng thái và bộ đếm"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, kind: str, trip_on: Iterable[str]) -> None:
+        """Ghi nhận một lỗi: chỉ các loại trong trip_on được tính cho breaker"""
+        if kind in trip_on:
+            self.record_failure(kind)
+        else:
+            # Lỗi không do profile/endpoint (ví dụ selector timeout): lời gọi vẫn thất bại nên
+            # không đóng breaker hay reset bộ đếm, chỉ cho lời gọi sau được thử
+            self.release_probe()
+
+    def call(self, func: Callable, *args, trip_on: Iterable[str] = None, **kwargs) -> Any:
+        """
+        Gọi func qua breaker (không retry)
+
+        Raises:
+            CircuitOpenError: Breaker đang mở
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record(classify_error(e), RetryPolicy.DEFAULT_TRIP_ON if trip_on is None else trip_on)
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failures_total": self.failures_total,
+                "rejected_total": self.rejected_total,
+                "opened_total": self.opened_total,
+                "last_error_kind": self.last_error_kind,
+            }
+
+
+class BreakerRegistry:
+    """Tập circuit breaker theo key (``profile:<id>`` hoặc ``endpoint:<path>``)"""
+
+    STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+    def __init__(self, namespace: str = "adspower", failure_threshold: int = None,
+                 recovery_timeout: float = None):
+        self.namespace = namespace
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(key, self.failure_threshold, self.recovery_timeout)
+                self._breakers[key] = breaker
+            return breaker
+
+    def reset(self, key: Optional[str] = None) -> None:
+        """Xóa trạng thái của một breaker (hoặc tất cả)"""
+        with self._lock:
+            if key is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {key: breaker.snapshot() for key, breaker in breakers}
+
+    def to_prometheus(self) -> str:
+        """Trạng thái breaker (0 closed, 1 half_open, 2 open) và các counter theo định dạng Prometheus"""
+        prefix = f"{self.namespace}_breaker"
+        snapshot = self.snapshot()
+        lines = [f"# HELP {prefix}_state Circuit breaker state (0 closed, 1 half_open, 2 open)",
+                 f"# TYPE {prefix}_state gauge"]
+        lines.extend(f'{prefix}_state{{key="{key}"}} {self.STATE_VALUES[entry["state"]]}'
+                     for key, entry in sorted(snapshot.items()))
+        for counter in ("failures_total", "rejected_total", "opened_total"):
+            lines.append(f"# TYPE {prefix}_{counter} counter")
+            lines.extend(f'{prefix}_{counter}{{key="{key}"}} {entry[counter]}'
+                         for key, entry in sorted(snapshot.items()))
+        return "\n".join(lines) + "\n"
+
+
+class RetryPolicy:
+    """
+    Retry với exponential backoff và full jitter, chỉ cho các loại lỗi tạm thời
+
+    Lỗi THROTTLED dùng base delay riêng (dài hơn) vì Local API giới hạn theo giây.
+    """
+
+    DEFAULT_RETRY_ON = frozenset({THROTTLED, NETWORK, CDP_DISCONNECTED})
+    DEFAULT_TRIP_ON = frozenset({BROWSER_NOT_ACTIVE, CDP_DISCONNECTED, NETWORK, API_ERROR})
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None,
+                 multiplier: float = 2.0, throttle_delay: float = None,
+                 retry_on: Iterable[str] = DEFAULT_RETRY_ON, trip_on: Iterable[str] = DEFAULT_TRIP_ON):
+        """
+        Args:
+            max_attempts: Số lần thử tối đa (gồm lần đầu)
+            base_delay: Delay cơ sở (giây), lần thử thứ n chờ ngẫu nhiên trong [0, base * multiplier^(n-1)]
+            max_delay: Delay tối đa
+            multiplier: Hệ số tăng delay
+            throttle_delay: Delay cơ sở khi bị giới hạn tốc độ
+            retry_on: Các loại lỗi được retry
+            trip_on: Các loại lỗi được tính cho circuit breaker
+        """
+        self.max_attempts = max_attempts or config.retry_max_attempts
+        self.base_delay = config.retry_base_delay if base_delay is None else base_delay
+        self.max_delay = config.retry_max_delay if max_delay is None else max_delay
+        self.multiplier = multiplier
+        self.throttle_delay = config.retry_throttle_delay if throttle_delay is None else throttle_delay
+        self.retry_on = frozenset(retry_on)
+        self.trip_on = frozenset(trip_on)
+
+    def delay(self, attempt: int, kind: str = OTHER) -> float:
+        """Delay trước lần thử attempt + 1 (attempt bắt đầu từ 1)"""
+        base = self.throttle_delay if kind == THROTTLED else self.base_delay
+        cap = min(self.max_delay, base * self.multiplier ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    def run(self, func: Callable[[], Any], breaker: Optional[CircuitBreaker] = None,
+            classify_result: Optional[Callable[[Any], Optional[str]]] = None, name: str = "",
+            trip_on: Optional[Iterable[str]] = None, retry_on: Optional[Iterable[str]] = None) -> Any:
+        """
+        Gọi func với retry và circuit breaker
+
+        Args:
+            func: Hàm không tham số cần gọi
+            breaker: Circuit breaker áp dụng (tùy chọn)
+            classify_result: Phân loại kết quả trả về; trả về None nếu thành công
+                (dùng cho API trả lỗi trong body thay vì raise)
+            name: Tên lời gọi để log
+            trip_on: Ghi đè self.trip_on cho lời gọi này
+            retry_on: Ghi đè self.retry_on cho lời gọi này
+
+        Raises:
+            CircuitOpenError: Breaker đang mở
+        """
+        name = name or getattr(func, "__name__", "call")
+        trip_on = self.trip_on if trip_on is None else frozenset(trip_on)
+        retry_on = self.retry_on if retry_on is None else frozenset(retry_on)
+        for attempt in range(1, self.max_attempts + 1):
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(breaker.name, breaker.retry_after())
+
+            try:
+                result = func()
+            except Exception as e:
+                kind = classify_error(e)
+                if breaker is not None:
+                    breaker.record(kind, trip_on)
+                if attempt >= self.max_attempts or kind not in retry_on:
+                    raise
+                delay = self.delay(attempt, kind)
+                logger.warning("{} failed ({}), attempt {}/{}. Retrying in {:.2f}s: {}",
+                               name, kind, attempt, self.max_attempts, delay, e)
+                time.sleep(delay)
+                continue
+
+            kind = classify_result(result) if classify_result else None
+            if kind is None:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+            if breaker is not None:
+                breaker.record(kind, trip_on)
+            if attempt >= self.max_attempts or kind not in retry_on:
+                return result
+            delay = self.delay(attempt, kind)
+            logger.warning("{} returned {}, attempt {}/{}. Retrying in {:.2f}s",
+                           name, kind, attempt, self.max_attempts, delay)
+            time.sleep(delay)
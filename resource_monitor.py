@@ -0,0 +1,251 @@
+"""
+Resource Monitor - Đo bộ nhớ của browser qua CDP và tái chế profile khi vượt ngưỡng
+"""
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from log_utils import hot_log, logger
+from browser_controller_sync import BrowserControllerSync
+from config import config
+from health_monitor import BrowserHealthMonitor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_MB = 1024 * 1024
+_BLANK_URLS = ("", "about:blank", "chrome://newtab/", "chrome://new-tab-page/")
+
+
+def host_memory() -> Dict[str, float]:
+    """Bộ nhớ của máy (MB và % đã dùng), dùng psutil nếu có, không thì đọc /proc/meminfo"""
+    if psutil is not None:
+        memory = psutil.virtual_memory()
+        return {
+            "total_mb": round(memory.total / _MB, 1),
+            "available_mb": round(memory.available / _MB, 1),
+            "used_percent": round(memory.percent, 1),
+        }
+    try:
+        values = {}
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                values[key] = int(rest.split()[0]) * 1024
+        total, available = values["MemTotal"], values["MemAvailable"]
+    except (OSError, KeyError, ValueError, IndexError):
+        return {}
+    return {
+        "total_mb": round(total / _MB, 1),
+        "available_mb": round(available / _MB, 1),
+        "used_percent": round((total - available) / total * 100, 1),
+    }
+
+
+class ResourceMonitor:
+    """
+    Lấy mẫu bộ nhớ của browser đang điều khiển và tái chế profile khi vượt ngưỡng
+
+    Mỗi mẫu gồm ``Performance.getMetrics`` của từng trang (JS heap, DOM nodes, listeners),
+    RSS của các process Chromium (``SystemInfo.getProcessInfo`` + psutil, nếu có) và bộ
+    nhớ của máy. Tái chế = lưu session (URL các tab, cookies), dừng và khởi động lại
+    profile qua BrowserHealthMonitor rồi khôi phục session.
+
+    Chạy cùng thread với controller; gọi ``maybe_recycle()`` giữa các job (hoặc dùng
+    ``run_jobs``), không lấy mẫu từ thread khác.
+    """
+
+    def __init__(self, controller: BrowserControllerSync,
+                 health_monitor: Optional[BrowserHealthMonitor] = None,
+                 sample_interval: float = None, js_heap_mb: float = None, rss_mb: float = None,
+                 host_memory_percent: float = None, min_recycle_interval: float = None):
+        """
+        Args:
+            controller: Controller đã connect_to_browser
+            health_monitor: Monitor dùng để khởi động lại profile (mặc định tạo mới)
+            sample_interval: Giây giữa hai lần lấy mẫu trong maybe_recycle
+            js_heap_mb: Ngưỡng tổng JS heap đã dùng của các trang (0 = tắt)
+            rss_mb: Ngưỡng tổng RSS của các process browser (0 = tắt, cần psutil)
+            host_memory_percent: Ngưỡng % bộ nhớ máy đã dùng (0 = tắt)
+            min_recycle_interval: Giây tối thiểu giữa hai lần tái chế một profile (tính cả từ
+                lúc bắt đầu theo dõi), tránh mọi profile cùng tái chế khi bộ nhớ máy cao
+        """
+        self.controller = controller
+        self.health_monitor = health_monitor or BrowserHealthMonitor(controller)
+        self.sample_interval = config.resource_sample_interval if sample_interval is None else sample_interval
+        self.thresholds = {
+            "js_heap_mb": config.recycle_js_heap_mb if js_heap_mb is None else js_heap_mb,
+            "rss_mb": config.recycle_rss_mb if rss_mb is None else rss_mb,
+            "host_memory_percent": (config.recycle_host_memory_percent
+                                    if host_memory_percent is None else host_memory_percent),
+        }
+        self.min_recycle_interval = (config.recycle_min_interval
+                                     if min_recycle_interval is None else min_recycle_interval)
+        self.last_sample: Optional[Dict] = None
+        self.recycles_total = 0
+        self._last_sample_at = 0.0
+        self._last_recycle_at = time.monotonic()
+        self._sessions: Dict[Any, Any] = {}  # page -> CDP session đã bật Performance
+
+    def _page_session(self, page):
+        session = self._sessions.get(page)
+        if session is None:
+            session = self.controller.context.new_cdp_session(page)
+            session.send("Performance.enable")
+            self._sessions[page] = session
+        return session
+
+    def _page_metrics(self) -> Dict[int, Dict[str, float]]:
+        metrics = {}
+        live_pages = set()
+        for handle, page in list(self.controller.pages.items()):
+            live_pages.add(page)
+            try:
+                result = self._page_session(page).send("Performance.getMetrics")
+            except Exception as e:
+                hot_log.log("Performance.getMetrics failed for page {}: {}", handle, e)
+                self._sessions.pop(page, None)
+                continue
+            values = {entry["name"]: entry["value"] for entry in result.get("metrics", [])}
+            metrics[handle] = {
+                "js_heap_used_mb": round(values.get("JSHeapUsedSize", 0) / _MB, 1),
+                "js_heap_total_mb": round(values.get("JSHeapTotalSize", 0) / _MB, 1),
+                "nodes": int(values.get("Nodes", 0)),
+                "documents": int(values.get("Documents", 0)),
+                "listeners": int(values.get("JSEventListeners", 0)),
+            }
+        # Bỏ session của trang đã đóng
+        for page in [page for page in self._sessions if page not in live_pages]:
+            self._sessions.pop(page, None)
+        return metrics
+
+    def _browser_rss_mb(self) -> Optional[float]:
+        """Tổng RSS (MB) của các process Chromium của browser, None nếu không đo được"""
+        if psutil is None or self.controller.browser is None:
+            return None
+        try:
+            session = self.controller.browser.new_browser_cdp_session()
+            try:
+                processes = session.send("SystemInfo.getProcessInfo").get("processInfo", [])
+            finally:
+                session.detach()
+        except Exception as e:
+            logger.debug("SystemInfo.getProcessInfo failed: {}", e)
+            return None
+
+        total = 0
+        for process in processes:
+            try:
+                total += psutil.Process(process["id"]).memory_info().rss
+            except (psutil.Error, KeyError):
+                continue
+        return round(total / _MB, 1) if total else None
+
+    def sample(self) -> Dict:
+        """Lấy một mẫu bộ nhớ của browser và của máy"""
+        pages = self._page_metrics()
+        self.last_sample = {
+            "timestamp": time.time(),
+            "profile_id": self.health_monitor.profile_id,
+            "js_heap_mb": round(sum(page["js_heap_used_mb"] for page in pages.values()), 1),
+            "rss_mb": self._browser_rss_mb(),
+            "host": host_memory(),
+            "pages": pages,
+        }
+        self._last_sample_at = time.monotonic()
+        return self.last_sample
+
+    def exceeded(self, sample: Dict) -> List[str]:
+        """Các ngưỡng bị vượt trong mẫu"""
+        values = {
+            "js_heap_mb": sample.get("js_heap_mb"),
+            "rss_mb": sample.get("rss_mb"),
+            "host_memory_percent": sample.get("host", {}).get("used_percent"),
+        }
+        return [
+            f"{name}={values[name]} > {limit}"
+            for name, limit in self.thresholds.items()
+            if limit and values[name] is not None and values[name] > limit
+        ]
+
+    def maybe_recycle(self, force_sample: bool = False) -> bool:
+        """
+        Lấy mẫu (nếu đã tới lượt) và tái chế profile khi vượt ngưỡng
+
+        Returns:
+            True nếu profile vừa được tái chế
+        """
+        if not force_sample and time.monotonic() - self._last_sample_at < self.sample_interval:
+            return False
+        reasons = self.exceeded(self.sample())
+        if not reasons:
+            return False
+        if time.monotonic() - self._last_recycle_at < self.min_recycle_interval:
+            logger.info("Profile {} over memory thresholds ({}) but recycled recently",
+                        self.health_monitor.profile_id, ", ".join(reasons))
+            return False
+        logger.warning("Recycling profile {}: {}", self.health_monitor.profile_id, ", ".join(reasons))
+        self.recycle()
+        return True
+
+    def save_session(self) -> Dict:
+        """URL của các tab (theo handle) và cookies của context"""
+        urls = [page.url for _, page in sorted(self.controller.pages.items()) if page.url not in _BLANK_URLS]
+        cookies = []
+        if self.controller.context is not None:
+            try:
+                cookies = self.controller.context.cookies()
+            except Exception as e:
+                logger.warning("Could not save cookies before recycle: {}", e)
+        return {"urls": urls, "cookies": cookies}
+
+    def restore_session(self, session: Dict) -> None:
+        """Mở lại các URL chưa được AdsPower khôi phục và nạp lại cookies"""
+        controller = self.controller
+        controller.get_page(0)
+        if session.get("cookies"):
+            controller.context.add_cookies(session["cookies"])
+
+        open_urls = {page.url for page in controller.pages.values()}
+        blank = [handle for handle, page in sorted(controller.pages.items()) if page.url in _BLANK_URLS]
+        for url in session.get("urls", []):
+            if url in open_urls:
+                continue
+            handle = blank.pop(0) if blank else controller.acquire_page()
+            try:
+                controller.navigate_to(url, page_index=handle, wait_until="domcontentloaded")
+            except Exception as e:
+                logger.warning("Could not restore {} after recycle: {}", url, e)
+
+    def recycle(self) -> None:
+        """
+        Lưu session, khởi động lại profile và khôi phục session
+
+        Raises:
+            BrowserRecoveryError: Không khởi động lại được profile
+        """
+        session = self.save_session()
+        self._sessions.clear()
+        self.health_monitor.restart(count_budget=False)
+        self.restore_session(session)
+        self.recycles_total += 1
+        self._last_recycle_at = time.monotonic()
+        logger.info("Profile {} recycled, restored {} tabs",
+                    self.health_monitor.profile_id, len(session["urls"]))
+
+    def run_jobs(self, jobs: Iterable[Any], worker: Callable[[BrowserControllerSync, Any], Any],
+                 on_error: Callable[[Any, Exception], Any] = None, max_job_attempts: int = 3) -> List[Any]:
+        """Như BrowserHealthMonitor.run_jobs, kiểm tra bộ nhớ (và tái chế) trước mỗi job"""
+        def guarded(controller: BrowserControllerSync, job: Any) -> Any:
+            self.maybe_recycle()
+            return worker(controller, job)
+
+        return self.health_monitor.run_jobs(jobs, guarded, on_error=on_error, max_job_attempts=max_job_attempts)
+
+    def stats(self) -> Dict:
+        """Số lần tái chế, ngưỡng và mẫu gần nhất"""
+        return {
+            "recycles_total": self.recycles_total,
+            "thresholds": dict(self.thresholds),
+            "last_sample": self.last_sample,
+        }
@@ -0,0 +1,94 @@
+"""
+Schema cấu hình cho AdsPower Automation (pydantic)
+
+Không import trực tiếp: dùng ``from config import config`` để schema chỉ được nạp ở lần
+truy cập đầu tiên.
+"""
+from typing import List, Optional
+try:
+    from pydantic_settings import BaseSettings
+except ImportError:
+    from pydantic import BaseSettings
+
+
+class AdsPowerConfig(BaseSettings):
+    """Cấu hình cho AdsPower API"""
+    
+    # AdsPower Local API settings
+    adspower_api_url: str = "http://127.0.0.1:50325"
+    adspower_api_key: Optional[str] = None
+    
+    # Browser settings
+    browser_timeout: int = 30000  # 30 seconds
+    page_timeout: int = 30000     # 30 seconds
+    navigation_timeout: int = 60000  # 60 seconds
+    
+    # Logging settings
+    log_level: str = "INFO"
+    log_file: str = "adspower_automation.log"
+    hot_path_log_level: str = "DEBUG"  # Level cho log của từng thao tác (click, fill, request...)
+    log_max_payload: int = 500  # Số ký tự tối đa khi log payload/response
+    api_log_sample_rate: float = 0.01  # Tỷ lệ request được log body ở mức DEBUG
+    
+    # Automation settings
+    page_pool_max_idle: int = 4  # Số trang đã tái chế giữ lại để dùng cho tác vụ sau
+    delay_scale: float = 1.0  # Hệ số nhân cho random_delay và delay gõ phím (0 = tắt, dùng khi benchmark)
+    
+    # Dừng browser
+    stop_concurrency: int = 8  # Số request stop song song trong stop_multiple_browsers
+    reap_on_exit: bool = True  # Dừng các profile process đã khởi động khi thoát (browser_reaper.py)
+    
+    # Retry và circuit breaker (resilience.py)
+    retry_max_attempts: int = 3  # Số lần thử tối đa cho lỗi tạm thời (gồm lần đầu)
+    retry_base_delay: float = 0.5  # Delay cơ sở (giây) cho exponential backoff
+    retry_max_delay: float = 10.0
+    retry_throttle_delay: float = 1.0  # Delay cơ sở khi Local API báo "Too many request per second"
+    breaker_failure_threshold: int = 5  # Số lỗi liên tiếp để mở circuit breaker
+    breaker_recovery_timeout: float = 60.0  # Giây chờ trước khi cho một lời gọi thử
+    
+    # Health monitor (health_monitor.py)
+    health_max_restarts: int = 3  # Số lần khởi động lại profile tối đa trong health_restart_window
+    health_restart_window: float = 600.0  # Cửa sổ (giây) tính retry budget
+    health_ready_timeout: int = 30  # Giây chờ profile Active sau khi khởi động lại
+    
+    # Resource monitor (resource_monitor.py), 0 = tắt ngưỡng
+    resource_sample_interval: float = 60.0  # Giây giữa hai lần lấy mẫu bộ nhớ
+    recycle_js_heap_mb: float = 1024  # Tổng JS heap đã dùng của các trang
+    recycle_rss_mb: float = 3072  # Tổng RSS các process Chromium của profile (cần psutil)
+    recycle_host_memory_percent: float = 90.0  # % bộ nhớ máy đã dùng
+    recycle_min_interval: float = 300.0  # Giây tối thiểu giữa hai lần tái chế một profile
+    
+    # Standby pool (standby_pool.py)
+    standby_min_size: int = 1  # Số profile sẵn sàng tối thiểu
+    standby_max_size: int = 8  # Số profile sẵn sàng tối đa
+    standby_launch_workers: int = 4  # Số profile khởi động song song ở nền
+    standby_ewma_alpha: float = 0.3  # Hệ số EWMA cho tốc độ thuê và thời gian khởi động
+    
+    # Process runner (process_runner.py)
+    process_workers: int = 0  # Số worker process, 0 = số CPU
+    process_metrics_interval: float = 5.0  # Giây giữa hai lần worker gửi metrics về supervisor
+    process_shutdown_timeout: float = 60.0  # Giây chờ worker dừng profile và thoát trước khi terminate
+    
+    # Domain lookup cache (lookup_cache.py)
+    lookup_cache_file: str = "domain_lookup_cache.sqlite3"
+    lookup_cache_ttl_available: int = 3600  # 1 giờ - domain trống có thể bị đăng ký bất cứ lúc nào
+    lookup_cache_ttl_unavailable: int = 86400  # 24 giờ
+    lookup_cache_ttl_unknown: int = 300  # 5 phút
+    
+    # Warm-up settings (profile_warmup.py)
+    warmup_urls: List[str] = [
+        "https://www.godaddy.com/en-ca",
+        "https://www.godaddy.com/en-ca/domainsearch/find",
+    ]
+    warmup_concurrency: int = 4  # Số profile làm nóng đồng thời
+    
+    # Default browser settings
+    use_new_context: bool = False  # True: tạo context riêng thay vì dùng context mặc định của profile
+    headless: bool = False
+    viewport_width: int = 1920
+    viewport_height: int = 1080
+    
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+
@@ -0,0 +1,351 @@
+"""
+Standby Pool - Giữ sẵn các profile đã khởi động để job không phải chờ start_browser
+"""
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Iterable, List, Optional
+from log_utils import logger
+from adspower_api_sync import AdsPowerAPISync
+from browser_controller_sync import BrowserControllerSync
+from config import config
+from metrics import percentile
+from resilience import RetryPolicy
+
+
+class _Ewma:
+    """Trung bình trượt lũy thừa"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, sample: float) -> float:
+        self.value = sample if self.value is None else self.alpha * sample + (1 - self.alpha) * self.value
+        return self.value
+
+
+class _Ready:
+    """Profile đã khởi động, chờ được thuê"""
+
+    __slots__ = ("profile_id", "ws_url", "ready_at")
+
+    def __init__(self, profile_id: str, ws_url: str):
+        self.profile_id = profile_id
+        self.ws_url = ws_url
+        self.ready_at = time.monotonic()
+
+
+class Lease:
+    """Profile đang được thuê, kèm controller đã kết nối trong thread của người thuê"""
+
+    def __init__(self, pool: "StandbyPool", profile_id: str, ws_url: str,
+                 controller: BrowserControllerSync, wait_seconds: float):
+        self.pool = pool
+        self.profile_id = profile_id
+        self.ws_url = ws_url
+        self.controller = controller
+        self.wait_seconds = wait_seconds
+        self.released = False
+
+    def release(self, healthy: bool = True) -> None:
+        self.pool.release(self, healthy=healthy)
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Lỗi trong job có thể do browser hỏng: không trả profile về pool
+        self.release(healthy=exc_type is None)
+
+
+class StandbyPool:
+    """
+    Pool các profile AdsPower đã start_browser sẵn, được bổ sung ở nền
+
+    Kích thước mục tiêu K theo định luật Little: K = ceil(λ × W) + ``headroom``, với λ là
+    tốc độ thuê (EWMA của khoảng cách giữa hai lần thuê) và W là thời gian khởi động
+    profile (EWMA), giới hạn trong [min_size, max_size].
+
+    Sync Playwright gắn với thread tạo ra nó, nên pool chỉ khởi động profile ở nền; kết
+    nối CDP được tạo khi thuê, trong thread của người thuê, dùng lại một Playwright cho
+    mỗi thread.
+    """
+
+    def __init__(self, adspower_api: AdsPowerAPISync, profile_ids: Iterable[str],
+                 min_size: int = None, max_size: int = None, headroom: int = 1,
+                 launch_workers: int = None, alpha: float = None, start_options: Optional[Dict] = None):
+        """
+        Args:
+            adspower_api: Client AdsPower Local API
+            profile_ids: Các profile pool được phép khởi động
+            min_size: Số profile sẵn sàng tối thiểu
+            max_size: Số profile sẵn sàng tối đa
+            headroom: Số profile dự phòng thêm vào λ × W
+            launch_workers: Số profile khởi động song song ở nền
+            alpha: Hệ số EWMA cho tốc độ thuê và thời gian khởi động
+            start_options: Tham số thêm cho start_browser (headless, window_width...)
+        """
+        self.adspower_api = adspower_api
+        self.min_size = config.standby_min_size if min_size is None else min_size
+        self.max_size = config.standby_max_size if max_size is None else max_size
+        self.headroom = headroom
+        self.start_options = start_options or {}
+        alpha = config.standby_ewma_alpha if alpha is None else alpha
+        self.arrival_interval = _Ewma(alpha)
+        self.launch_latency = _Ewma(alpha)
+
+        self._idle: Deque[str] = deque(dict.fromkeys(profile_ids))  # Chưa khởi động
+        self._ready: Deque[_Ready] = deque()
+        self._launching = 0
+        self._leased: Dict[str, Lease] = {}
+        self._started: set = set()  # Profile do pool khởi động (dừng khi close)
+        self._last_lease_at: Optional[float] = None
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=launch_workers or config.standby_launch_workers,
+                                            thread_name_prefix="standby-launch")
+        self.launch_failures = 0
+        self.leases_total = 0
+        self._failure_streak = 0  # Số lần khởi động lỗi liên tiếp (backoff trước khi thử lại)
+        self._backoff = RetryPolicy()
+
+    # ----- Kích thước -----
+
+    def arrival_rate(self) -> float:
+        """Tốc độ thuê ước lượng (lần/giây)"""
+        interval = self.arrival_interval.value
+        return 1.0 / interval if interval else 0.0
+
+    def target_size(self) -> int:
+        """K = ceil(λ × W) + headroom, giới hạn trong [min_size, max_size]"""
+        rate = self.arrival_rate()
+        latency = self.launch_latency.value or 0.0
+        demand = math.ceil(rate * latency) + self.headroom if rate and latency else self.min_size
+        return max(self.min_size, min(self.max_size, demand))
+
+    # ----- Khởi động ở nền -----
+
+    def start(self) -> "StandbyPool":
+        """Khởi động min_size profile ở nền (không chặn)"""
+        self._refill()
+        return self
+
+    def _refill(self) -> None:
+        """Khởi động thêm/dừng bớt để số profile sẵn sàng + đang khởi động bằng K"""
+        to_stop: List[str] = []
+        with self._cond:
+            if self._closed:
+                return
+            target = self.target_size()
+            while self._idle and len(self._ready) + self._launching < target:
+                profile_id = self._idle.popleft()
+                self._launching += 1
+                self._executor.submit(self._launch, profile_id)
+            # Thừa: dừng profile sẵn sàng lâu nhất
+            while len(self._ready) > target:
+                to_stop.append(self._ready.popleft().profile_id)
+        for profile_id in to_stop:
+            self._submit(self._stop, profile_id)
+
+    def _needs_refill(self) -> bool:
+        """Còn profile chờ khởi động và chưa đủ K (gọi khi giữ _cond)"""
+        return (not self._closed and bool(self._idle)
+                and len(self._ready) + self._launching < self.target_size())
+
+    def _schedule_refill(self, delay: float) -> None:
+        """Gọi _refill sau delay giây (không chặn thread hiện tại)"""
+        timer = threading.Timer(delay, self._refill)
+        timer.daemon = True
+        timer.start()
+
+    def _submit(self, func, *args) -> None:
+        """Chạy ở nền; sau khi pool đóng thì chạy ngay trong thread hiện tại"""
+        try:
+            self._executor.submit(func, *args)
+        except RuntimeError:
+            func(*args)
+
+    def _launch(self, profile_id: str) -> None:
+        start = time.perf_counter()
+        ws_url = None
+        try:
+            status = self.adspower_api.get_browser_status(profile_id)
+            if status.get("code") == 0 and status.get("data", {}).get("status") == "Active":
+                ws_url = status["data"]["ws"]["puppeteer"]
+            else:
+                result = self.adspower_api.start_browser(profile_id, **self.start_options)
+                if result.get("code") != 0:
+                    raise RuntimeError(result.get("msg"))
+                ws_url = result["data"]["ws"]["puppeteer"]
+                with self._cond:
+                    self._started.add(profile_id)
+                    self.launch_latency.update(time.perf_counter() - start)
+        except Exception as e:
+            logger.warning("Standby launch of profile {} failed: {}", profile_id, e)
+
+        with self._cond:
+            self._launching -= 1
+            if ws_url:
+                self._failure_streak = 0
+            else:
+                self.launch_failures += 1
+                self._failure_streak += 1
+            if ws_url and not self._closed:
+                self._ready.append(_Ready(profile_id, ws_url))
+                logger.debug("Profile {} ready in standby pool", profile_id)
+            else:
+                # Đưa về cuối hàng đợi, thử lại sau các profile khác
+                self._idle.append(profile_id)
+            self._cond.notify_all()
+            retry = not ws_url and self._needs_refill()
+            streak = self._failure_streak
+        if retry:
+            # Thử lại sau backoff để profile lỗi không bị khởi động liên tục
+            self._schedule_refill(self._backoff.delay(streak))
+
+    def _stop(self, profile_id: str) -> None:
+        try:
+            self.adspower_api.stop_browser(profile_id)
+        except Exception as e:
+            logger.warning("Failed to stop standby profile {}: {}", profile_id, e)
+        with self._cond:
+            self._started.discard(profile_id)
+            if not self._closed:
+                self._idle.append(profile_id)
+            refill = self._needs_refill()
+        if refill:
+            self._refill()
+
+    # ----- Thuê / trả -----
+
+    def _thread_playwright(self):
+        playwright = getattr(self._local, "playwright", None)
+        if playwright is None:
+            from playwright.sync_api import sync_playwright
+            playwright = sync_playwright().start()
+            self._local.playwright = playwright
+        return playwright
+
+    def lease(self, timeout: Optional[float] = None) -> Lease:
+        """
+        Thuê một profile sẵn sàng và kết nối CDP trong thread hiện tại
+
+        Raises:
+            TimeoutError: Không có profile sẵn sàng trong timeout giây
+        """
+        requested = time.monotonic()
+        with self._cond:
+            if self._last_lease_at is not None:
+                self.arrival_interval.update(requested - self._last_lease_at)
+            self._last_lease_at = requested
+        self._refill()
+
+        with self._cond:
+            deadline = None if timeout is None else requested + timeout
+            while not self._ready:
+                if self._closed:
+                    raise RuntimeError("Standby pool is closed")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No standby profile ready within {timeout}s")
+                self._cond.wait(remaining)
+            ready = self._ready.popleft()
+
+        controller = BrowserControllerSync(self.adspower_api)
+        controller.playwright = self._thread_playwright()
+        try:
+            controller.connect_to_browser(ready.profile_id, ready.ws_url)
+        except Exception:
+            self._submit(self._stop, ready.profile_id)
+            self._refill()
+            raise
+
+        wait = time.monotonic() - requested
+        lease = Lease(self, ready.profile_id, ready.ws_url, controller, wait)
+        with self._cond:
+            self._leased[ready.profile_id] = lease
+            self._waits.append(wait)
+            self.leases_total += 1
+        self._refill()
+        return lease
+
+    def release(self, lease: Lease, healthy: bool = True) -> None:
+        """
+        Trả profile: ngắt CDP (browser vẫn chạy) và đưa lại vào pool, hoặc dừng nếu không healthy
+        """
+        if lease.released:
+            return
+        lease.released = True
+        try:
+            lease.controller.reset_connection()
+        except Exception as e:
+            logger.warning("Error disconnecting leased profile {}: {}", lease.profile_id, e)
+            healthy = False
+
+        with self._cond:
+            self._leased.pop(lease.profile_id, None)
+            if healthy and not self._closed:
+                self._ready.append(_Ready(lease.profile_id, lease.ws_url))
+                self._cond.notify_all()
+        if not healthy:
+            self._submit(self._stop, lease.profile_id)
+        self._refill()
+
+    # ----- Trạng thái / đóng -----
+
+    def stats(self) -> Dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "ready": len(self._ready),
+                "launching": self._launching,
+                "leased": len(self._leased),
+                "idle": len(self._idle),
+                "target_size": self.target_size(),
+                "arrival_rate_per_s": round(self.arrival_rate(), 3),
+                "launch_latency_s": round(self.launch_latency.value or 0.0, 3),
+                "leases_total": self.leases_total,
+                "launch_failures": self.launch_failures,
+                "lease_wait_p50_ms": round(percentile(waits, 50) * 1000, 1),
+                "lease_wait_p95_ms": round(percentile(waits, 95) * 1000, 1),
+            }
+
+    def close(self, stop_browsers: bool = True) -> None:
+        """
+        Dừng pool; stop_browsers=True dừng các profile do pool khởi động
+
+        Playwright của thread hiện tại được dừng; thread khác tự gọi close_thread().
+        """
+        with self._cond:
+            self._closed = True
+            self._ready.clear()
+            self._cond.notify_all()
+        # Chờ các lần khởi động đang chạy để không bỏ sót profile vừa được start
+        self._executor.shutdown(wait=True)
+        with self._cond:
+            started = list(self._started)
+        if stop_browsers:
+            for profile_id in started:
+                try:
+                    self.adspower_api.stop_browser(profile_id)
+                except Exception as e:
+                    logger.warning("Failed to stop standby profile {}: {}", profile_id, e)
+        self.close_thread()
+
+    def close_thread(self) -> None:
+        """Dừng Playwright của thread hiện tại (gọi trước khi worker thread kết thúc)"""
+        playwright = getattr(self._local, "playwright", None)
+        if playwright is not None:
+            playwright.stop()
+            self._local.playwright = None
+
+    def __enter__(self) -> "StandbyPool":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
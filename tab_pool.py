@@ -0,0 +1,103 @@
+"""
+Tab Pool - Chạy nhiều tác vụ độc lập song song trên nhiều tab của cùng một profile
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Tuple
+from log_utils import logger
+from browser_controller_sync import BrowserControllerSync
+
+
+class TabPool:
+    """
+    Pool N tab mở sẵn trong một browser đã kết nối
+
+    Playwright sync chỉ chạy trên một thread, nên song song ở đây là song song phía
+    trình duyệt: ``submit`` khởi động tác vụ trên tab (ví dụ điều hướng với
+    ``wait_until="commit"``) và trả về ngay, ``collect`` chờ và lấy kết quả. Trong
+    lúc chờ tab cũ nhất, các tab khác vẫn tải trang.
+
+    Tab nền có thể bị Chrome giảm tốc timer; khi kết quả render bằng JavaScript nên
+    khởi động profile với ``--disable-background-timer-throttling`` và
+    ``--disable-renderer-backgrounding`` (tham số launch_args của start_browser).
+    """
+
+    def __init__(self, controller: BrowserControllerSync, size: int = 4):
+        if size < 1:
+            raise ValueError("TabPool size must be >= 1")
+        self.controller = controller
+        self.size = size
+        self.page_indexes: List[int] = []
+
+    def open(self) -> "TabPool":
+        """Mở trước đủ N tab (tái sử dụng các tab đã có)"""
+        for index in range(self.size):
+            self.controller.get_page(index)
+        self.page_indexes = list(range(self.size))
+        logger.info("Tab pool ready with {} tabs", self.size)
+        return self
+
+    def map(self, items: Iterable[Any],
+            submit: Callable[[int, Any], None],
+            collect: Callable[[int, Any], Any],
+            on_error: Callable[[Any, Exception], Any] = None) -> List[Any]:
+        """
+        Chạy submit/collect cho từng item trên các tab, giữ nguyên thứ tự kết quả
+
+        Args:
+            items: Danh sách tác vụ (ví dụ các domain cần tra)
+            submit: submit(page_index, item) - khởi động tác vụ, không chờ kết quả
+            collect: collect(page_index, item) - chờ và trả về kết quả
+            on_error: on_error(item, exception) - kết quả thay thế khi lỗi (mặc định raise)
+        """
+        if not self.page_indexes:
+            self.open()
+
+        pending: Deque[Tuple[int, Any]] = deque(enumerate(items))
+        free: Deque[int] = deque(self.page_indexes)
+        active: Deque[Tuple[int, int, Any]] = deque()
+        results: Dict[int, Any] = {}
+
+        while pending or active:
+            # Giao tác vụ cho mọi tab rảnh
+            while pending and free:
+                position, item = pending.popleft()
+                page_index = free.popleft()
+                try:
+                    submit(page_index, item)
+                    active.append((page_index, position, item))
+                except Exception as e:
+                    results[position] = self._handle_error(item, e, on_error)
+                    free.append(page_index)
+
+            if not active:
+                continue
+
+            # Lấy kết quả của tab được giao sớm nhất
+            page_index, position, item = active.popleft()
+            try:
+                results[position] = collect(page_index, item)
+            except Exception as e:
+                results[position] = self._handle_error(item, e, on_error)
+            free.append(page_index)
+
+        return [results[position] for position in sorted(results)]
+
+    @staticmethod
+    def _handle_error(item: Any, error: Exception, on_error: Callable[[Any, Exception], Any]) -> Any:
+        logger.error("Tab pool task failed for {}: {}", item, error)
+        if on_error is None:
+            raise error
+        return on_error(item, error)
+
+    def close(self) -> None:
+        """Trả các tab phụ của pool về free list của controller (giữ lại tab 0)"""
+        for index in self.page_indexes:
+            if index > 0:
+                self.controller.release_page(index)
+        self.page_indexes = []
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
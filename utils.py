@@ -1,11 +1,17 @@
 """
 Utilities và helper functions cho AdsPower Automation
 """
+import functools
 import json
+import re
 import time
 import random
-from typing import Dict, List, Any, Optional
-from loguru import logger
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Match, Optional, Pattern, Tuple, Union
+from log_utils import logger
+from config import config
+from jsonl_io import JsonlWriter, iter_jsonl
+from metrics import record_delay
+from resilience import ALL_KINDS, CircuitBreaker, RetryPolicy
 
 
 class AdsPowerUtils:
@@ -110,8 +116,9 @@ class AdsPowerUtils:
     @staticmethod
     def random_delay(min_seconds: float = 1.0, max_seconds: float = 3.0) -> None:
         """Tạo delay ngẫu nhiên giữa các thao tác"""
-        delay = random.uniform(min_seconds, max_seconds)
+        delay = random.uniform(min_seconds, max_seconds) * config.delay_scale
         time.sleep(delay)
+        record_delay(delay)
         logger.debug(f"Random delay: {delay:.2f} seconds")
     
     @staticmethod
@@ -142,6 +149,29 @@ class AdsPowerUtils:
             logger.error(f"Failed to load data from {filename}: {e}")
             raise
     
+    @staticmethod
+    def save_data_to_jsonl(records: Iterable[Any], filename: str, append: bool = False,
+                           rotate_bytes: Optional[int] = None) -> int:
+        """
+        Lưu từng bản ghi vào file JSON lines (stream, bộ nhớ không phụ thuộc số bản ghi)
+        
+        Đuôi .gz/.zst để nén; rotate_bytes để tách file khi vượt kích thước.
+        Trả về số bản ghi đã ghi.
+        """
+        try:
+            with JsonlWriter(filename, append=append, rotate_bytes=rotate_bytes) as writer:
+                count = writer.write_many(records)
+            logger.info(f"{count} records saved to {filename}")
+            return count
+        except Exception as e:
+            logger.error(f"Failed to save data to {filename}: {e}")
+            raise
+    
+    @staticmethod
+    def iter_data_from_jsonl(filename: str) -> Iterator[Any]:
+        """Đọc từng bản ghi từ file JSON lines (kèm các phần đã rotate)"""
+        return iter_jsonl(filename)
+    
     @staticmethod
     def validate_profile_data(profile_data: Dict[str, Any]) -> bool:
         """Kiểm tra tính hợp lệ của dữ liệu profile"""
@@ -211,20 +241,30 @@ class AdsPowerUtils:
         return f"{size_bytes:.2f} {size_names[i]}"
     
     @staticmethod
-    def retry_on_failure(max_retries: int = 3, delay: float = 1.0):
-        """Decorator để retry khi function thất bại"""
+    def retry_on_failure(max_retries: int = 3, delay: float = 1.0, retry_on: Iterable[str] = ALL_KINDS,
+                         breaker: Optional[CircuitBreaker] = None):
+        """
+        Decorator để retry khi function thất bại
+        
+        Dùng RetryPolicy: backoff lũy thừa có jitter với delay cơ sở ``delay``.
+        
+        Args:
+            max_retries: Số lần thử tối đa
+            delay: Delay cơ sở (giây)
+            retry_on: Các loại lỗi được retry (xem resilience), mặc định mọi lỗi
+            breaker: Circuit breaker áp dụng cho function (tùy chọn)
+        """
         def decorator(func):
+            policy = RetryPolicy(max_attempts=max_retries, base_delay=delay,
+                                 max_delay=max(config.retry_max_delay, delay), retry_on=retry_on)
+            
+            @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                for attempt in range(max_retries):
-                    try:
-                        return func(*args, **kwargs)
-                    except Exception as e:
-                        if attempt == max_retries - 1:
-                            logger.error(f"Function {func.__name__} failed after {max_retries} attempts: {e}")
-                            raise
-                        else:
-                            logger.warning(f"Attempt {attempt + 1} failed for {func.__name__}: {e}. Retrying in {delay}s...")
-                            time.sleep(delay)
+                try:
+                    return policy.run(lambda: func(*args, **kwargs), breaker=breaker, name=func.__name__)
+                except Exception as e:
+                    logger.error("Function {} failed: {}", func.__name__, e)
+                    raise
             return wrapper
         return decorator
     
@@ -275,37 +315,143 @@ class SelectorHelper:
         return f"{tag}[{attribute}*='{value}']"
 
 
+# Pattern biên dịch sẵn cho các method extract_* của DataExtractor (giữ nguyên pattern cũ)
+LINK_PATTERN = re.compile(r'href=["\']([^"\']+)["\']')
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+# Lookahead chỉ lọc sớm các vị trí có thể bắt đầu một số điện thoại (kết quả không đổi)
+PHONE_PATTERN = re.compile(r'(?=[+(\d]|[-.\s][(\d])(\+?1?[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})')
+PRICE_PATTERN = re.compile(r'\$[\d,]+\.?\d*|\d+\.?\d*\s*(?:USD|EUR|GBP|VND)')
+
+# Bản có chặn độ dài match cho StreamingExtractor/extract_all, để xử lý được input chia
+# chunk (match không dài hơn phần gối đầu giữa hai chunk): link quá 2000 ký tự, email có
+# phần tên quá 64/domain quá 255 ký tự và giá quá 30 chữ số bị bỏ qua hoặc cắt ngắn
+_MAX_MATCH = 2048
+STREAM_LINK_PATTERN = re.compile(r'href=["\']([^"\']{1,2000})["\']')
+STREAM_EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9.-]{1,255}\.[A-Z|a-z]{2,63}\b')
+STREAM_PRICE_PATTERN = re.compile(r'\$[\d,]{1,30}\.?\d{0,10}|\d{1,30}\.?\d{0,10}\s{0,10}(?:USD|EUR|GBP|VND)')
+
+# kind -> (pattern, hàm lấy giá trị từ match)
+EXTRACTORS: Dict[str, Tuple[Pattern, Callable[[Match], str]]] = {
+    "links": (STREAM_LINK_PATTERN, lambda m: m.group(1)),
+    "emails": (STREAM_EMAIL_PATTERN, lambda m: m.group(0)),
+    "phones": (PHONE_PATTERN, lambda m: "".join(g or "" for g in m.groups())),
+    "prices": (STREAM_PRICE_PATTERN, lambda m: m.group(0)),
+}
+
+
+class StreamingExtractor:
+    """
+    Chạy nhiều extractor trong một lượt qua input dạng chunk (stream)
+    
+    Mỗi chunk được quét bởi tất cả extractor rồi bỏ đi, chỉ giữ lại phần gối đầu
+    (_MAX_MATCH ký tự) để không mất match nằm vắt qua hai chunk. Kết quả giữ thứ tự
+    xuất hiện và (mặc định) loại bỏ trùng lặp.
+    """
+    
+    _CONTEXT = 64  # Ký tự trước vị trí quét để \b/lookbehind nhìn đúng ngữ cảnh
+    
+    def __init__(self, kinds: Iterable[str] = tuple(EXTRACTORS), dedupe: bool = True,
+                 chunk_size: int = 1024 * 1024):
+        """
+        Args:
+            kinds: Các extractor cần chạy (links, emails, phones, prices)
+            dedupe: Loại bỏ kết quả trùng (giữ lần xuất hiện đầu)
+            chunk_size: Gom input nhỏ (ví dụ từng dòng file) thành chunk cỡ này trước khi quét
+        """
+        self.extractors = [(kind, *EXTRACTORS[kind]) for kind in kinds]
+        self.dedupe = dedupe
+        self.chunk_size = max(chunk_size, 4 * _MAX_MATCH)
+        self._results: Dict[str, Any] = {kind: {} if dedupe else [] for kind, _, _ in self.extractors}
+        self._buffer = ""
+        # Vị trí quét tiếp của từng extractor trong buffer (phần trước là ngữ cảnh)
+        self._resume = {kind: 0 for kind, _, _ in self.extractors}
+        self._pending: List[str] = []
+        self._pending_size = 0
+    
+    def feed(self, chunk: str) -> None:
+        """Nhận thêm một đoạn text"""
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+        if self._pending_size >= self.chunk_size:
+            self._scan(final=False)
+    
+    def _scan(self, final: bool) -> None:
+        buffer = self._buffer + "".join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        # Match bắt đầu trước cut chắc chắn đã kết thúc trong buffer
+        cut = len(buffer) if final else max(len(buffer) - _MAX_MATCH, min(self._resume.values()))
+        
+        for kind, pattern, value in self.extractors:
+            found = self._results[kind]
+            resume = max(self._resume[kind], cut)
+            for match in pattern.finditer(buffer, self._resume[kind]):
+                if match.start() >= cut:
+                    break
+                # Match sau không được chồng lên match trước, giống như quét cả string
+                resume = max(match.end(), cut)
+                if self.dedupe:
+                    found.setdefault(value(match), None)
+                else:
+                    found.append(value(match))
+            self._resume[kind] = resume
+        
+        keep_from = max(cut - self._CONTEXT, 0)
+        self._buffer = buffer[keep_from:]
+        for kind in self._resume:
+            self._resume[kind] -= keep_from
+    
+    def finish(self) -> Dict[str, List[str]]:
+        """Quét phần còn lại và trả về kết quả theo từng extractor"""
+        self._scan(final=True)
+        self._buffer = ""
+        self._resume = dict.fromkeys(self._resume, 0)
+        return {kind: list(found) for kind, found in self._results.items()}
+    
+    def extract(self, source: Union[str, Iterable[str]]) -> Dict[str, List[str]]:
+        """Trích xuất từ một string hoặc iterable các chunk (file mở ở chế độ text, generator...)"""
+        if isinstance(source, str):
+            source = (source,)
+        for chunk in source:
+            self.feed(chunk)
+        return self.finish()
+
+
 class DataExtractor:
     """Class để trích xuất dữ liệu từ trang web"""
     
+    @staticmethod
+    def extract_all(source: Union[str, Iterable[str]],
+                    kinds: Iterable[str] = tuple(EXTRACTORS), dedupe: bool = True) -> Dict[str, List[str]]:
+        """
+        Chạy nhiều extractor trong một lượt
+        
+        Args:
+            source: HTML/text, hoặc iterable các chunk (ví dụ file mở ở chế độ text)
+            kinds: Các extractor cần chạy (links, emails, phones, prices)
+            dedupe: Loại bỏ kết quả trùng, giữ thứ tự xuất hiện
+        
+        Dùng pattern có chặn độ dài (xem EXTRACTORS): với link/email/giá quá dài, kết quả
+        có thể khác extract_links/extract_emails/extract_prices.
+        """
+        return StreamingExtractor(kinds, dedupe=dedupe).extract(source)
+    
     @staticmethod
     def extract_links(page_content: str) -> List[str]:
         """Trích xuất tất cả links từ HTML content"""
-        import re
-        link_pattern = r'href=["\']([^"\']+)["\']'
-        links = re.findall(link_pattern, page_content)
-        return list(set(links))  # Loại bỏ duplicate
+        return list(dict.fromkeys(LINK_PATTERN.findall(page_content)))  # Loại bỏ duplicate, giữ thứ tự
     
     @staticmethod
     def extract_emails(text: str) -> List[str]:
         """Trích xuất email addresses từ text"""
-        import re
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails = re.findall(email_pattern, text)
-        return list(set(emails))
+        return list(dict.fromkeys(EMAIL_PATTERN.findall(text)))
     
     @staticmethod
     def extract_phone_numbers(text: str) -> List[str]:
         """Trích xuất số điện thoại từ text"""
-        import re
-        phone_pattern = r'(\+?1?[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})'
-        phones = re.findall(phone_pattern, text)
-        return [''.join(phone) for phone in phones]
+        return [''.join(phone) for phone in PHONE_PATTERN.findall(text)]
     
     @staticmethod
     def extract_prices(text: str) -> List[str]:
         """Trích xuất giá tiền từ text"""
-        import re
-        price_pattern = r'\$[\d,]+\.?\d*|\d+\.?\d*\s*(?:USD|EUR|GBP|VND)'
-        prices = re.findall(price_pattern, text)
-        return prices
+        return PRICE_PATTERN.findall(text)